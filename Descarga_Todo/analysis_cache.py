@@ -0,0 +1,122 @@
+# analysis_cache.py - Metadatos y política de frescura de la cache de análisis
+"""
+Cada payload de análisis guardado en cache lleva un bloque `_meta` con:
+    created_at      timestamp (epoch) de cuando se calculó
+    logic_version   versión de la lógica de análisis (ANALYSIS_LOGIC_VERSION)
+    ah_line/ou_line líneas AH y O/U de origen (Bet365 inicial) en el momento del cálculo
+    match_state     'upcoming', 'finished' o 'unknown'
+    kickoff         hora de inicio UTC (ISO) si se conoce
+
+Una entrada se considera obsoleta si cambió la versión de la lógica, si el
+partido ha finalizado desde que se calculó, o si supera el TTL que le toca
+según lo que falte para el inicio.
+
+Ese TTL es "blando": hasta ANALYSIS_HARD_TTL_FACTOR veces el TTL la entrada
+aún puede servirse marcada como `stale` mientras se recalcula en segundo plano.
+"""
+import datetime
+import os
+import time
+
+# Incrementar cada vez que cambie la lógica de análisis o la forma del payload
+ANALYSIS_LOGIC_VERSION = '2025.10.2'
+
+STATE_UPCOMING = 'upcoming'
+STATE_FINISHED = 'finished'
+STATE_UNKNOWN = 'unknown'
+
+# TTLs en segundos para partidos no finalizados
+ANALYSIS_TTL_IN_PLAY = 5 * 60
+ANALYSIS_TTL_UNKNOWN = 30 * 60
+ANALYSIS_TTL_BY_KICKOFF = (
+    (3600, 5 * 60),
+    (6 * 3600, 20 * 60),
+    (24 * 3600, 60 * 60),
+)
+ANALYSIS_TTL_FAR_FUTURE = 3 * 3600
+# Caducidad "dura" = TTL blando * factor (stale-while-revalidate)
+ANALYSIS_HARD_TTL_FACTOR = float(os.environ.get('ANALYSIS_HARD_TTL_FACTOR', 6))
+
+
+def state_from_section(section: str | None) -> str:
+    if section == 'finished_matches':
+        return STATE_FINISHED
+    if section == 'upcoming_matches':
+        return STATE_UPCOMING
+    return STATE_UNKNOWN
+
+
+def analysis_ttl_seconds(match_state: str, kickoff: datetime.datetime | None, now: datetime.datetime | None = None):
+    """TTL del análisis; None significa que no caduca por antigüedad (partido finalizado)."""
+    if match_state == STATE_FINISHED:
+        return None
+    if kickoff is None:
+        return ANALYSIS_TTL_UNKNOWN
+    now = now or datetime.datetime.utcnow()
+    remaining = (kickoff - now).total_seconds()
+    if remaining <= 0:
+        return ANALYSIS_TTL_IN_PLAY
+    for limit, ttl in ANALYSIS_TTL_BY_KICKOFF:
+        if remaining <= limit:
+            return ttl
+    return ANALYSIS_TTL_FAR_FUTURE
+
+
+def build_analysis_meta(main_odds: dict | None, match_state: str, kickoff: datetime.datetime | None) -> dict:
+    main_odds = main_odds or {}
+    return {
+        'created_at': time.time(),
+        'logic_version': ANALYSIS_LOGIC_VERSION,
+        'ah_line': main_odds.get('ah_linea_raw'),
+        'ou_line': main_odds.get('goals_linea_raw'),
+        'match_state': match_state or STATE_UNKNOWN,
+        'kickoff': kickoff.isoformat() if kickoff else None,
+    }
+
+
+def _parse_kickoff(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def analysis_staleness(payload: dict, match_state: str | None = None, kickoff: datetime.datetime | None = None,
+                       now: float | None = None, ttl_factor: float = 1.0) -> str | None:
+    """
+    Devuelve el motivo por el que la entrada está obsoleta ('no_meta', 'logic_version',
+    'match_finished', 'expired') o None si sigue fresca.
+    `match_state`/`kickoff` son el estado actual del partido (p.ej. según data.json).
+    `ttl_factor` multiplica el TTL (ANALYSIS_HARD_TTL_FACTOR para la caducidad dura).
+    """
+    meta = payload.get('_meta') if isinstance(payload, dict) else None
+    if not isinstance(meta, dict):
+        return 'no_meta'
+    if meta.get('logic_version') != ANALYSIS_LOGIC_VERSION:
+        return 'logic_version'
+    cached_state = meta.get('match_state') or STATE_UNKNOWN
+    if match_state == STATE_FINISHED and cached_state != STATE_FINISHED:
+        return 'match_finished'
+    effective_state = match_state if match_state and match_state != STATE_UNKNOWN else cached_state
+    effective_kickoff = kickoff or _parse_kickoff(meta.get('kickoff'))
+    ttl = analysis_ttl_seconds(effective_state, effective_kickoff)
+    if ttl is None:
+        return None
+    now = time.time() if now is None else now
+    if now - float(meta.get('created_at') or 0) > ttl * ttl_factor:
+        return 'expired'
+    return None
+
+
+def is_hard_expired(payload: dict, match_state: str | None = None, kickoff: datetime.datetime | None = None,
+                    now: float | None = None) -> bool:
+    """True si la entrada ya no puede servirse ni siquiera como `stale`."""
+    return analysis_staleness(payload, match_state, kickoff, now, ttl_factor=ANALYSIS_HARD_TTL_FACTOR) is not None
+
+
+def is_analysis_fresh(payload: dict, match_state: str | None = None, kickoff: datetime.datetime | None = None) -> bool:
+    return analysis_staleness(payload, match_state, kickoff) is None
@@ -0,0 +1,541 @@
+# analysis_service.py - Resultado de análisis compartido por todas las rutas
+"""
+Un único punto de acceso al análisis completo de un partido, respaldado por la
+cache de análisis en disco. Lo usan `/api/analisis/<id>`, `/estudio/<id>`,
+`/analizar_partido` y `/start_analysis_background`.
+
+Forma serializable del resultado guardado en cache:
+    {
+        'match_id': '2852102',
+        'payload':  {...},   # respuesta de /api/analisis (incluye simplified_html)
+        'datos':    {...},   # datos de obtener_datos_completos_partido sin DataFrames ni funciones
+        '_meta':    {...},   # ver analysis_cache.build_analysis_meta
+    }
+
+Las páginas HTML de estudio se renderizan desde `datos` rehidratado
+(DataFrames reconstruidos y funciones auxiliares de la plantilla añadidas).
+
+Stale-while-revalidate: con `allow_stale=True`, una entrada que solo ha superado
+su TTL blando se devuelve al momento (con `stale: True`) y se recalcula en un
+pool de hilos acotado. Solo una entrada ausente o caducada del todo bloquea.
+
+Los fallos del scraper se recuerdan en una cache negativa (negative_cache.py):
+mientras dure el bloqueo, pedir de nuevo el mismo partido falla al momento.
+
+Un resultado parcial (presupuesto de tiempo agotado, `timed_out: True`) se
+devuelve a quien lo pidió pero no se guarda en cache: la siguiente petición lo
+recalcula, ya con las estadísticas descargadas entretanto en su cache.
+
+Con un planificador (scheduler.py) cada scraping espera un slot de su clase de
+prioridad: interactive para peticiones de usuario, background para trabajos y
+refrescos, prefetch para el trabajo especulativo.
+
+El presupuesto de tiempo (ANALYSIS_DEADLINE_SECONDS) de una petición interactiva
+empieza a contar al llegar, no al obtener el slot: la espera en cola (o la espera
+a otro cálculo en curso del mismo partido) se descuenta y, si se agota antes, la
+petición falla con error_class 'busy'. En background y prefetch el presupuesto
+solo cubre el scraping.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_cache import analysis_staleness, build_analysis_meta, is_hard_expired, state_from_section
+from deadline import Deadline
+from negative_cache import NegativeCache
+from scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, SchedulerTimeout
+from estudio_scraper import (
+    ANALYSIS_DEADLINE_SECONDS,
+    obtener_datos_completos_partido,
+    format_ah_as_decimal_string_of,
+    generar_analisis_mercado_simplificado,
+    check_handicap_cover,
+    parse_ah_to_number_of
+)
+
+# Funciones auxiliares que obtener_datos_completos_partido inyecta para la plantilla estudio.html
+_TEMPLATE_HELPERS_MODULE = 'modules.funciones_auxiliares'
+_TEMPLATE_HELPERS = (
+    '_calcular_estadisticas_contra_rival',
+    '_analizar_over_under',
+    '_analizar_ah_cubierto',
+    '_analizar_desempeno_casa_fuera',
+    '_contar_victorias_h2h',
+    '_analizar_over_under_h2h',
+    '_contar_over_h2h',
+    '_contar_victorias_h2h_general',
+)
+_DATAFRAME_MARKER = '__dataframe__'
+
+# Pool de recálculo en segundo plano (stale-while-revalidate)
+ANALYSIS_REFRESH_WORKERS = int(os.environ.get('ANALYSIS_REFRESH_WORKERS', 2))
+ANALYSIS_REFRESH_MAX_PENDING = int(os.environ.get('ANALYSIS_REFRESH_MAX_PENDING', 16))
+
+
+NEGATIVE_OPERATION = 'analysis'
+# Sin slot del planificador antes de agotar el presupuesto de la petición
+ERROR_BUSY = 'busy'
+BUSY_RETRY_AFTER_SECONDS = 10
+
+
+class AnalysisError(Exception):
+    """El scraper no pudo obtener datos para el partido."""
+
+    def __init__(self, message='No se pudieron obtener datos.', error_class=None, retry_after=None):
+        super().__init__(message)
+        self.error_class = error_class
+        # Segundos hasta que se vuelva a intentar el scraping (cache negativa), si aplica
+        self.retry_after = retry_after
+
+
+def _is_dataframe(value):
+    return hasattr(value, 'iterrows') and hasattr(value, 'to_dict')
+
+
+def serialize_datos(value):
+    """Convierte el dict de obtener_datos_completos_partido a algo serializable (sin DataFrames ni funciones)."""
+    if _is_dataframe(value):
+        index_name = value.index.name
+        frame = value.reset_index() if index_name else value
+        return {_DATAFRAME_MARKER: frame.to_dict('records'), 'index': index_name}
+    if isinstance(value, dict):
+        return {str(k): serialize_datos(v) for k, v in value.items() if not callable(v)}
+    if isinstance(value, (list, tuple)):
+        return [serialize_datos(v) for v in value]
+    return value
+
+
+def rehydrate_datos(value, _top=True):
+    """Inverso de serialize_datos: reconstruye DataFrames y añade las funciones de la plantilla."""
+    if isinstance(value, dict):
+        if _DATAFRAME_MARKER in value:
+            import pandas as pd
+            df = pd.DataFrame(value[_DATAFRAME_MARKER])
+            index_name = value.get('index')
+            return df.set_index(index_name) if index_name and not df.empty else df
+        result = {k: rehydrate_datos(v, _top=False) for k, v in value.items()}
+        if _top:
+            helpers = importlib.import_module(_TEMPLATE_HELPERS_MODULE)
+            for name in _TEMPLATE_HELPERS:
+                if hasattr(helpers, name):
+                    result[name] = getattr(helpers, name)
+        return result
+    if isinstance(value, list):
+        return [rehydrate_datos(v, _top=False) for v in value]
+    return value
+
+
+def build_analysis_payload(match_id, datos):
+    """Construye el payload de /api/analisis a partir de los datos completos del scraper."""
+    # --- Lógica para el payload complejo (la original) ---
+    def df_to_rows(df):
+        rows = []
+        try:
+            if df is not None and hasattr(df, 'iterrows'):
+                for idx, row in df.iterrows():
+                    label = str(idx)
+                    label = label.replace('Shots on Goal', 'Tiros a Puerta')                                     .replace('Shots', 'Tiros')                                     .replace('Dangerous Attacks', 'Ataques Peligrosos')                                     .replace('Attacks', 'Ataques')
+                    try:
+                        home_val = row['Casa']
+                    except Exception:
+                        home_val = ''
+                    try:
+                        away_val = row['Fuera']
+                    except Exception:
+                        away_val = ''
+                    rows.append({'label': label, 'home': home_val or '', 'away': away_val or ''})
+        except Exception:
+            pass
+        return rows
+
+    payload = {
+        'match_id': match_id,
+        'home_team': datos.get('home_name', ''),
+        'away_team': datos.get('away_name', ''),
+        'final_score': datos.get('score'),
+        'match_date': datos.get('match_date'),
+        'match_time': datos.get('match_time'),
+        'match_datetime': datos.get('match_datetime'),
+        'recent_indirect_full': {
+            'last_home': None,
+            'last_away': None,
+            'h2h_col3': None
+        },
+        'comparativas_indirectas': {
+            'left': None,
+            'right': None
+        }
+    }
+
+    # --- START COVERAGE CALCULATION ---
+    # Puede faltar si el análisis se cortó por el presupuesto de tiempo
+    main_odds = datos.get("main_match_odds_data") or {}
+    home_name = datos.get("home_name")
+    away_name = datos.get("away_name")
+    ah_actual_num = parse_ah_to_number_of(main_odds.get('ah_linea_raw', ''))
+
+    favorito_actual_name = "Ninguno (línea en 0)"
+    if ah_actual_num is not None:
+        if ah_actual_num > 0: favorito_actual_name = home_name
+        elif ah_actual_num < 0: favorito_actual_name = away_name
+
+    def get_cover_status_vs_current(details):
+        if not details or ah_actual_num is None:
+            return 'NEUTRO'
+        try:
+            score_str = details.get('score', '').replace(' ', '').replace(':', '-')
+            if not score_str or '?' in score_str:
+                return 'NEUTRO'
+
+            h_home = details.get('home_team')
+            h_away = details.get('away_team')
+
+            status, _ = check_handicap_cover(score_str, ah_actual_num, favorito_actual_name, h_home, h_away, home_name)
+            return status
+        except Exception:
+            return 'NEUTRO'
+
+    # --- Análisis mejorado de H2H Rivales ---
+    def analyze_h2h_rivals(home_result, away_result):
+        if not home_result or not away_result:
+            return None
+
+        try:
+            # Obtener resultados de los partidos
+            home_goals = list(map(int, home_result.get('score', '0-0').split('-')))
+            away_goals = list(map(int, away_result.get('score', '0-0').split('-')))
+
+            # Calcular diferencia de goles
+            home_goal_diff = home_goals[0] - home_goals[1]
+            away_goal_diff = away_goals[0] - away_goals[1]
+
+            # Comparar resultados
+            if home_goal_diff > away_goal_diff:
+                return "Contra rivales comunes, el Equipo Local ha obtenido mejores resultados"
+            elif away_goal_diff > home_goal_diff:
+                return "Contra rivales comunes, el Equipo Visitante ha obtenido mejores resultados"
+            else:
+                return "Los rivales han tenido resultados similares"
+        except Exception:
+            return None
+
+    # --- Análisis de Comparativas Indirectas ---
+    def analyze_indirect_comparison(result, team_name):
+        if not result:
+            return None
+
+        try:
+            # Determinar si el equipo cubrió el handicap
+            status = get_cover_status_vs_current(result)
+
+            if status == 'CUBIERTO':
+                return f"Contra este rival, {team_name} habría cubierto el handicap"
+            elif status == 'NO CUBIERTO':
+                return f"Contra este rival, {team_name} no habría cubierto el handicap"
+            else:
+                return f"Contra este rival, el resultado para {team_name} sería indeterminado"
+        except Exception:
+            return None
+    # --- END COVERAGE CALCULATION ---
+
+    last_home = (datos.get('last_home_match') or {})
+    last_home_details = last_home.get('details') or {}
+    if last_home_details:
+        payload['recent_indirect_full']['last_home'] = {
+            'home': last_home_details.get('home_team'),
+            'away': last_home_details.get('away_team'),
+            'score': (last_home_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(last_home_details.get('handicap_line_raw') or '-'),
+            'ou': last_home_details.get('ouLine') or '-',
+            'stats_rows': df_to_rows(last_home.get('stats')),
+            'date': last_home_details.get('date'),
+            'cover_status': get_cover_status_vs_current(last_home_details)
+        }
+
+    last_away = (datos.get('last_away_match') or {})
+    last_away_details = last_away.get('details') or {}
+    if last_away_details:
+        payload['recent_indirect_full']['last_away'] = {
+            'home': last_away_details.get('home_team'),
+            'away': last_away_details.get('away_team'),
+            'score': (last_away_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(last_away_details.get('handicap_line_raw') or '-'),
+            'ou': last_away_details.get('ouLine') or '-',
+            'stats_rows': df_to_rows(last_away.get('stats')),
+            'date': last_away_details.get('date'),
+            'cover_status': get_cover_status_vs_current(last_away_details)
+        }
+
+    h2h_col3 = (datos.get('h2h_col3') or {})
+    h2h_col3_details = h2h_col3.get('details') or {}
+    if h2h_col3_details and h2h_col3_details.get('status') == 'found':
+        h2h_col3_details_adapted = {
+            'score': f"{h2h_col3_details.get('goles_home')}:{h2h_col3_details.get('goles_away')}",
+            'home_team': h2h_col3_details.get('h2h_home_team_name'),
+            'away_team': h2h_col3_details.get('h2h_away_team_name')
+        }
+        payload['recent_indirect_full']['h2h_col3'] = {
+            'home': h2h_col3_details.get('h2h_home_team_name'),
+            'away': h2h_col3_details.get('h2h_away_team_name'),
+            'score': f"{h2h_col3_details.get('goles_home')} : {h2h_col3_details.get('goles_away')}",
+            'ah': format_ah_as_decimal_string_of(h2h_col3_details.get('handicap_line_raw') or '-'),
+            'ou': h2h_col3_details.get('ou_result') or '-',
+            'stats_rows': df_to_rows(h2h_col3.get('stats')),
+            'date': h2h_col3_details.get('date'),
+            'cover_status': get_cover_status_vs_current(h2h_col3_details_adapted),
+            'analysis': analyze_h2h_rivals(last_home_details, last_away_details)
+        }
+
+    h2h_general = (datos.get('h2h_general') or {})
+    h2h_general_details = h2h_general.get('details') or {}
+    if h2h_general_details:
+        score_text = h2h_general_details.get('res6') or ''
+        cover_input = {
+            'score': score_text,
+            'home_team': h2h_general_details.get('h2h_gen_home'),
+            'away_team': h2h_general_details.get('h2h_gen_away')
+        }
+        payload['recent_indirect_full']['h2h_general'] = {
+            'home': h2h_general_details.get('h2h_gen_home'),
+            'away': h2h_general_details.get('h2h_gen_away'),
+            'score': score_text.replace(':', ' : '),
+            'ah': h2h_general_details.get('ah6') or '-',
+            'ou': h2h_general_details.get('ou_result6') or '-',
+            'stats_rows': df_to_rows(h2h_general.get('stats')),
+            'date': h2h_general_details.get('date'),
+            'cover_status': get_cover_status_vs_current(cover_input) if score_text else 'NEUTRO'
+        }
+
+    comp_left = (datos.get('comp_L_vs_UV_A') or {})
+    comp_left_details = comp_left.get('details') or {}
+    if comp_left_details:
+        payload['comparativas_indirectas']['left'] = {
+            'title_home_name': datos.get('home_name'),
+            'title_away_name': datos.get('away_name'),
+            'home_team': comp_left_details.get('home_team'),
+            'away_team': comp_left_details.get('away_team'),
+            'score': (comp_left_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(comp_left_details.get('ah_line') or '-'),
+            'ou': comp_left_details.get('ou_line') or '-',
+            'localia': comp_left_details.get('localia') or '',
+            'stats_rows': df_to_rows(comp_left.get('stats')),
+            'cover_status': get_cover_status_vs_current(comp_left_details),
+            'analysis': analyze_indirect_comparison(comp_left_details, datos.get('home_name'))
+        }
+
+    comp_right = (datos.get('comp_V_vs_UL_H') or {})
+    comp_right_details = comp_right.get('details') or {}
+    if comp_right_details:
+        payload['comparativas_indirectas']['right'] = {
+            'title_home_name': datos.get('home_name'),
+            'title_away_name': datos.get('away_name'),
+            'home_team': comp_right_details.get('home_team'),
+            'away_team': comp_right_details.get('away_team'),
+            'score': (comp_right_details.get('score') or '').replace(':', ' : '),
+            'ah': format_ah_as_decimal_string_of(comp_right_details.get('ah_line') or '-'),
+            'ou': comp_right_details.get('ou_line') or '-',
+            'localia': comp_right_details.get('localia') or '',
+            'stats_rows': df_to_rows(comp_right.get('stats')),
+            'cover_status': get_cover_status_vs_current(comp_right_details),
+            'analysis': analyze_indirect_comparison(comp_right_details, datos.get('away_name'))
+        }
+
+    # --- Lógica para el HTML simplificado ---
+    h2h_data = datos.get("h2h_data")
+    simplified_html = ""
+    if all([main_odds, h2h_data, home_name, away_name]):
+        simplified_html = generar_analisis_mercado_simplificado(main_odds, h2h_data, home_name, away_name)
+
+    payload['simplified_html'] = simplified_html
+
+    if datos.get('timed_out'):
+        # Resultado parcial: secciones que no llegaron a tiempo (ver obtener_datos_completos_partido)
+        payload['timed_out'] = True
+        payload['missing'] = list(datos.get('missing') or [])
+
+    return payload
+
+
+class _InflightCompute:
+    """Cálculo en curso de un partido; los que esperan recogen `entry` al terminar."""
+    __slots__ = ('event', 'entry')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None
+
+
+class AnalysisService:
+    """
+    Acceso al análisis de un partido a través de la cache compartida.
+    `match_state_lookup(match_id)` devuelve (sección, hora de inicio) según data.json.
+    """
+
+    def __init__(self, cache, match_state_lookup=None, refresh_workers: int = ANALYSIS_REFRESH_WORKERS,
+                 refresh_max_pending: int = ANALYSIS_REFRESH_MAX_PENDING, negative_cache=None, scheduler=None):
+        self.cache = cache
+        self.scheduler = scheduler
+        self.negative_cache = negative_cache if negative_cache is not None else NegativeCache()
+        self.match_state_lookup = match_state_lookup or (lambda match_id: (None, None))
+        # Evita que dos peticiones simultáneas del mismo partido lancen dos scrapes
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=max(1, refresh_workers), thread_name_prefix='analysis-refresh')
+        self._refresh_max_pending = max(1, refresh_max_pending)
+        self._refresh_pending = set()
+        self._refresh_lock = threading.Lock()
+
+    def _match_state(self, match_id):
+        section, kickoff = self.match_state_lookup(match_id)
+        return state_from_section(section), kickoff
+
+    def get_cached(self, match_id):
+        """(resultado, motivo_obsoleto) de la cache; (None, 'missing') si no hay entrada."""
+        entry = self.cache.get(match_id)
+        if not isinstance(entry, dict) or not isinstance(entry.get('payload'), dict):
+            return None, 'missing'
+        match_state, kickoff = self._match_state(match_id)
+        return entry, analysis_staleness(entry, match_state, kickoff)
+
+    def check_blocked(self, match_id):
+        """Lanza AnalysisError si el partido está en la cache negativa."""
+        blocked = self.negative_cache.check(NEGATIVE_OPERATION, match_id)
+        if blocked is not None:
+            raise AnalysisError(blocked.message or 'No se pudieron obtener datos.', blocked.error_class, blocked.retry_after())
+
+    def _scrape(self, match_id, driver, priority, on_progress, deadline, slot_held):
+        """Scraping con slot del planificador; la espera del slot no pasa de lo que queda de `deadline`."""
+        if self.scheduler is None or slot_held:
+            return obtener_datos_completos_partido(match_id, driver=driver, on_progress=on_progress, deadline=deadline)
+        timeout = deadline.remaining() if deadline is not None else None
+        with self.scheduler.slot(priority, timeout=timeout):
+            return obtener_datos_completos_partido(match_id, driver=driver, on_progress=on_progress, deadline=deadline)
+
+    def compute(self, match_id, driver=None, priority: int = PRIORITY_INTERACTIVE, on_progress=None,
+                slot_held: bool = False):
+        """
+        Ejecuta el scraping completo, guarda el resultado en cache y lo devuelve.
+        `driver` permite reutilizar un navegador ya abierto (ver batch_analysis.py);
+        `priority` es la clase del planificador con la que se pide el slot; con
+        `slot_held=True` quien llama ya lo tiene (p.ej. para abrir el navegador dentro de él).
+        `on_progress(etapa, datos)` recibe las secciones según se completan; si otro
+        hilo ya está calculando el partido no se llama y solo llega el resultado final.
+        """
+        self.check_blocked(match_id)
+        deadline = None
+        if priority == PRIORITY_INTERACTIVE and ANALYSIS_DEADLINE_SECONDS > 0:
+            # El presupuesto incluye la espera del slot o de otro cálculo del mismo partido
+            # (sin él, el scraper crea el suyo al empezar)
+            deadline = Deadline(ANALYSIS_DEADLINE_SECONDS)
+        with self._inflight_lock:
+            inflight = self._inflight.get(match_id)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[match_id] = _InflightCompute()
+        if not owner:
+            # Otro hilo ya está calculando este partido: esperamos su resultado. Puede ser un
+            # trabajo de fondo aún en cola, así que una petición interactiva no espera más que su presupuesto
+            if not inflight.event.wait(deadline.remaining() if deadline is not None else None):
+                raise AnalysisError('Servidor ocupado: el análisis en curso de este partido no terminó a tiempo.',
+                                    ERROR_BUSY, BUSY_RETRY_AFTER_SECONDS)
+            if inflight.entry is not None:
+                return inflight.entry
+            entry, stale_reason = self.get_cached(match_id)
+            if entry is not None and stale_reason is None:
+                return entry
+            self.check_blocked(match_id)
+            raise AnalysisError('No se pudieron obtener datos.')
+        try:
+            start_time = time.time()
+            try:
+                datos = self._scrape(match_id, driver, priority, on_progress, deadline, slot_held)
+            except SchedulerTimeout:
+                # Saturación del servidor, no fallo del partido: no va a la cache negativa
+                raise AnalysisError('Servidor ocupado: no hubo hueco para el análisis a tiempo.',
+                                    ERROR_BUSY, BUSY_RETRY_AFTER_SECONDS)
+            except Exception as exc:
+                datos = {'error': f"Error durante el scraping: {exc}"}
+            if not datos or (isinstance(datos, dict) and datos.get('error')):
+                message = (datos or {}).get('error', 'No se pudieron obtener datos.')
+                failure = self.negative_cache.record_failure(NEGATIVE_OPERATION, match_id, message,
+                                                             (datos or {}).get('error_class'))
+                raise AnalysisError(message, failure.error_class, failure.retry_after())
+            self.negative_cache.record_success(NEGATIVE_OPERATION, match_id)
+            payload = build_analysis_payload(match_id, datos)
+            match_state, kickoff = self._match_state(match_id)
+            entry = {
+                'match_id': match_id,
+                'payload': payload,
+                'datos': serialize_datos(datos),
+                '_meta': build_analysis_meta(datos.get('main_match_odds_data'), match_state, kickoff),
+            }
+            if datos.get('timed_out'):
+                print(f"Análisis parcial para {match_id} (faltan: {', '.join(datos.get('missing') or [])}); no se guarda en cache.")
+            else:
+                self.cache.set(match_id, entry)
+            inflight.entry = entry
+            elapsed = time.time() - start_time
+            logging.warning(f"[PERFORMANCE] El análisis completo para el partido {match_id} tardó {elapsed:.2f} segundos.")
+            return entry
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(match_id, None)
+            inflight.event.set()
+
+    def schedule_refresh(self, match_id) -> bool:
+        """Encola el recálculo de un partido; False si ya está encolado o el pool está lleno."""
+        with self._refresh_lock:
+            if match_id in self._refresh_pending:
+                return False
+            if len(self._refresh_pending) >= self._refresh_max_pending:
+                print(f"Pool de recálculo lleno; no se refresca {match_id} por ahora.")
+                return False
+            self._refresh_pending.add(match_id)
+
+        def _run():
+            try:
+                self.compute(match_id, priority=PRIORITY_BACKGROUND)
+            except Exception as exc:
+                print(f"Error al refrescar en segundo plano el análisis de {match_id}: {exc}")
+            finally:
+                with self._refresh_lock:
+                    self._refresh_pending.discard(match_id)
+
+        self._refresh_pool.submit(_run)
+        return True
+
+    def lookup(self, match_id, allow_stale: bool = False):
+        """
+        Entrada servible desde cache sin scraping, o None si hay que calcularla.
+        Con `allow_stale=True` una entrada solo caducada por TTL blando se devuelve
+        con `stale: True` y se refresca en segundo plano.
+        """
+        entry, stale_reason = self.get_cached(match_id)
+        if entry is not None and stale_reason is None:
+            print(f"Devolviendo analisis cacheado para {match_id}")
+            return entry
+        if allow_stale and entry is not None and stale_reason == 'expired':
+            match_state, kickoff = self._match_state(match_id)
+            if not is_hard_expired(entry, match_state, kickoff):
+                print(f"Analisis cacheado para {match_id} caducado (TTL blando). Sirviendo stale y refrescando...")
+                self.schedule_refresh(match_id)
+                return dict(entry, stale=True)
+        if entry is not None:
+            print(f"Analisis cacheado para {match_id} obsoleto ({stale_reason}). Recalculando...")
+        else:
+            logging.warning(f"CACHE MISS para {match_id}. Iniciando análisis profundo...")
+        return None
+
+    def get_or_compute(self, match_id, allow_stale: bool = False, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Resultado fresco desde cache o, si falta o está obsoleto, recién calculado.
+        Con `allow_stale=True` una entrada solo caducada por TTL blando se devuelve
+        al momento con `stale: True` y se refresca en segundo plano.
+        """
+        entry = self.lookup(match_id, allow_stale)
+        if entry is not None:
+            return entry
+        return self.compute(match_id, priority=priority)
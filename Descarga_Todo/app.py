@@ -1,19 +1,21 @@
 
 # app.py - Servidor web principal (Flask) - VERSIÓN LIGERA
 from flask import Flask, render_template, abort, request, jsonify
+import datetime
 import json
 import os
 
 # Las funciones de scraping en tiempo real para las vistas de "estudio" siguen aquí
-from modules.estudio_scraper import (
-    obtener_datos_completos_partido, 
+from estudio_scraper import (
     format_ah_as_decimal_string_of, 
     obtener_datos_preview_rapido, 
     obtener_datos_preview_ligero, 
-    generar_analisis_mercado_simplificado,
 )
 # La lógica de normalización de handicap está en su propio módulo
 from app_utils import normalize_handicap_to_half_bucket_str
+from analysis_service import AnalysisError, AnalysisService, rehydrate_datos
+from cache_warmer import build_shared_caches
+from preview_cache import PreviewCache, preview_ttl_seconds
 
 app = Flask(__name__)
 
@@ -29,6 +31,27 @@ def load_data_from_file():
     except (json.JSONDecodeError, FileNotFoundError):
         return {"upcoming_matches": [], "finished_matches": []}
 
+
+def get_match_state(match_id):
+    """(sección, hora de inicio) del partido según data.json, o (None, None) si no aparece."""
+    data = load_data_from_file()
+    for section in ('upcoming_matches', 'finished_matches'):
+        for entry in data.get(section, []):
+            if str(entry.get('id')) == str(match_id):
+                try:
+                    return section, datetime.datetime.fromisoformat(entry.get('time_obj'))
+                except (TypeError, ValueError):
+                    return section, None
+    return None, None
+
+
+# Las mismas caches que precalienta run_scraper (cache_warmer.py): ANALYSIS_CACHE_DIR,
+# PREVIEW_DISK_CACHE_DIR o el backend compartido de CACHE_BACKEND
+_analysis_cache, _preview_cache = build_shared_caches(preview_max_entries=512)
+if _preview_cache is None:
+    _preview_cache = PreviewCache(max_entries=512)
+analysis_service = AnalysisService(_analysis_cache, match_state_lookup=get_match_state)
+
 @app.route('/')
 def index():
     """Muestra los próximos partidos desde el archivo de datos."""
@@ -128,10 +151,12 @@ def api_finished_matches():
 @app.route('/estudio/<string:match_id>')
 def mostrar_estudio(match_id):
     print(f"Recibida petición para el estudio del partido ID: {match_id}")
-    datos_partido = obtener_datos_completos_partido(match_id)
-    if not datos_partido or "error" in datos_partido:
-        print(f"Error al obtener datos para {match_id}: {datos_partido.get('error')}")
-        abort(500, description=datos_partido.get('error', 'Error desconocido'))
+    try:
+        resultado = analysis_service.get_or_compute(match_id)
+    except AnalysisError as exc:
+        print(f"Error al obtener datos para {match_id}: {exc}")
+        abort(500, description=str(exc) or 'Error desconocido')
+    datos_partido = rehydrate_datos(resultado['datos'])
     print(f"Datos obtenidos para {datos_partido['home_name']} vs {datos_partido['away_name']}. Renderizando plantilla...")
     return render_template('estudio.html', data=datos_partido, format_ah=format_ah_as_decimal_string_of)
 
@@ -141,18 +166,14 @@ def analizar_partido():
         match_id = request.form.get('match_id')
         if match_id:
             print(f"Recibida petición para analizar partido finalizado ID: {match_id}")
-            datos_partido = obtener_datos_completos_partido(match_id)
-            if not datos_partido or "error" in datos_partido:
-                return render_template('analizar_partido.html', error=datos_partido.get('error', 'Error desconocido'))
-            
-            main_odds = datos_partido.get("main_match_odds_data")
-            h2h_data = datos_partido.get("h2h_data")
-            home_name = datos_partido.get("home_name")
-            away_name = datos_partido.get("away_name")
-
-            analisis_simplificado_html = ""
-            if all([main_odds, h2h_data, home_name, away_name]):
-                analisis_simplificado_html = generar_analisis_mercado_simplificado(main_odds, h2h_data, home_name, away_name)
+            try:
+                resultado = analysis_service.get_or_compute(match_id)
+            except AnalysisError as exc:
+                return render_template('analizar_partido.html', error=str(exc) or 'Error desconocido')
+
+            datos_partido = rehydrate_datos(resultado['datos'])
+            # El análisis simplificado ya viene calculado en el payload compartido
+            analisis_simplificado_html = resultado['payload'].get('simplified_html', '')
 
             print(f"Datos obtenidos para {datos_partido['home_name']} vs {datos_partido['away_name']}. Renderizando plantilla...")
             return render_template('estudio.html', 
@@ -167,7 +188,11 @@ def analizar_partido():
 def api_preview(match_id):
     try:
         mode = request.args.get('mode', 'light').lower()
-        if mode in ['full', 'selenium']:
+        cache_mode = 'full' if mode in ['full', 'selenium'] else 'light'
+        cached = _preview_cache.get(match_id, cache_mode)
+        if cached is not None:
+            return jsonify(cached)
+        if cache_mode == 'full':
             # La versión con Playwright es más pesada y propensa a fallar en servidores
             preview_data = obtener_datos_preview_rapido(match_id)
         else:
@@ -177,7 +202,10 @@ def api_preview(match_id):
         # Si la propia función de scraping devuelve un error, lo pasamos
         if isinstance(preview_data, dict) and "error" in preview_data:
             return jsonify(preview_data), 500
-            
+
+        section, kickoff = get_match_state(match_id)
+        ttl = preview_ttl_seconds(kickoff, finished=section == 'finished_matches')
+        _preview_cache.put(match_id, cache_mode, preview_data, ttl)
         return jsonify(preview_data)
 
     except Exception as e:
@@ -0,0 +1,161 @@
+# cache_warmer.py - Precalentado de las caches de vista previa y análisis
+"""
+Etapa que se ejecuta tras el scraper (run_scraper.py): precalcula las vistas
+previas y los análisis completos de los próximos partidos que empiezan dentro
+de la ventana configurada, para que el primer clic de un usuario no tenga que
+esperar al scraping con Selenium.
+
+- Prioridad: primero los partidos que empiezan antes.
+- Concurrencia acotada (WARM_CONCURRENCY) y presupuesto de tiempo total
+  (WARM_TIME_BUDGET_SECONDS): al agotarse, las tareas pendientes se descartan.
+- Escribe en las mismas caches que la app Flask, que las construye con
+  `build_shared_caches()`: el backend compartido si CACHE_BACKEND lo indica, o
+  las DiskCache de ANALYSIS_CACHE_DIR y PREVIEW_DISK_CACHE_DIR; sin ninguno de
+  los dos no se precalientan vistas previas.
+
+Uso manual: python cache_warmer.py [ruta/a/data.json]
+"""
+import datetime
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from analysis_service import AnalysisService
+from cache_backend import NS_ANALYSES, NS_PREVIEWS, namespace_cache
+from disk_cache import DiskCache
+from estudio_scraper import obtener_datos_preview_ligero
+from preview_cache import PreviewCache, preview_ttl_seconds
+from scheduler import PRIORITY_PREFETCH
+from serializers import load_file, resolve_format
+
+WARM_KICKOFF_WINDOW_HOURS = float(os.environ.get('WARM_KICKOFF_WINDOW_HOURS', 6))
+WARM_MAX_MATCHES = int(os.environ.get('WARM_MAX_MATCHES', 40))
+WARM_CONCURRENCY = int(os.environ.get('WARM_CONCURRENCY', 2))
+WARM_TIME_BUDGET_SECONDS = float(os.environ.get('WARM_TIME_BUDGET_SECONDS', 900))
+WARM_PREVIEWS = os.environ.get('WARM_PREVIEWS', '1') != '0'
+WARM_ANALYSES = os.environ.get('WARM_ANALYSES', '1') != '0'
+
+# Directorios compartidos con la app Flask (por defecto, su carpeta static junto a este fichero)
+ANALYSIS_CACHE_DIR = os.environ.get('ANALYSIS_CACHE_DIR') or str(Path(__file__).resolve().parent / 'static' / 'cached_previews')
+ANALYSIS_CACHE_MAX_MB = int(os.environ.get('ANALYSIS_CACHE_MAX_MB', 512))
+ANALYSIS_CACHE_MAX_AGE_DAYS = int(os.environ.get('ANALYSIS_CACHE_MAX_AGE_DAYS', 30))
+PREVIEW_DISK_CACHE_DIR = os.environ.get('PREVIEW_DISK_CACHE_DIR') or None
+PREVIEW_CACHE_FORMAT = resolve_format(os.environ.get('PREVIEW_CACHE_FORMAT'))
+
+
+def _parse_kickoff(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def select_warm_targets(data, now: datetime.datetime | None = None, window_hours: float = WARM_KICKOFF_WINDOW_HOURS,
+                        max_matches: int = WARM_MAX_MATCHES):
+    """Próximos partidos que empiezan dentro de la ventana, ordenados por hora de inicio (UTC)."""
+    now = now or datetime.datetime.utcnow()
+    limit = now + datetime.timedelta(hours=window_hours)
+    targets = []
+    for entry in (data or {}).get('upcoming_matches', []):
+        kickoff = _parse_kickoff(entry.get('time_obj'))
+        match_id = str(entry.get('id') or '')
+        if not match_id.isdigit() or kickoff is None or not (now <= kickoff <= limit):
+            continue
+        targets.append((kickoff, match_id))
+    targets.sort()
+    return targets[:max_matches] if max_matches > 0 else targets
+
+
+def build_shared_caches(preview_max_entries: int = 1):
+    """(cache de análisis, cache de vistas previas o None) sobre los mismos directorios que usa la app."""
+    analysis_disk = DiskCache(
+        ANALYSIS_CACHE_DIR,
+        max_bytes=ANALYSIS_CACHE_MAX_MB * 1024 * 1024,
+        max_age=ANALYSIS_CACHE_MAX_AGE_DAYS * 86400 if ANALYSIS_CACHE_MAX_AGE_DAYS > 0 else None,
+        fmt=PREVIEW_CACHE_FORMAT,
+    )
+    preview_disk = None
+    if PREVIEW_DISK_CACHE_DIR:
+        preview_disk = DiskCache(PREVIEW_DISK_CACHE_DIR, max_bytes=128 * 1024 * 1024, fmt=PREVIEW_CACHE_FORMAT)
+    preview_disk = namespace_cache(NS_PREVIEWS, preview_disk)
+    preview_cache = PreviewCache(max_entries=preview_max_entries, disk_cache=preview_disk) if preview_disk is not None else None
+    return namespace_cache(NS_ANALYSES, analysis_disk), preview_cache
+
+
+def warm_caches(data, analysis_disk, preview_cache=None, concurrency: int = WARM_CONCURRENCY,
+                time_budget: float = WARM_TIME_BUDGET_SECONDS, now: datetime.datetime | None = None) -> dict:
+    """Precalienta vistas previas y análisis de los partidos seleccionados. Devuelve estadísticas."""
+    targets = select_warm_targets(data, now)
+    kickoffs = {match_id: kickoff for kickoff, match_id in targets}
+    service = AnalysisService(analysis_disk, match_state_lookup=lambda match_id: ('upcoming_matches', kickoffs.get(match_id)))
+    deadline = time.monotonic() + time_budget
+    stats = {"targets": len(targets), "previews": 0, "analyses": 0, "fresh": 0, "errors": 0, "skipped": 0}
+    stats_lock = threading.Lock()
+
+    def _count(key):
+        with stats_lock:
+            stats[key] += 1
+
+    def _warm_preview(match_id):
+        if preview_cache.get(match_id, 'light') is not None:
+            _count("fresh")
+            return
+        preview = obtener_datos_preview_ligero(match_id)
+        if not preview or preview.get('error'):
+            _count("errors")
+            return
+        preview_cache.put(match_id, 'light', preview, preview_ttl_seconds(kickoffs.get(match_id)))
+        _count("previews")
+
+    def _warm_analysis(match_id):
+        _, stale_reason = service.get_cached(match_id)
+        if stale_reason is None:
+            _count("fresh")
+            return
+        service.compute(match_id, priority=PRIORITY_PREFETCH)
+        _count("analyses")
+
+    def _run(task, match_id):
+        if time.monotonic() >= deadline:
+            _count("skipped")
+            return
+        try:
+            task(match_id)
+        except Exception as exc:
+            print(f"Error al precalentar {match_id} ({task.__name__}): {exc}")
+            _count("errors")
+
+    tasks = []
+    # Las vistas previas son baratas: van primero para que estén listas cuanto antes
+    if WARM_PREVIEWS and preview_cache is not None:
+        tasks.extend((_warm_preview, match_id) for _, match_id in targets)
+    if WARM_ANALYSES:
+        tasks.extend((_warm_analysis, match_id) for _, match_id in targets)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='cache-warmer') as executor:
+        for task, match_id in tasks:
+            executor.submit(_run, task, match_id)
+    return stats
+
+
+def run_warming_stage(data) -> dict | None:
+    """Punto de entrada para run_scraper.py: construye las caches compartidas y las precalienta."""
+    start_time = time.time()
+    analysis_disk, preview_cache = build_shared_caches()
+    stats = warm_caches(data, analysis_disk, preview_cache)
+    print(f"Precalentado de caches: {stats['targets']} partidos, {stats['previews']} vistas previas y "
+          f"{stats['analyses']} análisis calculados, {stats['fresh']} ya frescos, {stats['errors']} errores, "
+          f"{stats['skipped']} descartados por tiempo ({time.time() - start_time:.1f}s).")
+    return stats
+
+
+if __name__ == '__main__':
+    data_path = sys.argv[1] if len(sys.argv) > 1 else 'data.json'
+    run_warming_stage(load_file(data_path))
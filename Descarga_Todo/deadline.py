@@ -0,0 +1,41 @@
+# deadline.py - Presupuesto de tiempo por petición
+"""
+Un `Deadline` se crea al empezar un análisis y se pasa a cada etapa. Las esperas
+(timeouts HTTP, WebDriverWait, carga de página) se recortan con `clamp_timeout`
+para que ninguna pueda pasarse del tiempo que queda; cuando el presupuesto se ha
+agotado `clamp_timeout` lanza DeadlineExceeded y la etapa se da por no terminada.
+"""
+import time
+
+# Espera mínima concedida mientras quede presupuesto (un timeout de 0 significa "sin límite" en algunas APIs)
+MIN_WAIT_SECONDS = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el presupuesto de tiempo de la petición."""
+
+
+class Deadline:
+    __slots__ = ('budget', 'expires_at')
+
+    def __init__(self, seconds: float):
+        self.budget = float(seconds)
+        self.expires_at = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what: str = 'la operación'):
+        if self.expired():
+            raise DeadlineExceeded(f"Tiempo agotado (timeout de {self.budget:.0f}s) antes de {what}.")
+
+
+def clamp_timeout(deadline: Deadline | None, timeout: float, what: str = 'la operación') -> float:
+    """`timeout` recortado a lo que queda del presupuesto; sin deadline se devuelve tal cual."""
+    if deadline is None:
+        return timeout
+    deadline.check(what)
+    return max(MIN_WAIT_SECONDS, min(float(timeout), deadline.remaining()))
@@ -0,0 +1,124 @@
+# negative_cache.py - Cache negativa de IDs inválidos, inexistentes o que fallan al scrapear
+"""
+Recuerda durante un tiempo corto los fallos por (operación, match_id) para que
+los reintentos desde la UI o `start_analysis_background` fallen al momento en
+lugar de abrir otro Chrome y esperar los mismos timeouts.
+
+- Cada fallo guarda la clase de error, el mensaje y el instante.
+- El bloqueo crece con backoff exponencial por fallos consecutivos
+  (base según la clase de error, x NEGATIVE_CACHE_BACKOFF_FACTOR, hasta NEGATIVE_CACHE_MAX_TTL).
+- Un éxito borra la entrada; pasado NEGATIVE_CACHE_RESET_SECONDS sin fallos se
+  olvida el contador.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ERROR_INVALID_ID = 'invalid_id'
+ERROR_NOT_FOUND = 'not_found'
+ERROR_TIMEOUT = 'timeout'
+ERROR_SCRAPE = 'scrape_error'
+ERROR_CLASSES = (ERROR_INVALID_ID, ERROR_NOT_FOUND, ERROR_TIMEOUT, ERROR_SCRAPE)
+# Mensaje exacto del scraper para un ID mal formado (el único fallo que bloquea un día entero)
+INVALID_ID_MESSAGE = 'ID de partido inválido.'
+
+# Bloqueo inicial (segundos) por clase de error
+NEGATIVE_TTL_BY_CLASS = {
+    ERROR_INVALID_ID: 24 * 3600,
+    ERROR_NOT_FOUND: 5 * 60,
+    ERROR_TIMEOUT: 30,
+    ERROR_SCRAPE: 60,
+}
+NEGATIVE_CACHE_BACKOFF_FACTOR = float(os.environ.get('NEGATIVE_CACHE_BACKOFF_FACTOR', 2))
+NEGATIVE_CACHE_MAX_TTL = int(os.environ.get('NEGATIVE_CACHE_MAX_TTL', 30 * 60))
+NEGATIVE_CACHE_RESET_SECONDS = int(os.environ.get('NEGATIVE_CACHE_RESET_SECONDS', 6 * 3600))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.environ.get('NEGATIVE_CACHE_MAX_ENTRIES', 4096))
+
+
+def classify_error(message, error_class: str | None = None) -> str:
+    """
+    Clase de error de un fallo del scraper. Manda la clase explícita ({"error_class": ...})
+    si la trae; si no, se deduce del mensaje ({"error": ...}). Los mensajes de excepción
+    envueltos ("Error durante el scraping: invalid session id") no cuentan como ID inválido.
+    """
+    if error_class in ERROR_CLASSES:
+        return error_class
+    if str(message or '').strip() == INVALID_ID_MESSAGE:
+        return ERROR_INVALID_ID
+    text = str(message or '').lower()
+    if 'timeout' in text or 'timed out' in text or 'tardó demasiado' in text:
+        return ERROR_TIMEOUT
+    if 'no encontrad' in text or 'not found' in text or '404' in text or 'no está en el archivo' in text:
+        return ERROR_NOT_FOUND
+    return ERROR_SCRAPE
+
+
+class NegativeEntry:
+    __slots__ = ('error_class', 'message', 'failed_at', 'failures', 'blocked_until')
+
+    def __init__(self, error_class, message, failed_at, failures, blocked_until):
+        self.error_class = error_class
+        self.message = message
+        self.failed_at = failed_at
+        self.failures = failures
+        self.blocked_until = blocked_until
+
+    def retry_after(self, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        return max(1, int(self.blocked_until - now + 0.999))
+
+
+class NegativeCache:
+    def __init__(self, max_entries: int = NEGATIVE_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # (operación, match_id) -> NegativeEntry
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def block_seconds(error_class: str, failures: int) -> float:
+        base = NEGATIVE_TTL_BY_CLASS.get(error_class, NEGATIVE_TTL_BY_CLASS[ERROR_SCRAPE])
+        if error_class == ERROR_INVALID_ID:
+            # Un ID mal formado no se arregla reintentando: sin backoff
+            return base
+        return min(base * NEGATIVE_CACHE_BACKOFF_FACTOR ** max(failures - 1, 0), max(NEGATIVE_CACHE_MAX_TTL, base))
+
+    def check(self, operation: str, match_id) -> NegativeEntry | None:
+        """Entrada bloqueante para (operación, match_id) o None si se puede intentar."""
+        key = (operation, str(match_id))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry.failed_at > NEGATIVE_CACHE_RESET_SECONDS:
+                del self._entries[key]
+                return None
+            return entry if entry.blocked_until > now else None
+
+    def record_failure(self, operation: str, match_id, message, error_class: str | None = None) -> NegativeEntry:
+        key = (operation, str(match_id))
+        now = time.time()
+        error_class = classify_error(message, error_class)
+        with self._lock:
+            previous = self._entries.get(key)
+            failures = 1
+            if previous is not None and now - previous.failed_at <= NEGATIVE_CACHE_RESET_SECONDS:
+                failures = previous.failures + 1
+            entry = NegativeEntry(error_class, str(message or ''), now, failures,
+                                  now + self.block_seconds(error_class, failures))
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        print(f"Cache negativa: {operation} {match_id} bloqueado {entry.retry_after(now)}s "
+              f"({error_class}, fallo #{failures}).")
+        return entry
+
+    def record_success(self, operation: str, match_id):
+        with self._lock:
+            self._entries.pop((operation, str(match_id)), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,369 @@
+# page_archive.py - Archivo comprimido de páginas de NowGoal (h2h, live, portada, resultados)
+"""
+Guarda el HTML de cada página descargada para poder recalcular análisis sin
+volver a la red (p.ej. tras corregir un extractor) y servir páginas ya vistas.
+
+Estructura en disco (por defecto `<dir del módulo>/cache/page_archive/`):
+    blobs/ab/<sha256>.zst       contenido comprimido, direccionado por su sha256
+    index/cd/<sha1(url)>.jsonl  una línea por descarga: url, variante, fecha, sha256, tipo
+
+- El mismo HTML descargado varias veces se guarda una sola vez (mismo sha256).
+- Compresión zstd si `zstandard` está instalado; si no, zlib (`.zz`).
+- `variant` distingue el HTML crudo de requests ('raw') del DOM renderizado por
+  Selenium/Playwright tras interactuar con la página ('rendered').
+- `prune()` aplica la retención (días y número máximo de versiones por URL) y
+  borra los blobs que ya no referencia ningún índice. La instancia compartida la
+  ejecuta en un hilo demonio cada PAGE_ARCHIVE_PRUNE_SECONDS, y run_scraper al
+  terminar (`prune_page_archive()`).
+- Con un backend de cache compartido (CACHE_BACKEND=memory/redis) la última
+  versión de cada página se publica también en el espacio de nombres 'pages',
+  para que otros workers o máquinas la lean sin volver a descargarla.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from cache_backend import NS_PAGES, namespace_cache
+from serializers import DECODE_ERRORS, dumps_json, loads_json
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+    HAS_ZSTD = False
+
+PAGE_ARCHIVE_ENABLED = os.environ.get('PAGE_ARCHIVE_ENABLED', '1') != '0'
+PAGE_ARCHIVE_DIR = os.environ.get('PAGE_ARCHIVE_DIR') or str(Path(__file__).resolve().parent / 'cache' / 'page_archive')
+PAGE_ARCHIVE_RETENTION_DAYS = int(os.environ.get('PAGE_ARCHIVE_RETENTION_DAYS', 30))
+PAGE_ARCHIVE_MAX_VERSIONS = int(os.environ.get('PAGE_ARCHIVE_MAX_VERSIONS', 5))
+PAGE_ARCHIVE_ZSTD_LEVEL = int(os.environ.get('PAGE_ARCHIVE_ZSTD_LEVEL', 9))
+# Cada cuánto aplica la retención el janitor de la instancia compartida (0 = nunca)
+PAGE_ARCHIVE_PRUNE_SECONDS = int(os.environ.get('PAGE_ARCHIVE_PRUNE_SECONDS', 6 * 3600))
+
+VARIANT_RAW = 'raw'
+VARIANT_RENDERED = 'rendered'
+
+_SUFFIX_ZSTD = '.zst'
+_SUFFIX_ZLIB = '.zz'
+# Un blob escrito o reutilizado hace menos de esto no se borra: puede estar a punto de indexarse
+_PRUNE_GRACE_SECONDS = 300
+
+
+def page_kind(url: str) -> str:
+    """Tipo de página NowGoal a partir de la URL: 'h2h', 'live', 'results', 'main' u 'other'."""
+    if re.search(r'/match/h2h-\d+', url):
+        return 'h2h'
+    if re.search(r'/match/live-\d+', url):
+        return 'live'
+    if '/football/results' in url:
+        return 'results'
+    if re.match(r'^https?://[^/]+/?$', url):
+        return 'main'
+    return 'other'
+
+
+def _compress(data: bytes) -> tuple[bytes, str]:
+    if HAS_ZSTD:
+        return zstandard.ZstdCompressor(level=PAGE_ARCHIVE_ZSTD_LEVEL).compress(data), _SUFFIX_ZSTD
+    return zlib.compress(data, 6), _SUFFIX_ZLIB
+
+
+def _decompress(data: bytes, suffix: str) -> bytes:
+    if suffix == _SUFFIX_ZSTD:
+        if not HAS_ZSTD:
+            raise RuntimeError("El archivo contiene blobs zstd pero 'zstandard' no está instalado.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class ArchivedPage:
+    __slots__ = ('url', 'variant', 'fetched_at', 'sha256', 'html')
+
+    def __init__(self, url, variant, fetched_at, sha256, html):
+        self.url = url
+        self.variant = variant
+        self.fetched_at = fetched_at
+        self.sha256 = sha256
+        self.html = html
+
+
+class PageArchive:
+    def __init__(self, root, retention_days: int | None = PAGE_ARCHIVE_RETENTION_DAYS,
+                 max_versions: int | None = PAGE_ARCHIVE_MAX_VERSIONS):
+        self.root = Path(root)
+        self.retention_days = retention_days if retention_days and retention_days > 0 else None
+        self.max_versions = max_versions if max_versions and max_versions > 0 else None
+        self._index_lock = threading.Lock()
+        self._janitor = None
+        self._janitor_stop = threading.Event()
+
+    # --- Rutas ---
+    def _blob_path(self, digest: str, suffix: str) -> Path:
+        return self.root / 'blobs' / digest[:2] / f"{digest}{suffix}"
+
+    def _find_blob(self, digest: str) -> Path | None:
+        for suffix in (_SUFFIX_ZSTD, _SUFFIX_ZLIB):
+            path = self._blob_path(digest, suffix)
+            if path.exists():
+                return path
+        return None
+
+    def _index_path(self, url: str) -> Path:
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.root / 'index' / digest[:2] / f"{digest}.jsonl"
+
+    def _read_index(self, path: Path):
+        try:
+            with path.open('rb') as fh:
+                lines = fh.read().splitlines()
+        except FileNotFoundError:
+            return []
+        except OSError as exc:
+            print(f"Error al leer el índice del archivo de páginas {path}: {exc}")
+            return []
+        entries = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                entry = loads_json(line)
+            except DECODE_ERRORS:
+                continue
+            if isinstance(entry, dict) and entry.get('sha256'):
+                entries.append(entry)
+        return entries
+
+    # --- Escritura ---
+    def put(self, url: str, html: str, variant: str = VARIANT_RAW, fetched_at: float | None = None) -> str | None:
+        """Archiva el HTML de `url`. Devuelve el sha256 del contenido o None si falla."""
+        if not html:
+            return None
+        data = html.encode('utf-8') if isinstance(html, str) else bytes(html)
+        digest = hashlib.sha256(data).hexdigest()
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        try:
+            existing = self._find_blob(digest)
+            if existing is not None:
+                # Se renueva la fecha para que un prune concurrente no lo borre antes de indexarlo
+                os.utime(existing)
+            else:
+                compressed, suffix = _compress(data)
+                path = self._blob_path(digest, suffix)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-', suffix=suffix)
+                try:
+                    with os.fdopen(fd, 'wb') as fh:
+                        fh.write(compressed)
+                    os.replace(tmp_name, path)
+                except BaseException:
+                    Path(tmp_name).unlink(missing_ok=True)
+                    raise
+            index_path = self._index_path(url)
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            line = dumps_json({
+                'url': url,
+                'variant': variant,
+                'fetched_at': fetched_at,
+                'sha256': digest,
+                'kind': page_kind(url),
+            }) + b'\n'
+            with self._index_lock, index_path.open('ab') as fh:
+                fh.write(line)
+            return digest
+        except OSError as exc:
+            print(f"Error al archivar la página {url}: {exc}")
+            return None
+
+    # --- Lectura ---
+    def history(self, url: str, variant: str | None = None):
+        """Descargas archivadas de `url` (más antigua primero), opcionalmente de una sola variante."""
+        entries = self._read_index(self._index_path(url))
+        if variant is not None:
+            entries = [e for e in entries if e.get('variant') == variant]
+        entries.sort(key=lambda e: float(e.get('fetched_at') or 0))
+        return entries
+
+    def get(self, url: str, variant: str | None = None, max_age: float | None = None,
+            at: float | None = None) -> ArchivedPage | None:
+        """
+        Última versión archivada de `url` (de la variante pedida, o de cualquiera si es None).
+        `at` devuelve la última descargada en o antes de ese instante; `max_age` descarta las más antiguas.
+        """
+        now = time.time()
+        for entry in reversed(self.history(url, variant)):
+            fetched_at = float(entry.get('fetched_at') or 0)
+            if at is not None and fetched_at > at:
+                continue
+            if max_age is not None and now - fetched_at > max_age:
+                return None
+            blob = self._find_blob(entry['sha256'])
+            if blob is None:
+                continue
+            try:
+                html = _decompress(blob.read_bytes(), blob.suffix).decode('utf-8', errors='replace')
+            except (OSError, RuntimeError, zlib.error) as exc:
+                print(f"Blob del archivo de páginas ilegible {blob}: {exc}")
+                continue
+            except Exception as exc:
+                # zstandard lanza su propio ZstdError
+                print(f"Blob del archivo de páginas corrupto {blob}: {exc}")
+                continue
+            return ArchivedPage(url, entry.get('variant'), fetched_at, entry['sha256'], html)
+        return None
+
+    def get_html(self, url: str, variant: str | None = None, max_age: float | None = None) -> str | None:
+        page = self.get(url, variant=variant, max_age=max_age)
+        return page.html if page else None
+
+    # --- Mantenimiento ---
+    def prune(self, now: float | None = None) -> dict:
+        """Aplica la retención a los índices y borra los blobs huérfanos."""
+        now = time.time() if now is None else now
+        cutoff = now - self.retention_days * 86400 if self.retention_days else None
+        stats = {"removed_entries": 0, "removed_blobs": 0, "freed_bytes": 0}
+        index_root = self.root / 'index'
+        blob_root = self.root / 'blobs'
+        if not index_root.exists():
+            return stats
+
+        referenced = set()
+        with self._index_lock:
+            for index_path in index_root.glob('*/*.jsonl'):
+                entries = self._read_index(index_path)
+                entries.sort(key=lambda e: float(e.get('fetched_at') or 0))
+                kept = [e for e in entries if cutoff is None or float(e.get('fetched_at') or 0) >= cutoff]
+                if self.max_versions:
+                    by_variant = {}
+                    for entry in kept:
+                        by_variant.setdefault(entry.get('variant'), []).append(entry)
+                    kept = [e for group in by_variant.values() for e in group[-self.max_versions:]]
+                    kept.sort(key=lambda e: float(e.get('fetched_at') or 0))
+                stats["removed_entries"] += len(entries) - len(kept)
+                if not kept:
+                    index_path.unlink(missing_ok=True)
+                    continue
+                if len(kept) != len(entries):
+                    tmp_path = index_path.with_name(f".{index_path.name}.{os.getpid()}.tmp")
+                    tmp_path.write_bytes(b''.join(dumps_json(e) + b'\n' for e in kept))
+                    os.replace(tmp_path, index_path)
+                referenced.update(e['sha256'] for e in kept)
+
+        if blob_root.exists():
+            grace_cutoff = time.time() - _PRUNE_GRACE_SECONDS
+            for blob in blob_root.glob('*/*'):
+                digest = blob.name.split('.', 1)[0]
+                orphan_tmp = blob.name.startswith('.tmp-')
+                try:
+                    mtime = blob.stat().st_mtime
+                except OSError:
+                    continue
+                if orphan_tmp and now - mtime < 3600:
+                    continue
+                if not orphan_tmp and mtime >= grace_cutoff:
+                    continue
+                if orphan_tmp or digest not in referenced:
+                    try:
+                        size = blob.stat().st_size
+                        blob.unlink()
+                    except OSError:
+                        continue
+                    stats["removed_blobs"] += 1
+                    stats["freed_bytes"] += size
+        return stats
+
+    def start_janitor(self, interval: float = PAGE_ARCHIVE_PRUNE_SECONDS):
+        """Arranca (una sola vez) un hilo demonio que ejecuta `prune()` cada `interval` segundos."""
+        if self._janitor is not None:
+            return self._janitor
+
+        def _run():
+            while not self._janitor_stop.wait(interval):
+                try:
+                    _report_prune(self.prune())
+                except Exception as exc:
+                    print(f"Error en el janitor del archivo de páginas {self.root}: {exc}")
+
+        self._janitor = threading.Thread(target=_run, name='page-archive-janitor', daemon=True)
+        self._janitor.start()
+        return self._janitor
+
+    def stop_janitor(self):
+        self._janitor_stop.set()
+
+
+def _report_prune(result: dict):
+    if result["removed_entries"] or result["removed_blobs"]:
+        print(f"Archivo de páginas: {result['removed_entries']} descargas y {result['removed_blobs']} blobs "
+              f"eliminados ({result['freed_bytes']} bytes liberados).")
+
+
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+
+def get_page_archive() -> PageArchive | None:
+    """Instancia compartida (perezosa) del archivo de páginas, o None si está desactivado."""
+    global _default_archive
+    if not PAGE_ARCHIVE_ENABLED:
+        return None
+    with _default_archive_lock:
+        if _default_archive is None:
+            _default_archive = PageArchive(PAGE_ARCHIVE_DIR)
+            if PAGE_ARCHIVE_PRUNE_SECONDS > 0:
+                _default_archive.start_janitor(PAGE_ARCHIVE_PRUNE_SECONDS)
+        return _default_archive
+
+
+def prune_page_archive() -> dict | None:
+    """Aplica la retención al archivo compartido (para procesos cortos como run_scraper)."""
+    archive = get_page_archive()
+    if archive is None:
+        return None
+    result = archive.prune()
+    _report_prune(result)
+    return result
+
+
+def archive_page(url: str, html: str, variant: str = VARIANT_RAW):
+    """Atajo para archivar una página con la instancia compartida (no hace nada si está desactivado)."""
+    archive = get_page_archive()
+    if archive is None or not html:
+        return
+    archive.put(url, html, variant=variant)
+    shared_pages = namespace_cache(NS_PAGES)
+    if shared_pages is not None:
+        shared_pages.set(f"{variant}:{url}", {'html': html, 'fetched_at': time.time()})
+
+
+def archived_html(url: str, variant: str | None = None, max_age: float | None = None) -> str | None:
+    """HTML archivado más reciente de `url` (archivo local y, si lo hay, backend compartido), o None."""
+    archive = get_page_archive()
+    if archive is None:
+        return None
+    html = archive.get_html(url, variant=variant, max_age=max_age)
+    if html is not None:
+        return html
+    shared_pages = namespace_cache(NS_PAGES)
+    if shared_pages is None:
+        return None
+    for candidate in ([variant] if variant else [VARIANT_RENDERED, VARIANT_RAW]):
+        stored = shared_pages.get(f"{candidate}:{url}")
+        if not isinstance(stored, dict) or not stored.get('html'):
+            continue
+        if max_age is not None and time.time() - float(stored.get('fetched_at') or 0) > max_age:
+            continue
+        return stored['html']
+    return None
+
+
+if __name__ == '__main__':
+    # Uso manual: python page_archive.py prune
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'prune':
+        _report_prune(PageArchive(PAGE_ARCHIVE_DIR).prune())
@@ -0,0 +1,223 @@
+# results_crawler.py - Rastreador de resultados de varios días para el histórico de finalizados
+"""
+Recorre las páginas de resultados de un rango de fechas y las añade al histórico
+de finalizados (history_store.FinishedHistoryStore), p.ej. para rellenar meses
+pasados o ponerse al día tras una caída del scraper horario.
+
+- Las páginas de cada día se descargan en paralelo (CRAWLER_CONCURRENCY) pero
+  sin superar CRAWLER_RATE_PER_SECOND peticiones por segundo al host. Se usa el
+  cliente HTTP compartido de scraping_logic.ScrapeResources y, si una página
+  llega sin partidos, un único navegador para renderizarla.
+- El parseo (BeautifulSoup) se hace en un pool de procesos para no frenar las
+  descargas.
+- De cada página solo se guardan los partidos cuya fecha es la del día pedido
+  (si el host ignorase la fecha de la URL, no se mezclan días).
+- Cada día se fusiona en el histórico (dedup por ID) y se anota en un fichero
+  de checkpoint. Si el rastreo se interrumpe, al relanzarlo se saltan los días
+  ya hechos. El día en curso nunca se marca como hecho: aún le faltan resultados.
+- Un día sin partidos de esa fecha (captcha, página vacía, otra fecha) cuenta
+  como fallido y no se anota, salvo que la página traiga la tabla de resultados
+  (RESULTS_TABLE_ID) sin ninguna fila: entonces ese día no hubo partidos.
+
+Uso:
+    python results_crawler.py 2025-08-01 2025-10-18 [--reset]
+"""
+import asyncio
+import datetime
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from history_store import FinishedHistoryStore, _match_day
+from page_archive import VARIANT_RAW, archive_page
+from scraping_logic import ScrapeResources, _build_nowgoal_url, parse_main_page_finished_matches
+from serializers import DECODE_ERRORS, dumps_json, loads_json
+
+HISTORY_DIR = os.environ.get('HISTORY_DIR', 'history/finished')
+# Ruta de la página de resultados de un día; {date} se sustituye por YYYY-MM-DD
+RESULTS_DAY_PATH = os.environ.get('RESULTS_DAY_PATH', 'football/results?date={date}')
+# id de la tabla de resultados: presente y sin filas = día sin partidos
+RESULTS_TABLE_ID = os.environ.get('RESULTS_TABLE_ID', 'table_live')
+CRAWLER_CONCURRENCY = int(os.environ.get('CRAWLER_CONCURRENCY', 4))
+CRAWLER_RATE_PER_SECOND = float(os.environ.get('CRAWLER_RATE_PER_SECOND', 1.0))
+CRAWLER_PARSE_WORKERS = int(os.environ.get('CRAWLER_PARSE_WORKERS', 0)) or None  # None = nº de CPUs
+CHECKPOINT_FILE = '.crawl_checkpoint.json'
+# Sin límite de partidos por página: se guardan todos los del día
+_PARSE_LIMIT = 100000
+
+
+class RateLimiter:
+    """Espaciado mínimo entre peticiones (1 / rate segundos), compartido por todas las tareas."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class CrawlCheckpoint:
+    """Días ya rastreados y fusionados, en un JSON junto al histórico (escritura atómica)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.days = {}
+        try:
+            with open(path, 'rb') as fh:
+                data = loads_json(fh.read())
+            if isinstance(data, dict) and isinstance(data.get('days'), dict):
+                self.days = data['days']
+        except FileNotFoundError:
+            pass
+        except (OSError, *DECODE_ERRORS) as exc:
+            print(f"Checkpoint ilegible ({path}); se empieza de cero: {exc}")
+
+    def is_done(self, day: str) -> bool:
+        return day in self.days
+
+    def mark_done(self, day: str, matches: int, added: int):
+        self.days[day] = {'matches': matches, 'added': added, 'at': time.time()}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            fh.write(dumps_json({'days': self.days}))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.days = {}
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def day_range(start: datetime.date, end: datetime.date):
+    day = start
+    while day <= end:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+_RESULTS_TABLE_RE = re.compile(r"""id=["']?""" + re.escape(RESULTS_TABLE_ID) + r"""["'\s>]""")
+_MATCH_ROW_RE = re.compile(r"""id=["']?tr1_""")
+
+
+def _parse_results_page(html_content, day_key):
+    """
+    (partidos del día `day_key`, listado_vacío). `listado_vacío` es True solo si la
+    página trae la tabla de resultados sin ninguna fila de partido.
+    Se ejecuta en otro proceso: solo recibe y devuelve datos serializables.
+    """
+    matches = [match for match in parse_main_page_finished_matches(html_content, limit=_PARSE_LIMIT)
+               if _match_day(match) == day_key]
+    empty_listing = bool(_RESULTS_TABLE_RE.search(html_content)) and not _MATCH_ROW_RE.search(html_content)
+    return matches, empty_listing
+
+
+async def crawl_results(start: datetime.date, end: datetime.date, history_dir: str = HISTORY_DIR,
+                        concurrency: int = CRAWLER_CONCURRENCY, rate_per_second: float = CRAWLER_RATE_PER_SECOND,
+                        reset: bool = False) -> dict:
+    """Rastrea los días de `start` a `end` (inclusive). Devuelve un resumen del rastreo."""
+    store = FinishedHistoryStore(history_dir)
+    checkpoint = CrawlCheckpoint(os.path.join(history_dir, CHECKPOINT_FILE))
+    if reset:
+        checkpoint.reset()
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    pending = [day for day in day_range(start, end) if not checkpoint.is_done(day.isoformat())]
+    summary = {'days': 0, 'skipped': (end - start).days + 1 - len(pending), 'failed': [], 'matches': 0, 'added': 0}
+    if not pending:
+        return summary
+
+    queue = asyncio.Queue()
+    for day in pending:
+        queue.put_nowait(day)
+    limiter = RateLimiter(rate_per_second)
+    merge_lock = asyncio.Lock()
+    loop = asyncio.get_running_loop()
+
+    async def _crawl_day(resources, parse_pool, day):
+        """Partidos del día (lista vacía solo si la página lo confirma) o None si el día ha fallado."""
+        day_key = day.isoformat()
+        url = _build_nowgoal_url(RESULTS_DAY_PATH.format(date=day_key))
+        await limiter.wait()
+        html_content = await resources.fetch_html(url)
+        matches, empty_listing = [], False
+        if html_content:
+            matches, empty_listing = await loop.run_in_executor(parse_pool, _parse_results_page, html_content, day_key)
+        if not matches and not empty_listing:
+            # Sin partidos de ese día por HTTP: se intenta renderizada (un solo navegador para todo el rastreo)
+            await limiter.wait()
+            try:
+                html_content = await resources.render_html(url)
+            except Exception as exc:
+                print(f"Error al renderizar {url}: {exc}")
+                html_content = None
+            if html_content is None:
+                return None
+            matches, empty_listing = await loop.run_in_executor(parse_pool, _parse_results_page, html_content, day_key)
+            if not matches and not empty_listing:
+                print(f"Día {day_key}: la página no trae partidos de esa fecha; se reintentará.")
+                return None
+        await asyncio.to_thread(archive_page, url, html_content, VARIANT_RAW)
+        return matches
+
+    async def _worker(resources, parse_pool):
+        while True:
+            try:
+                day = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            day_key = day.isoformat()
+            try:
+                matches = await _crawl_day(resources, parse_pool, day)
+            except Exception as exc:
+                print(f"Error al rastrear el día {day_key}: {exc}")
+                matches = None
+            if matches is None:
+                summary['failed'].append(day_key)
+                continue
+            # Las escrituras al histórico y al checkpoint van de una en una
+            async with merge_lock:
+                added = await asyncio.to_thread(store.merge, matches)
+                if day < today:
+                    checkpoint.mark_done(day_key, len(matches), added)
+            summary['days'] += 1
+            summary['matches'] += len(matches)
+            summary['added'] += added
+            print(f"Día {day_key}: {len(matches)} partidos, {added} nuevos en el histórico.")
+
+    with ProcessPoolExecutor(max_workers=CRAWLER_PARSE_WORKERS) as parse_pool:
+        async with ScrapeResources() as resources:
+            workers = [asyncio.create_task(_worker(resources, parse_pool)) for _ in range(max(1, concurrency))]
+            await asyncio.gather(*workers)
+    summary['failed'].sort()
+    return summary
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Uso: python results_crawler.py AAAA-MM-DD AAAA-MM-DD [--reset]")
+        return 2
+    start = datetime.date.fromisoformat(argv[0])
+    end = datetime.date.fromisoformat(argv[1])
+    if end < start:
+        start, end = end, start
+    summary = asyncio.run(crawl_results(start, end, reset='--reset' in argv))
+    print(f"Rastreo terminado: {summary['days']} días, {summary['matches']} partidos, {summary['added']} nuevos, "
+          f"{summary['skipped']} días ya hechos, fallidos: {', '.join(summary['failed']) or 'ninguno'}.")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,190 @@
+# scheduler.py - Planificador con prioridades para el trabajo que usa navegadores/sockets
+"""
+Reparte los "slots" de scraping (navegadores Chrome, conexiones a NowGoal)
+entre tres clases de prioridad:
+
+    interactive  peticiones de un usuario que espera (/api/preview, /api/analisis, /estudio)
+    background   trabajo pedido por el usuario pero sin espera (start_analysis_background, lotes, refrescos)
+    prefetch     trabajo especulativo (precalentado, prefetch de vistas previas)
+
+- Cada clase tiene un cupo de concurrencia (SCHEDULER_QUOTA_*) y hay un límite
+  global (SCHEDULER_MAX_CONCURRENCY).
+- Las esperas se atienden por clase y, dentro de la clase, por orden de llegada:
+  un clic nunca queda detrás de un lote en segundo plano.
+- La clase interactive puede superar el límite global en SCHEDULER_INTERACTIVE_BURST
+  slots: si todo está ocupado por trabajo de fondo, el usuario no espera a que acabe.
+- Las tareas encoladas con `submit()` se pueden cancelar mientras no hayan empezado.
+"""
+import bisect
+import itertools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_PREFETCH = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_BACKGROUND: 'background',
+    PRIORITY_PREFETCH: 'prefetch',
+}
+
+SCHEDULER_MAX_CONCURRENCY = int(os.environ.get('SCHEDULER_MAX_CONCURRENCY', 4))
+SCHEDULER_INTERACTIVE_BURST = int(os.environ.get('SCHEDULER_INTERACTIVE_BURST', 2))
+SCHEDULER_QUOTAS = {
+    PRIORITY_INTERACTIVE: int(os.environ.get('SCHEDULER_QUOTA_INTERACTIVE', 4)),
+    PRIORITY_BACKGROUND: int(os.environ.get('SCHEDULER_QUOTA_BACKGROUND', 2)),
+    PRIORITY_PREFETCH: int(os.environ.get('SCHEDULER_QUOTA_PREFETCH', 1)),
+}
+
+
+class SchedulerTimeout(Exception):
+    """No se obtuvo slot dentro del tiempo de espera indicado."""
+
+
+class Ticket:
+    """Petición de slot: o bien un hilo esperando (`event`), o bien una tarea encolada (`fn`)."""
+    __slots__ = ('priority', 'seq', 'key', 'event', 'fn', 'args', 'kwargs', 'future', 'granted', 'cancelled')
+
+    def __init__(self, priority, seq, key=None, fn=None, args=(), kwargs=None):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.event = threading.Event()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.future = Future() if fn is not None else None
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class PriorityScheduler:
+    def __init__(self, max_concurrency: int = SCHEDULER_MAX_CONCURRENCY, quotas: dict | None = None,
+                 interactive_burst: int = SCHEDULER_INTERACTIVE_BURST):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.quotas = dict(SCHEDULER_QUOTAS)
+        self.quotas.update(quotas or {})
+        self.interactive_burst = max(0, int(interactive_burst))
+        self._waiting = []  # Tickets ordenados por (prioridad, llegada)
+        self._running = {priority: 0 for priority in PRIORITY_NAMES}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency + self.interactive_burst, thread_name_prefix='scheduler')
+
+    # --- Reparto de slots ---
+    def _capacity_for(self, priority) -> int:
+        return self.max_concurrency + (self.interactive_burst if priority == PRIORITY_INTERACTIVE else 0)
+
+    def _dispatch_locked(self):
+        total = sum(self._running.values())
+        index = 0
+        while index < len(self._waiting):
+            ticket = self._waiting[index]
+            priority = ticket.priority
+            if total >= self._capacity_for(priority):
+                # Las clases siguientes tienen igual o menos capacidad: nadie más puede entrar
+                if priority != PRIORITY_INTERACTIVE:
+                    break
+                index += 1
+                continue
+            if self._running[priority] >= self.quotas.get(priority, self.max_concurrency):
+                index += 1
+                continue
+            del self._waiting[index]
+            ticket.granted = True
+            self._running[priority] += 1
+            total += 1
+            if ticket.fn is None:
+                ticket.event.set()
+            else:
+                self._executor.submit(self._run_ticket, ticket)
+
+    def _release(self, priority):
+        with self._lock:
+            self._running[priority] -= 1
+            self._dispatch_locked()
+
+    def _run_ticket(self, ticket):
+        try:
+            if ticket.future.set_running_or_notify_cancel():
+                try:
+                    ticket.future.set_result(ticket.fn(*ticket.args, **ticket.kwargs))
+                except BaseException as exc:
+                    ticket.future.set_exception(exc)
+        finally:
+            self._release(ticket.priority)
+
+    # --- Interfaz pública ---
+    def acquire(self, priority: int, timeout: float | None = None) -> Ticket:
+        """Bloquea hasta obtener un slot de la clase indicada. Hay que llamar a `release(ticket)`."""
+        with self._lock:
+            ticket = Ticket(priority, next(self._seq))
+            bisect.insort(self._waiting, ticket)
+            self._dispatch_locked()
+        if not ticket.event.wait(timeout):
+            with self._lock:
+                if not ticket.granted:
+                    self._waiting.remove(ticket)
+                    raise SchedulerTimeout(f"Sin slot {PRIORITY_NAMES.get(priority)} tras {timeout}s.")
+        return ticket
+
+    def release(self, ticket: Ticket):
+        self._release(ticket.priority)
+
+    @contextmanager
+    def slot(self, priority: int, timeout: float | None = None):
+        ticket = self.acquire(priority, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def submit(self, priority: int, fn, *args, key=None, **kwargs) -> Ticket:
+        """Encola `fn` en la clase indicada; devuelve el ticket (`ticket.future` tiene el resultado)."""
+        with self._lock:
+            ticket = Ticket(priority, next(self._seq), key=key, fn=fn, args=args, kwargs=kwargs)
+            bisect.insort(self._waiting, ticket)
+            self._dispatch_locked()
+        return ticket
+
+    def cancel(self, ticket: Ticket) -> bool:
+        """Cancela una tarea que aún no ha empezado. Devuelve False si ya estaba en marcha o terminada."""
+        with self._lock:
+            if ticket.granted or ticket.cancelled:
+                return False
+            ticket.cancelled = True
+            self._waiting.remove(ticket)
+        if ticket.future is not None:
+            ticket.future.cancel()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for ticket in self._waiting:
+                waiting[PRIORITY_NAMES[ticket.priority]] += 1
+            return {
+                'running': {PRIORITY_NAMES[p]: n for p, n in self._running.items()},
+                'waiting': waiting,
+                'max_concurrency': self.max_concurrency,
+            }
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> PriorityScheduler:
+    """Planificador compartido del proceso."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = PriorityScheduler()
+        return _default_scheduler
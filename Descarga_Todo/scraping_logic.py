@@ -9,9 +9,19 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import threading
 from app_utils import normalize_handicap_to_half_bucket_str
+from page_archive import VARIANT_RAW, VARIANT_RENDERED, archive_page
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - depende del entorno
+    aiohttp = None
 
 URL_NOWGOAL = "https://live20.nowgoal25.com/"
 REQUEST_TIMEOUT_SECONDS = 12
+REQUEST_RETRIES = 3
+REQUEST_BACKOFF_SECONDS = 0.4
+REQUEST_MAX_CONNECTIONS = 8
+_RETRY_STATUSES = (500, 502, 503, 504)
 _REQUEST_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
@@ -55,36 +65,134 @@ def _fetch_nowgoal_html_sync(url: str) -> str | None:
         print(f"Error al obtener {url} con requests: {exc}")
         return None
 
-async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None = None, requests_first: bool = True) -> str | None:
+
+class ScrapeResources:
+    """
+    Recursos compartidos por todos los scrapes de una ejecución:
+    - un cliente HTTP asíncrono (aiohttp) con pool de conexiones: las descargas de
+      las distintas listas se solapan de verdad. Sin aiohttp se cae a requests en
+      un hilo (serializado por _requests_fetch_lock).
+    - un único Chromium de Playwright, arrancado la primera vez que hace falta y
+      nunca más de una vez; cada carga usa su propio contexto aislado.
+
+        async with ScrapeResources() as resources:
+            await get_main_page_matches_async(resources=resources)
+    """
+
+    def __init__(self):
+        self._session = None
+        self._playwright = None
+        self._browser = None
+        self._browser_error = None
+        self._browser_lock = asyncio.Lock()
+        self.browser_starts = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def fetch_html(self, url: str) -> str | None:
+        if aiohttp is None:
+            return await asyncio.to_thread(_fetch_nowgoal_html_sync, url)
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers=_REQUEST_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+                connector=aiohttp.TCPConnector(limit=REQUEST_MAX_CONNECTIONS),
+            )
+        for attempt in range(REQUEST_RETRIES + 1):
+            retry = attempt < REQUEST_RETRIES
+            try:
+                async with self._session.get(url) as response:
+                    if response.status in _RETRY_STATUSES and retry:
+                        await asyncio.sleep(REQUEST_BACKOFF_SECONDS * (2 ** attempt))
+                        continue
+                    response.raise_for_status()
+                    return await response.text()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                if retry:
+                    await asyncio.sleep(REQUEST_BACKOFF_SECONDS * (2 ** attempt))
+                    continue
+                print(f"Error al obtener {url} con aiohttp: {exc}")
+            except aiohttp.ClientError as exc:
+                print(f"Error al obtener {url} con aiohttp: {exc}")
+            return None
+        return None
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            if self._browser is None and self._browser_error is None:
+                try:
+                    self._playwright = await async_playwright().start()
+                    self._browser = await self._playwright.chromium.launch(headless=True)
+                    self.browser_starts += 1
+                except Exception as exc:
+                    # No se reintenta en esta ejecución: como mucho un arranque de navegador
+                    self._browser_error = exc
+            if self._browser is None:
+                raise RuntimeError(f"Chromium no disponible: {self._browser_error}")
+            return self._browser
+
+    async def render_html(self, url: str, filter_state: int | None = None) -> str | None:
+        browser = await self._get_browser()
+        context = await browser.new_context(user_agent=_REQUEST_HEADERS["User-Agent"])
+        try:
+            page = await context.new_page()
+            await page.goto(url, wait_until="domcontentloaded", timeout=20000)
+            await page.wait_for_timeout(4000)
+            if filter_state is not None:
+                try:
+                    await page.evaluate("(state) => { if (typeof HideByState === 'function') { HideByState(state); } }", filter_state)
+                    await page.wait_for_timeout(1500)
+                except Exception as eval_err:
+                    print(f"Advertencia al aplicar HideByState({filter_state}) en {url}: {eval_err}")
+            return await page.content()
+        finally:
+            await context.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None = None, requests_first: bool = True,
+                              resources: ScrapeResources | None = None) -> str | None:
+    if resources is None:
+        # Llamada suelta: recursos propios que se liberan al terminar
+        async with ScrapeResources() as own_resources:
+            return await _fetch_nowgoal_html(path, filter_state, requests_first, own_resources)
+
     target_url = _build_nowgoal_url(path)
     html_content = None
 
     if requests_first:
         try:
-            html_content = await asyncio.to_thread(_fetch_nowgoal_html_sync, target_url)
+            html_content = await resources.fetch_html(target_url)
         except Exception as exc:
-            print(f"Error asincronico al lanzar la carga con requests ({target_url}): {exc}")
+            print(f"Error asincronico al lanzar la carga HTTP ({target_url}): {exc}")
             html_content = None
 
     if html_content:
+        await asyncio.to_thread(archive_page, target_url, html_content, VARIANT_RAW)
         return html_content
 
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            try:
-                await page.goto(target_url, wait_until="domcontentloaded", timeout=20000)
-                await page.wait_for_timeout(4000)
-                if filter_state is not None:
-                    try:
-                        await page.evaluate("(state) => { if (typeof HideByState === 'function') { HideByState(state); } }", filter_state)
-                        await page.wait_for_timeout(1500)
-                    except Exception as eval_err:
-                        print(f"Advertencia al aplicar HideByState({filter_state}) en {target_url}: {eval_err}")
-                return await page.content()
-            finally:
-                await browser.close()
+        html_content = await resources.render_html(target_url, filter_state)
+        if html_content:
+            await asyncio.to_thread(archive_page, target_url, html_content, VARIANT_RENDERED)
+            return html_content
     except Exception as browser_exc:
         print(f"Error al obtener la pagina con Playwright ({target_url}): {browser_exc}")
     return None
@@ -229,30 +337,31 @@ def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_
 
     return paginated_matches
 
-async def get_main_page_matches_async(limit=20, offset=0, handicap_filter=None):
-    html_content = await _fetch_nowgoal_html(filter_state=3)
+async def get_main_page_matches_async(limit=20, offset=0, handicap_filter=None, resources=None):
+    # El parseo va a un hilo para que el event loop siga atendiendo la otra lista
+    html_content = await _fetch_nowgoal_html(filter_state=3, resources=resources)
     if not html_content:
-        html_content = await _fetch_nowgoal_html(filter_state=3, requests_first=False)
+        html_content = await _fetch_nowgoal_html(filter_state=3, requests_first=False, resources=resources)
         if not html_content:
             return []
-    matches = parse_main_page_matches(html_content, limit, offset, handicap_filter)
+    matches = await asyncio.to_thread(parse_main_page_matches, html_content, limit, offset, handicap_filter)
     if not matches:
-        html_content = await _fetch_nowgoal_html(filter_state=3, requests_first=False)
+        html_content = await _fetch_nowgoal_html(filter_state=3, requests_first=False, resources=resources)
         if not html_content:
             return []
-        matches = parse_main_page_matches(html_content, limit, offset, handicap_filter)
+        matches = await asyncio.to_thread(parse_main_page_matches, html_content, limit, offset, handicap_filter)
     return matches
 
-async def get_main_page_finished_matches_async(limit=20, offset=0, handicap_filter=None):
-    html_content = await _fetch_nowgoal_html(path='football/results')
+async def get_main_page_finished_matches_async(limit=20, offset=0, handicap_filter=None, resources=None):
+    html_content = await _fetch_nowgoal_html(path='football/results', resources=resources)
     if not html_content:
-        html_content = await _fetch_nowgoal_html(path='football/results', requests_first=False)
+        html_content = await _fetch_nowgoal_html(path='football/results', requests_first=False, resources=resources)
         if not html_content:
             return []
-    matches = parse_main_page_finished_matches(html_content, limit, offset, handicap_filter)
+    matches = await asyncio.to_thread(parse_main_page_finished_matches, html_content, limit, offset, handicap_filter)
     if not matches:
-        html_content = await _fetch_nowgoal_html(path='football/results', requests_first=False)
+        html_content = await _fetch_nowgoal_html(path='football/results', requests_first=False, resources=resources)
         if not html_content:
             return []
-        matches = parse_main_page_finished_matches(html_content, limit, offset, handicap_filter)
+        matches = await asyncio.to_thread(parse_main_page_finished_matches, html_content, limit, offset, handicap_filter)
     return matches
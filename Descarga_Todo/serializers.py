@@ -0,0 +1,145 @@
+# serializers.py - Capa de serialización intercambiable (orjson / msgpack / json)
+"""
+Serialización centralizada para los snapshots (data.json), la cache de análisis
+y las respuestas JSON de la API.
+
+- Si `orjson` está instalado se usa para codificar/decodificar JSON.
+- Si `msgpack` está instalado se puede usar un formato binario compacto para
+  el snapshot y la cache de vistas previas.
+- Sin extras, todo cae a la librería estándar `json`, así que los despliegues
+  que no instalen nada adicional siguen funcionando igual.
+"""
+import datetime
+import json
+import os
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depende del entorno
+    msgpack = None
+
+FORMAT_JSON = 'json'
+FORMAT_MSGPACK = 'msgpack'
+
+HAS_ORJSON = orjson is not None
+HAS_MSGPACK = msgpack is not None
+
+if HAS_ORJSON:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value):
+    """Convierte tipos no serializables (fechas, numpy, pandas...) a algo JSON."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        try:
+            return value.item()
+        except Exception:
+            pass
+    if hasattr(value, 'tolist'):
+        try:
+            return value.tolist()
+        except Exception:
+            pass
+    return str(value)
+
+
+def dumps_json(obj, indent: bool = False) -> bytes:
+    """Serializa `obj` a JSON (bytes UTF-8). Compacto salvo que se pida `indent`."""
+    if HAS_ORJSON:
+        options = _ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, default=_default, option=options)
+        except TypeError:
+            # orjson es más estricto (p.ej. claves mixtas); reintentamos con la stdlib
+            pass
+    text = json.dumps(
+        obj,
+        ensure_ascii=False,
+        default=_default,
+        indent=2 if indent else None,
+        separators=None if indent else (',', ':'),
+    )
+    return text.encode('utf-8')
+
+
+def loads_json(data):
+    """Decodifica JSON desde bytes o str."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
+
+
+def dumps_binary(obj) -> bytes:
+    """Serializa a msgpack si está disponible; si no, a JSON compacto."""
+    if HAS_MSGPACK:
+        return msgpack.packb(obj, default=_default, use_bin_type=True)
+    return dumps_json(obj)
+
+
+def loads_binary(data):
+    if HAS_MSGPACK:
+        return msgpack.unpackb(data, raw=False)
+    return loads_json(data)
+
+
+def dumps(obj, fmt: str = FORMAT_JSON) -> bytes:
+    if fmt == FORMAT_MSGPACK and HAS_MSGPACK:
+        return dumps_binary(obj)
+    return dumps_json(obj)
+
+
+def loads(data, fmt: str = FORMAT_JSON):
+    if fmt == FORMAT_MSGPACK and HAS_MSGPACK:
+        return loads_binary(data)
+    return loads_json(data)
+
+
+def resolve_format(requested: str | None) -> str:
+    """Devuelve el formato efectivo: msgpack solo si se pide y está instalado."""
+    if (requested or '').lower() == FORMAT_MSGPACK and HAS_MSGPACK:
+        return FORMAT_MSGPACK
+    return FORMAT_JSON
+
+
+def file_suffix(fmt: str) -> str:
+    return '.msgpack' if fmt == FORMAT_MSGPACK else '.json'
+
+
+def load_file(path, fmt: str | None = None):
+    """Lee un fichero serializado. El formato se deduce de la extensión si no se indica."""
+    path = Path(path)
+    if fmt is None:
+        fmt = FORMAT_MSGPACK if path.suffix == '.msgpack' else FORMAT_JSON
+    with path.open('rb') as fh:
+        raw = fh.read()
+    return loads(raw, fmt)
+
+
+def write_file(path, obj, fmt: str | None = None, indent: bool = False):
+    """Escribe `obj` en `path` de forma atómica (fichero temporal + rename)."""
+    path = Path(path)
+    if fmt is None:
+        fmt = FORMAT_MSGPACK if path.suffix == '.msgpack' else FORMAT_JSON
+    payload = dumps_json(obj, indent=indent) if fmt == FORMAT_JSON else dumps(obj, fmt)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open('wb') as fh:
+        fh.write(payload)
+    os.replace(tmp_path, path)
+
+
+# Errores de decodificación que pueden lanzar los distintos backends
+DECODE_ERRORS = (ValueError, TypeError)
+if HAS_ORJSON:
+    DECODE_ERRORS = DECODE_ERRORS + (orjson.JSONDecodeError,)
+if HAS_MSGPACK:
+    DECODE_ERRORS = DECODE_ERRORS + (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError)
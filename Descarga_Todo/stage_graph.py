@@ -0,0 +1,166 @@
+# stage_graph.py - Ejecutor de etapas con dependencias declaradas (DAG)
+"""
+Cada etapa declara por nombre las entradas que necesita; el ejecutor lanza una
+etapa en el pool en cuanto todas sus entradas están disponibles, sin esperar al
+resto. Así una descarga (p.ej. estadísticas de un partido histórico) empieza
+nada más parsearse la fila que aporta su ID.
+
+    graph = StageGraph([
+        Stage('odds', extract_odds, ('soup',)),
+        Stage('line', parse_line, ('odds',)),
+    ])
+    run = graph.run({'soup': soup}, executor)
+    run.values['line'], run.timings['line']['elapsed_ms']
+
+- Las entradas que no son etapas son valores iniciales y se pasan a `run()`.
+- Una etapa que devuelve STAGE_SKIPPED no aporta valor a la salida (sus
+  dependientes reciben None).
+- Si una etapa falla se cancelan las pendientes y se lanza StageError.
+- Con `deadline` (deadline.Deadline) la ejecución se corta al agotarse el
+  presupuesto: se devuelve lo ya calculado y las etapas sin terminar quedan en
+  `timed_out` (en marcha o que lanzaron DeadlineExceeded) y `missing` (sus
+  entradas nunca llegaron).
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from deadline import DeadlineExceeded
+
+# Valor de retorno para "esta etapa no aplica" (p.ej. falta la línea de handicap)
+STAGE_SKIPPED = object()
+
+
+class StageError(Exception):
+    """Una etapa del grafo lanzó una excepción."""
+
+    def __init__(self, stage, cause):
+        super().__init__(f"Etapa '{stage}' falló: {cause}")
+        self.stage = stage
+        self.cause = cause
+
+
+class Stage:
+    __slots__ = ('name', 'fn', 'inputs')
+
+    def __init__(self, name: str, fn, inputs=()):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+
+
+class StageRun:
+    """Resultado de una ejecución: valores por nombre y tiempos por etapa (ms desde el inicio)."""
+    __slots__ = ('values', 'timings', 'elapsed_ms', 'timed_out', 'missing')
+
+    def __init__(self, values, timings, elapsed_ms, timed_out=(), missing=()):
+        self.values = values
+        self.timings = timings
+        self.elapsed_ms = elapsed_ms
+        self.timed_out = list(timed_out)
+        self.missing = list(missing)
+
+    @property
+    def complete(self) -> bool:
+        return not self.timed_out and not self.missing
+
+    def slowest(self, count: int = 3) -> list:
+        ordered = sorted(self.timings.items(), key=lambda item: item[1]['elapsed_ms'], reverse=True)
+        return ordered[:count]
+
+
+def _timed_call(fn, args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, started, time.perf_counter()
+
+
+class StageGraph:
+    def __init__(self, stages):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Etapa duplicada: {stage.name}")
+            self.stages[stage.name] = stage
+        self.external_inputs = {name for stage in self.stages.values() for name in stage.inputs
+                                if name not in self.stages}
+        self._dependents = {name: [] for name in self.stages}
+        for stage in self.stages.values():
+            for name in set(stage.inputs):
+                if name in self.stages:
+                    self._dependents[name].append(stage.name)
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        pending = {name: len({i for i in stage.inputs if i in self.stages}) for name, stage in self.stages.items()}
+        ready = [name for name, count in pending.items() if count == 0]
+        visited = 0
+        while ready:
+            name = ready.pop()
+            visited += 1
+            for dependent in self._dependents[name]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        if visited != len(self.stages):
+            cyclic = sorted(name for name, count in pending.items() if count > 0)
+            raise ValueError(f"El grafo de etapas tiene ciclos: {', '.join(cyclic)}")
+
+    def run(self, initial: dict, executor, on_stage_done=None, deadline=None) -> StageRun:
+        """
+        Ejecuta el grafo en `executor`. `on_stage_done(nombre, valor, valores)` se llama
+        desde el hilo que invoca `run()` según termina cada etapa, en orden de llegada.
+        Las etapas que siguen en marcha al agotarse `deadline` no se esperan.
+        """
+        missing_inputs = self.external_inputs - initial.keys()
+        if missing_inputs:
+            raise ValueError(f"Faltan entradas del grafo: {', '.join(sorted(missing_inputs))}")
+        run_start = time.perf_counter()
+        values = dict(initial)
+        timings = {}
+        pending = {name: len({i for i in stage.inputs if i in self.stages}) for name, stage in self.stages.items()}
+        running = {}
+        timed_out = []
+
+        def _submit(name):
+            stage = self.stages[name]
+            args = [None if values.get(i) is STAGE_SKIPPED else values.get(i) for i in stage.inputs]
+            running[executor.submit(_timed_call, stage.fn, args)] = name
+
+        for name, count in pending.items():
+            if count == 0:
+                _submit(name)
+        while running:
+            timeout = None if deadline is None else deadline.remaining()
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Presupuesto agotado: lo que sigue en marcha se abandona
+                timed_out.extend(running.values())
+                for other in running:
+                    other.cancel()
+                break
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result, started, finished = future.result()
+                except DeadlineExceeded:
+                    timed_out.append(name)
+                    continue
+                except Exception as exc:
+                    for other in running:
+                        other.cancel()
+                    raise StageError(name, exc) from exc
+                values[name] = result
+                timings[name] = {
+                    'start_ms': round((started - run_start) * 1000, 1),
+                    'elapsed_ms': round((finished - started) * 1000, 1),
+                }
+                if on_stage_done is not None:
+                    on_stage_done(name, result, values)
+                for dependent in self._dependents[name]:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        _submit(dependent)
+        outputs = {name: value for name, value in values.items() if value is not STAGE_SKIPPED}
+        missing = [name for name in self.stages if name not in values and name not in timed_out]
+        return StageRun(outputs, timings, round((time.perf_counter() - run_start) * 1000, 1),
+                        sorted(timed_out), missing)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Los módulos de Descarga_Todo son planos (sin paquete): se importan desde su carpeta
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
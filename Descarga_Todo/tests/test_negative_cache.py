@@ -0,0 +1,27 @@
+import pytest
+
+from negative_cache import (ERROR_INVALID_ID, ERROR_NOT_FOUND, ERROR_SCRAPE, ERROR_TIMEOUT, INVALID_ID_MESSAGE,
+                            NegativeCache, classify_error)
+
+
+@pytest.mark.parametrize('message, expected', [
+    (INVALID_ID_MESSAGE, ERROR_INVALID_ID),
+    ('Error durante el scraping: Message: invalid session id', ERROR_SCRAPE),
+    ('Error durante el scraping: Message: invalid selector', ERROR_SCRAPE),
+    ('La fuente de datos (Nowgoal) tardó demasiado en responder.', ERROR_TIMEOUT),
+    ('Error durante el scraping: Read timed out', ERROR_TIMEOUT),
+    ('La página del partido 1 no está en el archivo (modo offline).', ERROR_NOT_FOUND),
+])
+def test_classify_error_from_message(message, expected):
+    assert classify_error(message) == expected
+
+
+def test_explicit_error_class_wins():
+    assert classify_error('cualquier cosa', ERROR_TIMEOUT) == ERROR_TIMEOUT
+    assert classify_error(INVALID_ID_MESSAGE, 'desconocida') == ERROR_INVALID_ID
+
+
+def test_wrapped_selenium_error_is_not_blocked_for_a_day():
+    entry = NegativeCache().record_failure('analysis', '2790001', 'Error durante el scraping: invalid session id')
+    assert entry.error_class == ERROR_SCRAPE
+    assert entry.retry_after() <= 60
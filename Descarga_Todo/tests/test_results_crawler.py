@@ -0,0 +1,72 @@
+import asyncio
+import datetime
+import json
+from pathlib import Path
+
+import pytest
+
+import results_crawler
+from history_store import FinishedHistoryStore
+
+FIXTURE = (Path(__file__).parent / 'fixtures' / 'results_2026-09-01.html').read_text(encoding='utf-8')
+EMPTY_LISTING = '<html><body><table id="table_live"><tr class="scoretitle"><td>League</td></tr></table></body></html>'
+
+
+class FakeResources:
+    """Sustituye a ScrapeResources: sirve HTML por fecha y nunca renderiza."""
+    pages = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def fetch_html(self, url):
+        return self.pages.get(url.rsplit('date=', 1)[-1])
+
+    async def render_html(self, url, filter_state=None):
+        return None
+
+
+@pytest.fixture
+def crawl(monkeypatch, tmp_path):
+    monkeypatch.setattr(results_crawler, 'ScrapeResources', FakeResources)
+    monkeypatch.setattr(results_crawler, 'archive_page', lambda *args, **kwargs: None)
+
+    def _crawl(pages, start, end):
+        FakeResources.pages = pages
+        summary = asyncio.run(results_crawler.crawl_results(start, end, str(tmp_path), rate_per_second=0))
+        return summary, tmp_path
+
+    return _crawl
+
+
+def test_parse_results_page_keeps_only_finished_matches_of_the_day():
+    matches, empty_listing = results_crawler._parse_results_page(FIXTURE, '2026-09-01')
+    assert sorted(match['id'] for match in matches) == ['2790001', '2790002']
+    assert not empty_listing
+
+
+def test_parse_results_page_detects_empty_listing():
+    assert results_crawler._parse_results_page(EMPTY_LISTING, '2026-09-02') == ([], True)
+    assert results_crawler._parse_results_page('<html>captcha</html>', '2026-09-02') == ([], False)
+
+
+def test_crawl_results_merges_and_checkpoints_the_day(crawl):
+    day = datetime.date(2026, 9, 1)
+    summary, history_dir = crawl({'2026-09-01': FIXTURE}, day, day)
+    assert summary['failed'] == []
+    assert (summary['days'], summary['matches'], summary['added']) == (1, 2, 2)
+    stored = FinishedHistoryStore(str(history_dir)).read_range(day, day)
+    assert sorted(entry['id'] for entry in stored) == ['2790001', '2790002']
+    checkpoint = json.loads((history_dir / results_crawler.CHECKPOINT_FILE).read_text())
+    assert checkpoint['days']['2026-09-01']['matches'] == 2
+
+
+def test_crawl_results_does_not_checkpoint_pages_of_another_date(crawl):
+    summary, history_dir = crawl({'2026-09-03': FIXTURE, '2026-09-04': EMPTY_LISTING},
+                                 datetime.date(2026, 9, 3), datetime.date(2026, 9, 4))
+    assert summary['failed'] == ['2026-09-03']
+    checkpoint = json.loads((history_dir / results_crawler.CHECKPOINT_FILE).read_text())
+    assert list(checkpoint['days']) == ['2026-09-04']
@@ -0,0 +1,155 @@
+# analysis_stream.py - Streaming progresivo del análisis (Server-Sent Events)
+"""
+Variante en streaming de `/api/analisis/<id>`: en lugar de esperar al payload
+completo, cada sección se envía en cuanto está calculada.
+
+Esquema de eventos (cada `data:` es un objeto JSON):
+
+    event: header   {'match_id', 'home_team', 'away_team', 'match_date', 'match_time', 'match_datetime'}
+    event: section  {'name': <sección>, 'data': {...} | null}
+    event: done     {'match_id', 'cached', 'stale', 'elapsed_ms', 'payload'}
+    event: error    {'error', 'error_class', 'retry_after'}
+
+Secciones (`name`):
+    odds                 líneas AH y de goles del partido
+    simplified_html      análisis de mercado simplificado
+    last_home, last_away, h2h_col3, h2h_general
+                         igual que payload['recent_indirect_full'][name]
+    comparativas_left, comparativas_right
+                         igual que payload['comparativas_indirectas']['left'/'right']
+
+Las cuotas y el HTML simplificado salen de la página principal y llegan en el
+primer segundo; los partidos históricos llegan según terminan sus estadísticas.
+`done` siempre es el último evento (o `error` si el análisis falla) y lleva el
+payload completo, idéntico al de `/api/analisis/<id>`. Si el análisis se cortó
+por el presupuesto de tiempo el payload trae `timed_out: True` y `missing`, y las
+secciones que faltan no se habrán enviado.
+"""
+import os
+import queue
+import threading
+import time
+
+from analysis_service import AnalysisError, build_analysis_payload
+from scheduler import PRIORITY_INTERACTIVE
+from serializers import dumps_json
+
+# Cada cuánto se envía un comentario SSE para que proxies y navegador no cierren la conexión
+ANALYSIS_STREAM_HEARTBEAT_SECONDS = float(os.environ.get('ANALYSIS_STREAM_HEARTBEAT_SECONDS', 15))
+
+# Etapa del scraper (clave de `datos`) -> (sección del stream, ruta dentro del payload)
+_HISTORICAL_SECTIONS = {
+    'last_home_match': ('last_home', ('recent_indirect_full', 'last_home')),
+    'last_away_match': ('last_away', ('recent_indirect_full', 'last_away')),
+    'h2h_col3': ('h2h_col3', ('recent_indirect_full', 'h2h_col3')),
+    'h2h_general': ('h2h_general', ('recent_indirect_full', 'h2h_general')),
+    'comp_L_vs_UV_A': ('comparativas_left', ('comparativas_indirectas', 'left')),
+    'comp_V_vs_UL_H': ('comparativas_right', ('comparativas_indirectas', 'right')),
+}
+_HEADER_FIELDS = (
+    ('home_team', 'home_name'),
+    ('away_team', 'away_name'),
+    ('match_date', 'match_date'),
+    ('match_time', 'match_time'),
+    ('match_datetime', 'match_datetime'),
+)
+
+
+def format_sse(event: str, data) -> bytes:
+    return b'event: ' + event.encode('utf-8') + b'\ndata: ' + dumps_json(data) + b'\n\n'
+
+
+def _payload_path(payload, path):
+    value = payload
+    for key in path:
+        value = (value or {}).get(key)
+    return value
+
+
+def _header_from_datos(match_id, datos) -> dict:
+    header = {'match_id': match_id}
+    for field, key in _HEADER_FIELDS:
+        header[field] = datos.get(key)
+    return header
+
+
+def _odds_section(datos) -> dict | None:
+    return datos.get('main_match_odds')
+
+
+def sections_from_entry(entry):
+    """Eventos (nombre, datos) de una entrada de cache ya completa, en el orden del stream."""
+    payload = entry['payload']
+    datos = entry.get('datos') or {}
+    yield 'header', {'match_id': payload.get('match_id'),
+                     **{field: payload.get(field) for field, _ in _HEADER_FIELDS}}
+    yield 'section', {'name': 'odds', 'data': _odds_section(datos)}
+    yield 'section', {'name': 'simplified_html', 'data': payload.get('simplified_html')}
+    for name, path in _HISTORICAL_SECTIONS.values():
+        yield 'section', {'name': name, 'data': _payload_path(payload, path)}
+
+
+def _progress_events(match_id, stage, datos):
+    """Eventos que produce una etapa del scraper a partir del diccionario parcial."""
+    if stage == 'header':
+        return [('header', _header_from_datos(match_id, datos))]
+    if stage == 'odds':
+        payload = build_analysis_payload(match_id, datos)
+        return [('section', {'name': 'odds', 'data': _odds_section(datos)}),
+                ('section', {'name': 'simplified_html', 'data': payload.get('simplified_html')})]
+    if stage in _HISTORICAL_SECTIONS:
+        name, path = _HISTORICAL_SECTIONS[stage]
+        payload = build_analysis_payload(match_id, datos)
+        return [('section', {'name': name, 'data': _payload_path(payload, path)})]
+    return []
+
+
+def stream_analysis(service, match_id, priority: int = PRIORITY_INTERACTIVE):
+    """
+    Generador de eventos SSE (bytes) para un partido. Una entrada en cache (fresca o
+    stale por TTL blando) se emite entera al momento; si no, el scraping corre en un
+    hilo aparte y sus secciones se reenvían según llegan. Si el cliente se desconecta
+    el cálculo sigue y su resultado queda en cache.
+    """
+    start_time = time.time()
+
+    def _elapsed_ms():
+        return round((time.time() - start_time) * 1000, 1)
+
+    entry = service.lookup(match_id, allow_stale=True)
+    if entry is not None:
+        for event, data in sections_from_entry(entry):
+            yield format_sse(event, data)
+        yield format_sse('done', {'match_id': match_id, 'cached': True, 'stale': bool(entry.get('stale')),
+                                  'elapsed_ms': _elapsed_ms(), 'payload': entry['payload']})
+        return
+
+    messages = queue.Queue()
+
+    def _on_progress(stage, datos):
+        for event, data in _progress_events(match_id, stage, datos):
+            messages.put((event, data))
+
+    def _run():
+        try:
+            result = service.compute(match_id, priority=priority, on_progress=_on_progress)
+            messages.put(('done', {'match_id': match_id, 'cached': False, 'stale': False,
+                                   'elapsed_ms': _elapsed_ms(), 'payload': result['payload']}))
+        except AnalysisError as exc:
+            messages.put(('error', {'error': str(exc) or 'No se pudieron obtener datos.',
+                                    'error_class': exc.error_class, 'retry_after': exc.retry_after}))
+        except Exception as exc:
+            print(f"Error en el streaming del análisis de {match_id}: {exc}")
+            messages.put(('error', {'error': 'Ocurrió un error interno en el servidor.',
+                                    'error_class': 'internal', 'retry_after': None}))
+
+    threading.Thread(target=_run, name=f"analysis-stream-{match_id}", daemon=True).start()
+    while True:
+        try:
+            event, data = messages.get(timeout=ANALYSIS_STREAM_HEARTBEAT_SECONDS)
+        except queue.Empty:
+            yield b': ping\n\n'
+            continue
+        yield format_sse(event, data)
+        if event in ('done', 'error'):
+            return
@@ -1,15 +1,15 @@
 # app.py - Servidor web principal (Flask)
-from flask import Flask, render_template, abort, request
+from flask import Flask, render_template, abort, request, g, Response, stream_with_context
 import asyncio
 from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
 import datetime
+import functools
+import hashlib
 import re
 import math
 import threading
-import json
-import time
-import logging
+import os
 from pathlib import Path
 import requests
 from requests.adapters import HTTPAdapter
@@ -17,15 +17,33 @@ from urllib3.util.retry import Retry
 
 # ¡Importante! Importa tu nuevo módulo de scraping
 from modules.estudio_scraper import (
-    obtener_datos_completos_partido, 
+    crear_driver_chrome,
     format_ah_as_decimal_string_of, 
     obtener_datos_preview_rapido, 
     obtener_datos_preview_ligero, 
-    generar_analisis_mercado_simplificado,
-    check_handicap_cover,
-    parse_ah_to_number_of
 )
-from flask import jsonify # Asegúrate de que jsonify está importado
+from analysis_service import AnalysisError, AnalysisService, rehydrate_datos
+from analysis_stream import stream_analysis
+from batch_analysis import normalize_batch_ids, run_batch
+from cache_backend import NS_ANALYSES, NS_PREVIEWS, is_shared_backend, namespace_cache
+from job_queue import STATUS_DONE, STATUS_ERROR, STATUS_PARTIAL, JobQueue, QueueFullError
+from negative_cache import NegativeCache
+from scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_scheduler
+from disk_cache import DiskCache
+from page_archive import VARIANT_RAW, VARIANT_RENDERED, archive_page
+from preview_cache import PreviewCache, preview_ttl_seconds
+from preview_prefetch import PreviewPrefetcher, normalize_prefetch_ids
+from render_cache import RenderedPageCache
+from search_index import TeamSearchIndex
+from serializers import (
+    DECODE_ERRORS,
+    FORMAT_MSGPACK,
+    HAS_MSGPACK,
+    dumps_json,
+    file_suffix,
+    load_file,
+    resolve_format,
+)
 
 app = Flask(__name__)
 
@@ -58,18 +76,89 @@ else:
     DATA_FILE = _DATA_FILE_CANDIDATES[0]
 
 _data_file_lock = threading.Lock()
+# Snapshot ya parseado en memoria, reutilizado mientras el fichero no cambie
+_snapshot_cache = {"version": None, "data": None}
+
+# Segundos que un cliente puede reutilizar una lista sin revalidar (las listas cambian cada hora)
+LIST_CACHE_MAX_AGE = int(os.environ.get('LIST_CACHE_MAX_AGE', 60))
+
+# Cache de HTML renderizado para '/', '/resultados' y '/proximos'
+RENDER_CACHE_MAX_ENTRIES = int(os.environ.get('RENDER_CACHE_MAX_ENTRIES', 64))
+_rendered_pages = RenderedPageCache(max_entries=RENDER_CACHE_MAX_ENTRIES)
+
+# Funciones que se llaman con (version, data) cada vez que se carga un snapshot nuevo
+_snapshot_listeners = []
+
+# Formato de las caches en disco: 'json' (por defecto) o 'msgpack' si está instalado
+PREVIEW_CACHE_FORMAT = resolve_format(os.environ.get('PREVIEW_CACHE_FORMAT'))
+
+
+def _get_snapshot_file():
+    """Devuelve el snapshot a leer: data.msgpack si existe y no es más antiguo que data.json."""
+    if HAS_MSGPACK:
+        binary_file = DATA_FILE.with_suffix(file_suffix(FORMAT_MSGPACK))
+        try:
+            if binary_file.exists() and (
+                not DATA_FILE.exists() or binary_file.stat().st_mtime >= DATA_FILE.stat().st_mtime
+            ):
+                return binary_file
+        except OSError:
+            pass
+    return DATA_FILE
+
+
+def _error_response(payload, status, retry_after=None):
+    """Respuesta JSON de error; con `retry_after` añade la cabecera Retry-After (cache negativa)."""
+    response = _json_response(payload)
+    response.status_code = status
+    if retry_after:
+        response.headers['Retry-After'] = str(int(retry_after))
+    return response
+
+
+def _json_response(payload):
+    """Equivalente a jsonify usando la capa de serialización (orjson si está disponible)."""
+    return app.response_class(dumps_json(payload), mimetype='application/json')
+
+
+def get_data_version() -> str:
+    """Versión del snapshot actual, derivada de mtime y tamaño (no lee el fichero)."""
+    snapshot_file = _get_snapshot_file()
+    try:
+        st = snapshot_file.stat()
+    except OSError:
+        return 'empty'
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def register_snapshot_listener(callback):
+    """Registra `callback(version, data)` para cuando se cargue un snapshot nuevo."""
+    _snapshot_listeners.append(callback)
+    return callback
+
+
+def _notify_snapshot_listeners(version, data):
+    for callback in list(_snapshot_listeners):
+        try:
+            callback(version, data)
+        except Exception as exc:
+            print(f"Error en listener de snapshot {getattr(callback, '__name__', callback)}: {exc}")
 
 
 def load_data_from_file():
     """Carga los datos desde el archivo JSON, similar a la app ligera."""
     with _data_file_lock:
-        if not DATA_FILE.exists():
+        version = get_data_version()
+        if _snapshot_cache["version"] == version and _snapshot_cache["data"] is not None:
+            return _snapshot_cache["data"]
+
+        snapshot_file = _get_snapshot_file()
+        if not snapshot_file.exists():
             return {key: [] for key in _EMPTY_DATA_TEMPLATE}
         try:
-            with DATA_FILE.open('r', encoding='utf-8') as fh:
-                data = json.load(fh)
-        except (json.JSONDecodeError, OSError) as exc:
-            print(f"Error al leer {DATA_FILE}: {exc}")
+            data = load_file(snapshot_file)
+        except (OSError, *DECODE_ERRORS) as exc:
+            print(f"Error al leer {snapshot_file}: {exc}")
             return {key: [] for key in _EMPTY_DATA_TEMPLATE}
         if not isinstance(data, dict):
             return {key: [] for key in _EMPTY_DATA_TEMPLATE}
@@ -81,7 +170,127 @@ def load_data_from_file():
                 normalized[key] = [item for item in value if isinstance(item, dict)]
             else:
                 normalized[key] = []
-        return normalized
+        _snapshot_cache["version"] = version
+        _snapshot_cache["data"] = normalized
+    # Los listeners se ejecutan fuera del lock para que puedan volver a leer datos
+    _notify_snapshot_listeners(version, normalized)
+    return normalized
+
+
+def _build_list_etag(*query_params) -> str:
+    """ETag fuerte a partir de la versión de datos, la ruta y los parámetros de la consulta."""
+    parts = [get_data_version(), request.path]
+    parts.extend(f"{name}={request.args.get(name, '')}" for name in query_params)
+    # Las páginas cacheadas se sirven en gzip o sin comprimir: cada variante tiene su ETag
+    parts.append('gzip' if 'gzip' in request.headers.get('Accept-Encoding', '').lower() else 'identity')
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+@register_snapshot_listener
+def _invalidate_rendered_pages(version, data):
+    _rendered_pages.invalidate_except(version)
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+
+@register_snapshot_listener
+def _rebuild_search_index(version, data):
+    global _search_index
+    index = TeamSearchIndex(data, version=version)
+    with _search_index_lock:
+        _search_index = index
+    print(f"Índice de búsqueda reconstruido: {len(index)} partidos (versión {version}).")
+
+
+# Cache de vistas previas: LRU en memoria y copia opcional en disco (PREVIEW_DISK_CACHE_DIR)
+PREVIEW_CACHE_MAX_ENTRIES = int(os.environ.get('PREVIEW_CACHE_MAX_ENTRIES', 512))
+PREVIEW_DISK_CACHE_DIR = os.environ.get('PREVIEW_DISK_CACHE_DIR') or None
+_preview_disk_cache = None
+if PREVIEW_DISK_CACHE_DIR:
+    _preview_disk_cache = DiskCache(PREVIEW_DISK_CACHE_DIR, max_bytes=128 * 1024 * 1024, fmt=PREVIEW_CACHE_FORMAT)
+    if not is_shared_backend():
+        _preview_disk_cache.start_janitor()
+# Con CACHE_BACKEND=memory/redis la copia persistente va al backend compartido (espacio 'previews')
+_preview_cache = PreviewCache(max_entries=PREVIEW_CACHE_MAX_ENTRIES,
+                              disk_cache=namespace_cache(NS_PREVIEWS, _preview_disk_cache))
+# Fallos recientes por (operación, match_id): vistas previas y análisis comparten la misma cache
+_negative_cache = NegativeCache()
+# match_id -> (sección, hora de inicio UTC) del snapshot actual
+_match_states = {}
+
+
+@register_snapshot_listener
+def _refresh_match_states(version, data):
+    global _match_states
+    states = {}
+    for section in _EMPTY_DATA_TEMPLATE:
+        for entry in data.get(section, []):
+            if entry.get('id'):
+                states[str(entry['id'])] = (section, _parse_time_obj(entry.get('time_obj')))
+    previous = _match_states
+    _match_states = states
+    # Los partidos que han pasado a finalizados tienen una vista previa obsoleta
+    for match_id, (section, _) in states.items():
+        if section == 'finished_matches' and previous.get(match_id, (section,))[0] != section:
+            invalidate_preview(match_id)
+
+
+def get_match_state(match_id: str):
+    """(sección, hora de inicio) del partido según el snapshot, o (None, None) si no aparece."""
+    load_data_from_file()
+    return _match_states.get(str(match_id), (None, None))
+
+
+def invalidate_preview(match_id: str, mode: str | None = None):
+    """Hook de invalidación explícita de la vista previa de un partido."""
+    _preview_cache.invalidate(match_id, mode)
+
+
+def get_search_index():
+    """Devuelve el índice de equipos del snapshot actual (se reconstruye al cambiar data.json)."""
+    data = load_data_from_file()
+    with _search_index_lock:
+        index = _search_index
+    if index is None:
+        # Snapshot vacío o ilegible: el listener no se ha ejecutado todavía
+        index = TeamSearchIndex(data, version=get_data_version())
+    return index
+
+
+def _rendered_page_response(entry):
+    """Sirve una página cacheada, comprimida con gzip si el cliente lo acepta."""
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        response = app.response_class(entry.gzip_body, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(entry.body, mimetype='text/html')
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def conditional_list_response(*query_params):
+    """
+    Decorador para rutas de listas: responde 304 si el cliente ya tiene la versión
+    actual (If-None-Match) sin tocar los datos, y añade ETag y Cache-Control al resto.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = _build_list_etag(*query_params)
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                # Las respuestas de error no se cachean en el cliente
+                if response.status_code != 200 or g.get('list_error'):
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = f'public, max-age={LIST_CACHE_MAX_AGE}, must-revalidate'
+            return response
+        return wrapper
+    return decorator
 
 
 def _parse_time_obj(value):
@@ -150,7 +359,10 @@ def _filter_and_slice_matches(section, limit=None, offset=0, handicap_filter=Non
     return prepared
 
 
-def _get_preview_cache_dir():
+def _get_analysis_cache_dir():
+    configured = os.environ.get('ANALYSIS_CACHE_DIR')
+    if configured:
+        return Path(configured).resolve()
     static_root_value = app.static_folder
     if not static_root_value:
         static_root_value = Path(__file__).resolve().parent / 'static'
@@ -158,29 +370,40 @@ def _get_preview_cache_dir():
     return static_root / 'cached_previews'
 
 
-def load_preview_from_cache(match_id: str):
-    cache_dir = _get_preview_cache_dir()
-    cache_path = cache_dir / f'{match_id}.json'
-    if cache_path.exists():
-        try:
-            with cache_path.open('r', encoding='utf-8') as fh:
-                cached_data = json.load(fh)
-                if isinstance(cached_data, dict):
-                    return cached_data
-        except (json.JSONDecodeError, OSError) as exc:
-            print(f"Error al leer cache de analisis {cache_path}: {exc}")
-    return None
-
-
-def save_preview_to_cache(match_id: str, payload: dict):
-    cache_dir = _get_preview_cache_dir()
-    try:
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_path = cache_dir / f'{match_id}.json'
-        with cache_path.open('w', encoding='utf-8') as fh:
-            json.dump(payload, fh, ensure_ascii=False)
-    except OSError as exc:
-        print(f"Error al escribir cache de analisis para {match_id}: {exc}")
+# Cache en disco de los payloads de /api/analisis (escritura atómica, sharding y límite de tamaño)
+ANALYSIS_CACHE_MAX_MB = int(os.environ.get('ANALYSIS_CACHE_MAX_MB', 512))
+ANALYSIS_CACHE_MAX_AGE_DAYS = int(os.environ.get('ANALYSIS_CACHE_MAX_AGE_DAYS', 30))
+ANALYSIS_CACHE_JANITOR_SECONDS = int(os.environ.get('ANALYSIS_CACHE_JANITOR_SECONDS', 600))
+_analysis_disk_cache = DiskCache(
+    _get_analysis_cache_dir(),
+    max_bytes=ANALYSIS_CACHE_MAX_MB * 1024 * 1024,
+    max_age=ANALYSIS_CACHE_MAX_AGE_DAYS * 86400 if ANALYSIS_CACHE_MAX_AGE_DAYS > 0 else None,
+    fmt=PREVIEW_CACHE_FORMAT,
+)
+# Backend compartido entre workers/máquinas si CACHE_BACKEND lo indica; si no, la DiskCache local
+_analysis_cache = namespace_cache(NS_ANALYSES, _analysis_disk_cache)
+if _analysis_cache is _analysis_disk_cache:
+    _analysis_disk_cache.start_janitor(ANALYSIS_CACHE_JANITOR_SECONDS)
+analysis_service = AnalysisService(_analysis_cache, match_state_lookup=lambda match_id: get_match_state(match_id),
+                                   negative_cache=_negative_cache, scheduler=get_scheduler())
+# Análisis en segundo plano: pool fijo de workers y cola acotada (429 cuando se llena)
+JOB_RETRY_AFTER_SECONDS = int(os.environ.get('JOB_RETRY_AFTER_SECONDS', 30))
+
+
+def _run_analysis_job(match_id):
+    """Handler de la cola: un resultado parcial (timed_out) no está en cache y se devuelve para el trabajo."""
+    payload = analysis_service.get_or_compute(match_id, priority=PRIORITY_BACKGROUND)['payload']
+    return payload if payload.get('timed_out') else None
+
+
+_job_queue = JobQueue(_run_analysis_job)
+# Precarga especulativa de vistas previas ligeras (prioridad prefetch en el planificador)
+PREVIEW_PREFETCH_JOIN_SECONDS = float(os.environ.get('PREVIEW_PREFETCH_JOIN_SECONDS', 20))
+_preview_prefetcher = PreviewPrefetcher(
+    lambda match_id: _compute_preview(match_id, 'light'),
+    lambda match_id: (_preview_cache.get(match_id, 'light') is not None
+                      or _negative_cache.check('preview_light', match_id) is not None),
+)
 
 
 def _build_nowgoal_url(path: str | None = None) -> str:
@@ -229,6 +452,7 @@ async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None
             html_content = None
 
     if html_content:
+        await asyncio.to_thread(archive_page, target_url, html_content, VARIANT_RAW)
         return html_content
 
     try:
@@ -244,7 +468,9 @@ async def _fetch_nowgoal_html(path: str | None = None, filter_state: int | None
                         await page.wait_for_timeout(1500)
                     except Exception as eval_err:
                         print(f"Advertencia al aplicar HideByState({filter_state}) en {target_url}: {eval_err}")
-                return await page.content()
+                html_content = await page.content()
+                await asyncio.to_thread(archive_page, target_url, html_content, VARIANT_RENDERED)
+                return html_content
             finally:
                 await browser.close()
     except Exception as browser_exc:
@@ -477,7 +703,7 @@ def parse_main_page_finished_matches(html_content, limit=20, offset=0, handicap_
 
     return paginated_matches
 
-async def get_main_page_matches_async(limit=None, offset=0, handicap_filter=None):
+def get_main_page_matches(limit=None, offset=0, handicap_filter=None):
     return _filter_and_slice_matches(
         'upcoming_matches',
         limit=limit,
@@ -487,7 +713,7 @@ async def get_main_page_matches_async(limit=None, offset=0, handicap_filter=None
     )
 
 
-async def get_main_page_finished_matches_async(limit=None, offset=0, handicap_filter=None):
+def get_main_page_finished_matches(limit=None, offset=0, handicap_filter=None):
     return _filter_and_slice_matches(
         'finished_matches',
         limit=limit,
@@ -496,74 +722,119 @@ async def get_main_page_finished_matches_async(limit=None, offset=0, handicap_fi
         sort_desc=True,
     )
 
+
+# Variantes async conservadas por compatibilidad: solo leen el snapshot en memoria,
+# así que las rutas llaman directamente a las versiones síncronas (sin asyncio.run)
+async def get_main_page_matches_async(limit=None, offset=0, handicap_filter=None):
+    return get_main_page_matches(limit, offset, handicap_filter)
+
+
+async def get_main_page_finished_matches_async(limit=None, offset=0, handicap_filter=None):
+    return get_main_page_finished_matches(limit, offset, handicap_filter)
+
 @app.route('/')
+@conditional_list_response('handicap')
 def index():
     try:
         print("Recibida petición para Próximos Partidos...")
         hf = request.args.get('handicap')
-        matches = asyncio.run(get_main_page_matches_async(handicap_filter=hf))
+        version = get_data_version()
+        if (cached := _rendered_pages.get('index', hf, version)) is not None:
+            return _rendered_page_response(cached)
+        matches = get_main_page_matches(handicap_filter=hf)
         print(f"Datos cargados desde {DATA_FILE.name}. {len(matches)} partidos disponibles.")
         opts = sorted({
             normalize_handicap_to_half_bucket_str(m.get('handicap'))
             for m in matches if normalize_handicap_to_half_bucket_str(m.get('handicap')) is not None
         }, key=lambda x: float(x))
-        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='upcoming', page_title='Próximos Partidos')
+        html = render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='upcoming', page_title='Próximos Partidos')
+        return _rendered_page_response(_rendered_pages.put('index', hf, version, html))
     except Exception as e:
         print(f"ERROR en la ruta principal: {e}")
+        g.list_error = True
         return render_template('index.html', matches=[], error=f"No se pudieron cargar los partidos: {e}", page_mode='upcoming', page_title='Próximos Partidos')
 
 @app.route('/resultados')
+@conditional_list_response('handicap')
 def resultados():
     try:
         print("Recibida petición para Partidos Finalizados...")
         hf = request.args.get('handicap')
-        matches = asyncio.run(get_main_page_finished_matches_async(handicap_filter=hf))
+        version = get_data_version()
+        if (cached := _rendered_pages.get('resultados', hf, version)) is not None:
+            return _rendered_page_response(cached)
+        matches = get_main_page_finished_matches(handicap_filter=hf)
         print(f"Datos cargados desde {DATA_FILE.name}. {len(matches)} partidos disponibles.")
         opts = sorted({
             normalize_handicap_to_half_bucket_str(m.get('handicap'))
             for m in matches if normalize_handicap_to_half_bucket_str(m.get('handicap')) is not None
         }, key=lambda x: float(x))
-        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='finished', page_title='Resultados Finalizados')
+        html = render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts, page_mode='finished', page_title='Resultados Finalizados')
+        return _rendered_page_response(_rendered_pages.put('resultados', hf, version, html))
     except Exception as e:
         print(f"ERROR en la ruta de resultados: {e}")
+        g.list_error = True
         return render_template('index.html', matches=[], error=f"No se pudieron cargar los partidos: {e}", page_mode='finished', page_title='Resultados Finalizados')
 
 @app.route('/api/matches')
+@conditional_list_response('handicap', 'offset', 'limit')
 def api_matches():
     try:
         offset = int(request.args.get('offset', 0))
         limit = int(request.args.get('limit', 5))
         limit = min(limit, 50)
-        matches = asyncio.run(get_main_page_matches_async(limit, offset, request.args.get('handicap')))
-        return jsonify({'matches': matches})
+        matches = get_main_page_matches(limit, offset, request.args.get('handicap'))
+        return _json_response({'matches': matches})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json_response({'error': str(e)}), 500
 
 @app.route('/api/finished_matches')
+@conditional_list_response('handicap', 'offset', 'limit')
 def api_finished_matches():
     try:
         offset = int(request.args.get('offset', 0))
         limit = int(request.args.get('limit', 5))
         limit = min(limit, 50)
-        matches = asyncio.run(get_main_page_finished_matches_async(limit, offset, request.args.get('handicap')))
-        return jsonify({'matches': matches})
+        matches = get_main_page_finished_matches(limit, offset, request.args.get('handicap'))
+        return _json_response({'matches': matches})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json_response({'error': str(e)}), 500
+
+@app.route('/api/search')
+@conditional_list_response('q', 'offset', 'limit', 'section')
+def api_search():
+    """Busca partidos (próximos y finalizados) por nombre de equipo, ordenados por hora de inicio."""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return _json_response({'error': 'Falta el parámetro q.'}), 400
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 20)), 0), 50)
+        total, matches = get_search_index().search(query, offset, limit, request.args.get('section'))
+        return _json_response({'query': query, 'total': total, 'offset': offset, 'limit': limit, 'matches': matches})
+    except Exception as e:
+        return _json_response({'error': str(e)}), 500
 
 @app.route('/proximos')
+@conditional_list_response('handicap')
 def proximos():
     try:
         print("Recibida petición. Cargando datos desde cache...")
         hf = request.args.get('handicap')
-        matches = asyncio.run(get_main_page_matches_async(25, 0, hf))
+        version = get_data_version()
+        if (cached := _rendered_pages.get('proximos', hf, version)) is not None:
+            return _rendered_page_response(cached)
+        matches = get_main_page_matches(25, 0, hf)
         print(f"Datos cargados desde {DATA_FILE.name}. {len(matches)} partidos disponibles.")
         opts = sorted({
             normalize_handicap_to_half_bucket_str(m.get('handicap'))
             for m in matches if normalize_handicap_to_half_bucket_str(m.get('handicap')) is not None
         }, key=lambda x: float(x))
-        return render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts)
+        html = render_template('index.html', matches=matches, handicap_filter=hf, handicap_options=opts)
+        return _rendered_page_response(_rendered_pages.put('proximos', hf, version, html))
     except Exception as e:
         print(f"ERROR en la ruta principal: {e}")
+        g.list_error = True
         return render_template('index.html', matches=[], error=f"No se pudieron cargar los partidos: {e}")
 
 # --- NUEVA RUTA PARA MOSTRAR EL ESTUDIO DETALLADO ---
@@ -574,14 +845,15 @@ def mostrar_estudio(match_id):
     """
     print(f"Recibida petición para el estudio del partido ID: {match_id}")
     
-    # Llama a la función principal de tu módulo de scraping
-    datos_partido = obtener_datos_completos_partido(match_id)
-    
-    if not datos_partido or "error" in datos_partido:
+    # Usa el análisis compartido (cache o scraping completo si no está fresco)
+    try:
+        resultado = analysis_service.get_or_compute(match_id)
+    except AnalysisError as exc:
         # Si hay un error, puedes mostrar una página de error
-        print(f"Error al obtener datos para {match_id}: {datos_partido.get('error')}")
-        abort(500, description=datos_partido.get('error', 'Error desconocido'))
+        print(f"Error al obtener datos para {match_id}: {exc}")
+        abort(500, description=str(exc) or 'Error desconocido')
 
+    datos_partido = rehydrate_datos(resultado['datos'])
     # Si todo va bien, renderiza la plantilla HTML pasándole los datos
     print(f"Datos obtenidos para {datos_partido['home_name']} vs {datos_partido['away_name']}. Renderizando plantilla...")
     return render_template('estudio.html', data=datos_partido, format_ah=format_ah_as_decimal_string_of)
@@ -597,24 +869,16 @@ def analizar_partido():
         if match_id:
             print(f"Recibida petición para analizar partido finalizado ID: {match_id}")
             
-            # Llama a la función principal de tu módulo de scraping
-            datos_partido = obtener_datos_completos_partido(match_id)
-            
-            if not datos_partido or "error" in datos_partido:
+            try:
+                resultado = analysis_service.get_or_compute(match_id)
+            except AnalysisError as exc:
                 # Si hay un error, mostrarlo en la página
-                print(f"Error al obtener datos para {match_id}: {datos_partido.get('error')}")
-                return render_template('analizar_partido.html', error=datos_partido.get('error', 'Error desconocido'))
+                print(f"Error al obtener datos para {match_id}: {exc}")
+                return render_template('analizar_partido.html', error=str(exc) or 'Error desconocido')
             
-            # --- ANÁLISIS SIMPLIFICADO ---
-            # Extraer los datos necesarios para el análisis simplificado
-            main_odds = datos_partido.get("main_match_odds_data")
-            h2h_data = datos_partido.get("h2h_data")
-            home_name = datos_partido.get("home_name")
-            away_name = datos_partido.get("away_name")
-
-            analisis_simplificado_html = ""
-            if all([main_odds, h2h_data, home_name, away_name]):
-                analisis_simplificado_html = generar_analisis_mercado_simplificado(main_odds, h2h_data, home_name, away_name)
+            datos_partido = rehydrate_datos(resultado['datos'])
+            # El análisis simplificado ya viene calculado en el payload compartido
+            analisis_simplificado_html = resultado['payload'].get('simplified_html', '')
 
             # Si todo va bien, renderiza la plantilla HTML pasándole los datos
             print(f"Datos obtenidos para {datos_partido['home_name']} vs {datos_partido['away_name']}. Renderizando plantilla...")
@@ -628,6 +892,27 @@ def analizar_partido():
     # Si es GET, mostrar el formulario
     return render_template('analizar_partido.html')
 
+def _compute_preview(match_id, cache_mode):
+    """
+    Scrapea la vista previa y la guarda en cache. Devuelve (datos, fallo): `fallo` es la
+    entrada de la cache negativa si el scraper devolvió error, o None.
+    Quien llama debe tener un slot del planificador (interactive o prefetch).
+    """
+    negative_key = f"preview_{cache_mode}"
+    if cache_mode == 'full':
+        preview_data = obtener_datos_preview_rapido(match_id)
+    else:
+        preview_data = obtener_datos_preview_ligero(match_id)
+    if "error" in preview_data:
+        return preview_data, _negative_cache.record_failure(negative_key, match_id, preview_data['error'],
+                                                            preview_data.get('error_class'))
+    _negative_cache.record_success(negative_key, match_id)
+    section, kickoff = get_match_state(match_id)
+    ttl = preview_ttl_seconds(kickoff, finished=(section == 'finished_matches'))
+    _preview_cache.put(match_id, cache_mode, preview_data, ttl)
+    return preview_data, None
+
+
 # --- NUEVA RUTA API PARA LA VISTA PREVIA RÁPIDA ---
 @app.route('/api/preview/<string:match_id>')
 def api_preview(match_id):
@@ -638,16 +923,51 @@ def api_preview(match_id):
     try:
         # Por defecto usa la vista previa LIGERA (requests). Si ?mode=selenium, usa la completa.
         mode = request.args.get('mode', 'light').lower()
-        if mode in ['full', 'selenium']:
-            preview_data = obtener_datos_preview_rapido(match_id)
-        else:
-            preview_data = obtener_datos_preview_ligero(match_id)
-        if "error" in preview_data:
-            return jsonify(preview_data), 500
-        return jsonify(preview_data)
+        cache_mode = 'full' if mode in ['full', 'selenium'] else 'light'
+        cached = _preview_cache.get(match_id, cache_mode)
+        if cached is not None:
+            return _json_response(cached)
+        if cache_mode == 'light':
+            # Una precarga ya en marcha para este ID: se espera su resultado en lugar de repetirla
+            prefetch_future = _preview_prefetcher.claim(match_id)
+            if prefetch_future is not None:
+                try:
+                    prefetch_future.result(timeout=PREVIEW_PREFETCH_JOIN_SECONDS)
+                except Exception:
+                    pass
+                cached = _preview_cache.get(match_id, cache_mode)
+                if cached is not None:
+                    return _json_response(cached)
+        negative_key = f"preview_{cache_mode}"
+        blocked = _negative_cache.check(negative_key, match_id)
+        if blocked is not None:
+            return _error_response({'error': blocked.message, 'error_class': blocked.error_class}, 500, blocked.retry_after())
+        with get_scheduler().slot(PRIORITY_INTERACTIVE):
+            preview_data, failure = _compute_preview(match_id, cache_mode)
+        if failure is not None:
+            return _error_response(preview_data, 500, failure.retry_after())
+        return _json_response(preview_data)
     except Exception as e:
         print(f"Error en la ruta /api/preview/{match_id}: {e}")
-        return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
+        return _json_response({'error': 'Ocurrió un error interno en el servidor.'}), 500
+
+
+@app.route('/api/preview/prefetch', methods=['POST'])
+def api_preview_prefetch():
+    """
+    Precarga especulativa de vistas previas: {"match_ids": [...], "client_id": "..."}.
+    La página de listas envía los IDs de las filas visibles; cada llamada sustituye
+    la lista anterior del mismo cliente (las precargas que ya no están visibles y
+    no han empezado se cancelan). Responde 202 con el reparto de IDs.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        match_ids = normalize_prefetch_ids(body.get('match_ids'))
+    except ValueError as exc:
+        return _json_response({'error': str(exc)}), 400
+    client = str(body.get('client_id') or request.remote_addr or '')
+    summary = _preview_prefetcher.prefetch(match_ids, client)
+    return _json_response(summary), 202
 
 
 @app.route('/api/analisis/<string:match_id>')
@@ -657,269 +977,106 @@ def api_analisis(match_id):
     Devuelve tanto el payload complejo como el HTML simplificado.
     """
     try:
-        cached_payload = load_preview_from_cache(match_id)
-        if isinstance(cached_payload, dict) and cached_payload.get('home_team'):
-            print(f"Devolviendo analisis cacheado para {match_id}")
-            return jsonify(cached_payload)
-
-        start_time = time.time()
-        logging.warning(f"CACHE MISS para {match_id}. Iniciando análisis profundo...")
+        resultado = analysis_service.get_or_compute(match_id, allow_stale=True)
+        payload = resultado['payload']
+        if resultado.get('stale'):
+            # Copia servida mientras se recalcula en segundo plano
+            payload = dict(payload, stale=True)
+        return _json_response(payload)
+    except AnalysisError as exc:
+        return _error_response({'error': str(exc) or 'No se pudieron obtener datos.', 'error_class': exc.error_class},
+                               500, exc.retry_after)
+    except Exception as e:
+        print(f"Error en la ruta /api/analisis/{match_id}: {e}")
+        return _json_response({'error': 'Ocurrió un error interno en el servidor.'}), 500
 
-        datos = obtener_datos_completos_partido(match_id)
-        if not datos or (isinstance(datos, dict) and datos.get('error')):
-            return jsonify({'error': (datos or {}).get('error', 'No se pudieron obtener datos.')}), 500
+@app.route('/api/analisis/<string:match_id>/stream')
+def api_analisis_stream(match_id):
+    """
+    Variante SSE de /api/analisis/<id>: cada sección se envía en cuanto está lista
+    y un evento final `done` lleva el payload completo (esquema en analysis_stream.py).
+    """
+    return Response(stream_with_context(stream_analysis(analysis_service, match_id)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
 
-        # --- Lógica para el payload complejo (la original) ---
-        def df_to_rows(df):
-            rows = []
-            try:
-                if df is not None and hasattr(df, 'iterrows'):
-                    for idx, row in df.iterrows():
-                        label = str(idx)
-                        label = label.replace('Shots on Goal', 'Tiros a Puerta')                                     .replace('Shots', 'Tiros')                                     .replace('Dangerous Attacks', 'Ataques Peligrosos')                                     .replace('Attacks', 'Ataques')
-                        try:
-                            home_val = row['Casa']
-                        except Exception:
-                            home_val = ''
-                        try:
-                            away_val = row['Fuera']
-                        except Exception:
-                            away_val = ''
-                        rows.append({'label': label, 'home': home_val or '', 'away': away_val or ''})
-            except Exception:
-                pass
-            return rows
-
-        payload = {
-            'match_id': match_id,
-            'home_team': datos.get('home_name', ''),
-            'away_team': datos.get('away_name', ''),
-            'final_score': datos.get('score'),
-            'match_date': datos.get('match_date'),
-            'match_time': datos.get('match_time'),
-            'match_datetime': datos.get('match_datetime'),
-            'recent_indirect_full': {
-                'last_home': None,
-                'last_away': None,
-                'h2h_col3': None
-            },
-            'comparativas_indirectas': {
-                'left': None,
-                'right': None
-            }
-        }
-        
-        # --- START COVERAGE CALCULATION ---
-        main_odds = datos.get("main_match_odds_data")
-        home_name = datos.get("home_name")
-        away_name = datos.get("away_name")
-        ah_actual_num = parse_ah_to_number_of(main_odds.get('ah_linea_raw', ''))
-        
-        favorito_actual_name = "Ninguno (línea en 0)"
-        if ah_actual_num is not None:
-            if ah_actual_num > 0: favorito_actual_name = home_name
-            elif ah_actual_num < 0: favorito_actual_name = away_name
-
-        def get_cover_status_vs_current(details):
-            if not details or ah_actual_num is None:
-                return 'NEUTRO'
-            try:
-                score_str = details.get('score', '').replace(' ', '').replace(':', '-')
-                if not score_str or '?' in score_str:
-                    return 'NEUTRO'
-
-                h_home = details.get('home_team')
-                h_away = details.get('away_team')
-                
-                status, _ = check_handicap_cover(score_str, ah_actual_num, favorito_actual_name, h_home, h_away, home_name)
-                return status
-            except Exception:
-                return 'NEUTRO'
-                
-        # --- Análisis mejorado de H2H Rivales ---
-        def analyze_h2h_rivals(home_result, away_result):
-            if not home_result or not away_result:
-                return None
-                
-            try:
-                # Obtener resultados de los partidos
-                home_goals = list(map(int, home_result.get('score', '0-0').split('-')))
-                away_goals = list(map(int, away_result.get('score', '0-0').split('-')))
-                
-                # Calcular diferencia de goles
-                home_goal_diff = home_goals[0] - home_goals[1]
-                away_goal_diff = away_goals[0] - away_goals[1]
-                
-                # Comparar resultados
-                if home_goal_diff > away_goal_diff:
-                    return "Contra rivales comunes, el Equipo Local ha obtenido mejores resultados"
-                elif away_goal_diff > home_goal_diff:
-                    return "Contra rivales comunes, el Equipo Visitante ha obtenido mejores resultados"
-                else:
-                    return "Los rivales han tenido resultados similares"
-            except Exception:
-                return None
-                
-        # --- Análisis de Comparativas Indirectas ---
-        def analyze_indirect_comparison(result, team_name):
-            if not result:
-                return None
-                
-            try:
-                # Determinar si el equipo cubrió el handicap
-                status = get_cover_status_vs_current(result)
-                
-                if status == 'CUBIERTO':
-                    return f"Contra este rival, {team_name} habría cubierto el handicap"
-                elif status == 'NO CUBIERTO':
-                    return f"Contra este rival, {team_name} no habría cubierto el handicap"
-                else:
-                    return f"Contra este rival, el resultado para {team_name} sería indeterminado"
-            except Exception:
-                return None
-        # --- END COVERAGE CALCULATION ---
-
-        last_home = (datos.get('last_home_match') or {})
-        last_home_details = last_home.get('details') or {}
-        if last_home_details:
-            payload['recent_indirect_full']['last_home'] = {
-                'home': last_home_details.get('home_team'),
-                'away': last_home_details.get('away_team'),
-                'score': (last_home_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(last_home_details.get('handicap_line_raw') or '-'),
-                'ou': last_home_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_home.get('stats')),
-                'date': last_home_details.get('date'),
-                'cover_status': get_cover_status_vs_current(last_home_details)
-            }
-
-        last_away = (datos.get('last_away_match') or {})
-        last_away_details = last_away.get('details') or {}
-        if last_away_details:
-            payload['recent_indirect_full']['last_away'] = {
-                'home': last_away_details.get('home_team'),
-                'away': last_away_details.get('away_team'),
-                'score': (last_away_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(last_away_details.get('handicap_line_raw') or '-'),
-                'ou': last_away_details.get('ouLine') or '-',
-                'stats_rows': df_to_rows(last_away.get('stats')),
-                'date': last_away_details.get('date'),
-                'cover_status': get_cover_status_vs_current(last_away_details)
-            }
-
-        h2h_col3 = (datos.get('h2h_col3') or {})
-        h2h_col3_details = h2h_col3.get('details') or {}
-        if h2h_col3_details and h2h_col3_details.get('status') == 'found':
-            h2h_col3_details_adapted = {
-                'score': f"{h2h_col3_details.get('goles_home')}:{h2h_col3_details.get('goles_away')}",
-                'home_team': h2h_col3_details.get('h2h_home_team_name'),
-                'away_team': h2h_col3_details.get('h2h_away_team_name')
-            }
-            payload['recent_indirect_full']['h2h_col3'] = {
-                'home': h2h_col3_details.get('h2h_home_team_name'),
-                'away': h2h_col3_details.get('h2h_away_team_name'),
-                'score': f"{h2h_col3_details.get('goles_home')} : {h2h_col3_details.get('goles_away')}",
-                'ah': format_ah_as_decimal_string_of(h2h_col3_details.get('handicap_line_raw') or '-'),
-                'ou': h2h_col3_details.get('ou_result') or '-',
-                'stats_rows': df_to_rows(h2h_col3.get('stats')),
-                'date': h2h_col3_details.get('date'),
-                'cover_status': get_cover_status_vs_current(h2h_col3_details_adapted),
-                'analysis': analyze_h2h_rivals(last_home_details, last_away_details)
-            }
-
-        h2h_general = (datos.get('h2h_general') or {})
-        h2h_general_details = h2h_general.get('details') or {}
-        if h2h_general_details:
-            score_text = h2h_general_details.get('res6') or ''
-            cover_input = {
-                'score': score_text,
-                'home_team': h2h_general_details.get('h2h_gen_home'),
-                'away_team': h2h_general_details.get('h2h_gen_away')
-            }
-            payload['recent_indirect_full']['h2h_general'] = {
-                'home': h2h_general_details.get('h2h_gen_home'),
-                'away': h2h_general_details.get('h2h_gen_away'),
-                'score': score_text.replace(':', ' : '),
-                'ah': h2h_general_details.get('ah6') or '-',
-                'ou': h2h_general_details.get('ou_result6') or '-',
-                'stats_rows': df_to_rows(h2h_general.get('stats')),
-                'date': h2h_general_details.get('date'),
-                'cover_status': get_cover_status_vs_current(cover_input) if score_text else 'NEUTRO'
-            }
-
-        comp_left = (datos.get('comp_L_vs_UV_A') or {})
-        comp_left_details = comp_left.get('details') or {}
-        if comp_left_details:
-            payload['comparativas_indirectas']['left'] = {
-                'title_home_name': datos.get('home_name'),
-                'title_away_name': datos.get('away_name'),
-                'home_team': comp_left_details.get('home_team'),
-                'away_team': comp_left_details.get('away_team'),
-                'score': (comp_left_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(comp_left_details.get('ah_line') or '-'),
-                'ou': comp_left_details.get('ou_line') or '-',
-                'localia': comp_left_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_left.get('stats')),
-                'cover_status': get_cover_status_vs_current(comp_left_details),
-                'analysis': analyze_indirect_comparison(comp_left_details, datos.get('home_name'))
-            }
-
-        comp_right = (datos.get('comp_V_vs_UL_H') or {})
-        comp_right_details = comp_right.get('details') or {}
-        if comp_right_details:
-            payload['comparativas_indirectas']['right'] = {
-                'title_home_name': datos.get('home_name'),
-                'title_away_name': datos.get('away_name'),
-                'home_team': comp_right_details.get('home_team'),
-                'away_team': comp_right_details.get('away_team'),
-                'score': (comp_right_details.get('score') or '').replace(':', ' : '),
-                'ah': format_ah_as_decimal_string_of(comp_right_details.get('ah_line') or '-'),
-                'ou': comp_right_details.get('ou_line') or '-',
-                'localia': comp_right_details.get('localia') or '',
-                'stats_rows': df_to_rows(comp_right.get('stats')),
-                'cover_status': get_cover_status_vs_current(comp_right_details),
-                'analysis': analyze_indirect_comparison(comp_right_details, datos.get('away_name'))
-            }
-
-        # --- Lógica para el HTML simplificado ---
-        h2h_data = datos.get("h2h_data")
-        simplified_html = ""
-        if all([main_odds, h2h_data, home_name, away_name]):
-            simplified_html = generar_analisis_mercado_simplificado(main_odds, h2h_data, home_name, away_name)
-        
-        payload['simplified_html'] = simplified_html
 
-        save_preview_to_cache(match_id, payload)
+@app.route('/api/analisis/batch', methods=['POST'])
+def api_analisis_batch():
+    """
+    Análisis de varios partidos en una sola llamada: {"match_ids": [...]}.
+    Responde NDJSON, una línea por partido según termina y una última con el resumen.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        match_ids = normalize_batch_ids(body.get('match_ids'))
+    except ValueError as exc:
+        return _json_response({'error': str(exc)}), 400
 
-        end_time = time.time()
-        elapsed = end_time - start_time
-        logging.warning(f"[PERFORMANCE] El análisis completo para el partido {match_id} tardó {elapsed:.2f} segundos.")
+    def generate():
+        for item in run_batch(analysis_service, match_ids, crear_driver_chrome):
+            yield dumps_json(item) + b'\n'
 
-        return jsonify(payload)
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
 
-    except Exception as e:
-        print(f"Error en la ruta /api/analisis/{match_id}: {e}")
-        return jsonify({'error': 'Ocurrió un error interno en el servidor.'}), 500
 
 @app.route('/start_analysis_background', methods=['POST'])
 def start_analysis_background():
     match_id = request.json.get('match_id')
     if not match_id:
-        return jsonify({'status': 'error', 'message': 'No se proporcionó match_id'}), 400
-
-    def analysis_worker(app, match_id):
-        with app.app_context():
-            print(f"Iniciando análisis en segundo plano para el ID: {match_id}")
-            try:
-                obtener_datos_completos_partido(match_id)
-                print(f"Análisis en segundo plano finalizado para el ID: {match_id}")
-            except Exception as e:
-                print(f"Error en el hilo de análisis para el ID {match_id}: {e}")
-
-    thread = threading.Thread(target=analysis_worker, args=(app, match_id))
-    thread.start()
+        return _json_response({'status': 'error', 'message': 'No se proporcionó match_id'}), 400
+    try:
+        analysis_service.check_blocked(match_id)
+    except AnalysisError as exc:
+        # Fallo reciente: no se lanza otro navegador hasta que pase el bloqueo
+        return _error_response({'status': 'error', 'message': str(exc), 'error_class': exc.error_class},
+                               503, exc.retry_after)
 
-    return jsonify({'status': 'success', 'message': f'Análisis iniciado para el partido {match_id}'})
+    try:
+        # El resultado queda en la cache compartida: la siguiente visita es instantánea
+        job, created = _job_queue.submit(match_id)
+    except QueueFullError as exc:
+        return _error_response({'status': 'error', 'message': str(exc)}, 429, JOB_RETRY_AFTER_SECONDS)
+
+    response = _json_response({
+        'status': 'success',
+        'message': f'Análisis iniciado para el partido {match_id}' if created else f'El análisis del partido {match_id} ya estaba en curso',
+        'job_id': job.id,
+        'job_status': job.status,
+        'status_url': f'/jobs/{job.id}',
+        'result_url': f'/jobs/{job.id}/result',
+    })
+    response.status_code = 202
+    return response
+
+
+@app.route('/jobs/<string:job_id>')
+def job_status(job_id):
+    job = _job_queue.get(job_id)
+    if job is None:
+        return _json_response({'error': 'Trabajo no encontrado o caducado.'}), 404
+    return _json_response(job.to_dict())
+
+
+@app.route('/jobs/<string:job_id>/result')
+def job_result(job_id):
+    job = _job_queue.get(job_id)
+    if job is None:
+        return _json_response({'error': 'Trabajo no encontrado o caducado.'}), 404
+    if job.status == STATUS_ERROR:
+        return _json_response({'status': job.status, 'error': job.error}), 500
+    if job.status == STATUS_PARTIAL:
+        # Presupuesto agotado: el resultado parcial no se guardó en cache, vive en el trabajo
+        return _json_response(job.result)
+    if job.status != STATUS_DONE:
+        response = _json_response(job.to_dict())
+        response.status_code = 202
+        return response
+    # El resultado vive en la cache de análisis, no en el trabajo
+    entry, _ = analysis_service.get_cached(job.match_id)
+    if entry is None:
+        return _json_response({'error': 'El resultado ya no está en la cache.', 'status': job.status}), 410
+    return _json_response(entry['payload'])
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True) # debug=True es útil para desarrollar
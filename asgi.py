@@ -0,0 +1,216 @@
+# asgi.py - Punto de entrada ASGI (uvicorn/hypercorn) sobre la app Flask
+"""
+Modo de servicio asíncrono: un único event loop de larga duración (el del
+servidor ASGI) atiende todas las conexiones, y cada petición se ejecuta en uno
+de dos carriles con su propio pool de hilos:
+
+    scrape  /api/analisis, /api/preview, /estudio, /analizar_partido...
+            (Selenium/requests, decenas de segundos) -> ASGI_SCRAPE_WORKERS hilos
+    fast    listas, búsqueda, portada y estáticos -> ASGI_FAST_WORKERS hilos
+
+Así muchos análisis lentos simultáneos no dejan sin hilos a las listas. Las
+respuestas en streaming (p.ej. /api/analisis/batch en NDJSON) se reenvían al
+cliente según se generan; si el cliente se desconecta (`http.disconnect`) se
+deja de enviar y el hilo deja de iterar la respuesta en el siguiente fragmento,
+liberando su hilo del carril.
+
+Uso:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+
+ASGI_SCRAPE_WORKERS = int(os.environ.get('ASGI_SCRAPE_WORKERS', 8))
+ASGI_FAST_WORKERS = int(os.environ.get('ASGI_FAST_WORKERS', 16))
+# Rutas que pueden lanzar scraping y van al carril lento
+SCRAPE_PATH_PREFIXES = (
+    '/api/analisis',
+    '/api/preview',
+    '/estudio',
+    '/analizar_partido',
+    '/start_analysis_background',
+    '/jobs',
+)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(lane: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(lane)
+        if executor is None:
+            workers = ASGI_SCRAPE_WORKERS if lane == 'scrape' else ASGI_FAST_WORKERS
+            executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"asgi-{lane}")
+            _executors[lane] = executor
+        return executor
+
+
+def _shutdown_executors():
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def lane_for_path(path: str) -> str:
+    return 'scrape' if path.startswith(SCRAPE_PATH_PREFIXES) else 'fast'
+
+
+def _build_environ(scope, body: bytes) -> dict:
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _run_wsgi(environ, loop, messages: asyncio.Queue, cancelled: threading.Event):
+    """Ejecuta la app Flask en un hilo del carril y envía (tipo, datos) al event loop."""
+    def push(kind, data):
+        loop.call_soon_threadsafe(messages.put_nowait, (kind, data))
+
+    def start_response(status, headers, exc_info=None):
+        push('start', (int(status.split(' ', 1)[0]), headers))
+        return lambda chunk: push('body', chunk)
+
+    result = None
+    try:
+        result = flask_app.wsgi_app(environ, start_response)
+        for chunk in result:
+            if cancelled.is_set():
+                break
+            if chunk:
+                push('body', chunk)
+    except Exception as exc:
+        push('error', exc)
+    finally:
+        if result is not None and hasattr(result, 'close'):
+            try:
+                result.close()
+            except Exception:
+                pass
+        push('end', None)
+
+
+async def _read_body(receive) -> bytes | None:
+    """Cuerpo completo de la petición, o None si el cliente se desconecta antes de enviarlo."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _watch_disconnect(receive, messages: asyncio.Queue, cancelled: threading.Event):
+    """Espera el `http.disconnect` del cliente mientras dura la respuesta."""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            cancelled.set()
+            messages.put_nowait(('disconnect', None))
+            return
+
+
+async def _handle_http(scope, receive, send):
+    body = await _read_body(receive)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+    cancelled = threading.Event()
+    environ = _build_environ(scope, body)
+    future = loop.run_in_executor(_get_executor(lane_for_path(scope['path'])), _run_wsgi, environ, loop, messages, cancelled)
+    # Los servidores ASGI no fallan en send() tras la desconexión: hay que escuchar receive()
+    watcher = asyncio.create_task(_watch_disconnect(receive, messages, cancelled))
+    started = False
+    try:
+        while True:
+            kind, data = await messages.get()
+            if kind == 'disconnect':
+                # Cliente desconectado: no se envía nada más
+                break
+            if kind == 'start':
+                status, headers = data
+                await send({
+                    'type': 'http.response.start',
+                    'status': status,
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+                })
+                started = True
+            elif kind == 'body':
+                await send({'type': 'http.response.body', 'body': bytes(data), 'more_body': True})
+            elif kind == 'error':
+                print(f"Error en la petición ASGI {scope['path']}: {data}")
+                if not started:
+                    await send({'type': 'http.response.start', 'status': 500,
+                                'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+                    started = True
+            elif kind == 'end':
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                break
+    except (asyncio.CancelledError, OSError):
+        # Cliente desconectado: el hilo deja de iterar la respuesta en el siguiente fragmento
+        cancelled.set()
+        raise
+    finally:
+        watcher.cancel()
+    await future
+
+
+async def _handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _get_executor('fast')
+            _get_executor('scrape')
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _shutdown_executors()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        await _handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _handle_lifespan(receive, send)
+    else:
+        raise RuntimeError(f"Tipo de conexión ASGI no soportado: {scope['type']}")
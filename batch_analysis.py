@@ -0,0 +1,202 @@
+# batch_analysis.py - Motor de análisis por lotes para POST /api/analisis/batch
+"""
+Analiza una lista de partidos con paralelismo acotado y devuelve los resultados
+según van terminando (el endpoint los emite como NDJSON, una línea por partido).
+
+Lo que se comparte dentro del lote:
+- Navegadores: un pool compartido por todos los lotes en curso, con tantos Chrome
+  como el cupo background del planificador, que se reutilizan entre partidos en
+  lugar de abrir y cerrar uno por análisis. El navegador se toma después de
+  obtener el slot background (un lote en cola no abre Chrome) y el pool se cierra
+  cuando termina el último lote.
+- Sesión HTTP (estudio_scraper) y páginas ya descargadas (archivo de páginas y
+  cache de estadísticas): un partido clave repetido en el lote no se vuelve a bajar.
+- Cache de análisis: los partidos con análisis fresco no se recalculan.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from analysis_service import AnalysisError
+from scheduler import PRIORITY_BACKGROUND
+
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 3))
+
+
+class DriverPool:
+    """
+    Pool perezoso de navegadores: se crean bajo demanda, nunca hay más de `max_size`
+    a la vez (`acquire()` espera a que se libere uno) y se cierran todos en `close()`.
+    """
+
+    def __init__(self, factory, max_size: int):
+        self.factory = factory
+        self.max_size = max(1, int(max_size))
+        self._idle = []
+        self._all = []
+        self._size = 0  # navegadores creados o en creación
+        self._available = threading.Condition(threading.Lock())
+
+    def acquire(self):
+        with self._available:
+            while not self._idle and self._size >= self.max_size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+        try:
+            driver = self.factory()
+        except BaseException:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+        with self._available:
+            self._all.append(driver)
+        return driver
+
+    def release(self, driver, failed: bool = False):
+        """
+        Devuelve el navegador al pool. Tras un análisis fallido solo se descarta si el
+        propio navegador ha dejado de responder (sesión de WebDriver caída); un ID
+        inexistente o una página sin datos no lo invalidan.
+        """
+        if driver is None:
+            return
+        if failed and not self._is_alive(driver):
+            with self._available:
+                if driver in self._all:
+                    self._all.remove(driver)
+                    self._size -= 1
+                self._available.notify()
+            self._quit(driver)
+            return
+        with self._available:
+            self._idle.append(driver)
+            self._available.notify()
+
+    @staticmethod
+    def _is_alive(driver) -> bool:
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._available:
+            drivers, self._all, self._idle = self._all, [], []
+            self._size = 0
+            self._available.notify_all()
+        for driver in drivers:
+            self._quit(driver)
+
+
+_shared_pools = {}  # factory -> [DriverPool, lotes que lo usan]
+_shared_pools_lock = threading.Lock()
+
+
+def _lease_driver_pool(factory, size: int) -> DriverPool:
+    """Pool compartido por los lotes concurrentes que usan la misma factoría."""
+    with _shared_pools_lock:
+        holder = _shared_pools.get(factory)
+        if holder is None:
+            holder = _shared_pools[factory] = [DriverPool(factory, size), 0]
+        holder[1] += 1
+        return holder[0]
+
+
+def _return_driver_pool(factory):
+    """Cierra el pool compartido cuando ya no lo usa ningún lote."""
+    with _shared_pools_lock:
+        holder = _shared_pools.get(factory)
+        if holder is None:
+            return
+        holder[1] -= 1
+        if holder[1] > 0:
+            return
+        del _shared_pools[factory]
+    holder[0].close()
+
+
+def normalize_batch_ids(raw_ids) -> list:
+    """IDs únicos en el orden recibido; lanza ValueError si la lista no es válida."""
+    if not isinstance(raw_ids, list) or not raw_ids:
+        raise ValueError("Se esperaba una lista no vacía 'match_ids'.")
+    seen = []
+    for value in raw_ids:
+        match_id = str(value).strip()
+        if match_id and match_id not in seen:
+            seen.append(match_id)
+    if len(seen) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Como máximo {BATCH_MAX_ITEMS} partidos por lote.")
+    return seen
+
+
+def run_batch(service, match_ids, driver_factory, workers: int = BATCH_WORKERS):
+    """
+    Generador de un dict por partido según terminan:
+        {'match_id', 'status': 'ok'|'error', 'cached', 'elapsed_ms', 'payload' | 'error', 'error_class'}
+    y un último dict {'summary': {...}} con los totales del lote.
+    """
+    batch_start = time.time()
+    scheduler = service.scheduler
+    pool_size = workers
+    if scheduler is not None:
+        pool_size = min(workers, scheduler.quotas.get(PRIORITY_BACKGROUND, workers))
+    pool = _lease_driver_pool(driver_factory, pool_size)
+
+    def _analyze(match_id):
+        start_time = time.time()
+        item = {'match_id': match_id}
+        driver = None
+        failed = False
+        try:
+            entry, stale_reason = service.get_cached(match_id)
+            cached = stale_reason is None
+            if not cached:
+                if not match_id.isdigit():
+                    raise AnalysisError("ID de partido inválido.", 'invalid_id')
+                service.check_blocked(match_id)
+                # Un lote es trabajo de fondo: los clics interactivos pasan por delante. El slot se
+                # pide antes que el navegador para no tener Chrome abiertos esperando en la cola
+                with scheduler.slot(PRIORITY_BACKGROUND) if scheduler is not None else nullcontext():
+                    driver = pool.acquire()
+                    entry = service.compute(match_id, driver=driver, priority=PRIORITY_BACKGROUND, slot_held=True)
+            item.update(status='ok', cached=cached, payload=entry['payload'])
+        except AnalysisError as exc:
+            failed = True
+            item.update(status='error', error=str(exc), error_class=exc.error_class, retry_after=exc.retry_after)
+        except Exception as exc:
+            failed = True
+            item.update(status='error', error=str(exc) or type(exc).__name__, error_class='internal')
+        finally:
+            pool.release(driver, failed=failed)
+        item['elapsed_ms'] = round((time.time() - start_time) * 1000, 1)
+        return item
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='analysis-batch')
+    totals = {'total': len(match_ids), 'ok': 0, 'error': 0, 'cached': 0}
+    try:
+        futures = [executor.submit(_analyze, match_id) for match_id in match_ids]
+        for future in as_completed(futures):
+            item = future.result()
+            totals['ok' if item['status'] == 'ok' else 'error'] += 1
+            totals['cached'] += 1 if item.get('cached') else 0
+            yield item
+        totals['elapsed_ms'] = round((time.time() - batch_start) * 1000, 1)
+        yield {'summary': totals}
+    finally:
+        # Si el cliente se desconecta se cancelan los pendientes; los que corren terminan
+        executor.shutdown(wait=True, cancel_futures=True)
+        _return_driver_pool(driver_factory)
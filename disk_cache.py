@@ -0,0 +1,160 @@
+# disk_cache.py - Cache en disco atómica, particionada y con límite de tamaño
+"""
+Cache clave -> valor en disco para payloads de análisis y vistas previas.
+
+- Escritura atómica: se escribe en un temporal del mismo directorio y se hace
+  `os.replace`, así un lector concurrente nunca ve un fichero a medias.
+- Sharding: el fichero de cada clave vive en `<root>/<2 hex del sha1>/<sha1><ext>`
+  para no acumular miles de ficheros en un solo directorio.
+- Límite de tamaño total (`max_bytes`) con expulsión LRU (la lectura actualiza
+  el mtime) y edad máxima opcional (`max_age`).
+- Un hilo "janitor" opcional aplica la expulsión periódicamente.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from serializers import DECODE_ERRORS, FORMAT_JSON, dumps, file_suffix, loads
+
+# Al superar el presupuesto se libera hasta quedar por debajo de esta fracción
+_EVICT_TARGET_RATIO = 0.9
+
+
+class DiskCache:
+    def __init__(self, root, max_bytes: int = 512 * 1024 * 1024, max_age: float | None = None, fmt: str = FORMAT_JSON):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.max_age = max_age
+        self.fmt = fmt
+        self.suffix = file_suffix(fmt)
+        self._evict_lock = threading.Lock()
+        self._janitor = None
+        self._janitor_stop = threading.Event()
+
+    def path_for(self, key: str) -> Path:
+        digest = hashlib.sha1(str(key).encode('utf-8')).hexdigest()
+        return self.root / digest[:2] / f"{digest}{self.suffix}"
+
+    def get(self, key: str):
+        path = self.path_for(key)
+        try:
+            with path.open('rb') as fh:
+                raw = fh.read()
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            print(f"Error al leer cache en disco {path}: {exc}")
+            return None
+        if self.max_age is not None:
+            try:
+                if time.time() - path.stat().st_mtime > self.max_age:
+                    path.unlink(missing_ok=True)
+                    return None
+            except OSError:
+                return None
+        try:
+            value = loads(raw, self.fmt)
+        except DECODE_ERRORS as exc:
+            print(f"Entrada de cache corrupta {path}: {exc}")
+            path.unlink(missing_ok=True)
+            return None
+        self._touch(path)
+        return value
+
+    def set(self, key: str, value) -> bool:
+        path = self.path_for(key)
+        try:
+            payload = dumps(value, self.fmt)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-', suffix=self.suffix)
+            try:
+                with os.fdopen(fd, 'wb') as fh:
+                    fh.write(payload)
+                os.replace(tmp_name, path)
+            except BaseException:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+            return True
+        except (OSError, TypeError, ValueError) as exc:
+            print(f"Error al escribir cache en disco para {key}: {exc}")
+            return False
+
+    def delete(self, key: str):
+        self.path_for(key).unlink(missing_ok=True)
+
+    def __contains__(self, key):
+        return self.path_for(key).exists()
+
+    @staticmethod
+    def _touch(path: Path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _iter_entries(self):
+        if not self.root.exists():
+            return
+        for shard in self.root.iterdir():
+            if not shard.is_dir():
+                continue
+            for path in shard.iterdir():
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                yield path, st
+
+    def evict(self) -> dict:
+        """Elimina entradas caducadas, temporales huérfanos y, si hace falta, las menos usadas."""
+        stats = {"removed": 0, "freed_bytes": 0, "total_bytes": 0}
+        now = time.time()
+        with self._evict_lock:
+            live = []
+            for path, st in self._iter_entries():
+                orphan_tmp = path.name.startswith('.tmp-') and now - st.st_mtime > 3600
+                expired = self.max_age is not None and now - st.st_mtime > self.max_age
+                if orphan_tmp or expired:
+                    path.unlink(missing_ok=True)
+                    stats["removed"] += 1
+                    stats["freed_bytes"] += st.st_size
+                elif not path.name.startswith('.tmp-'):
+                    live.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in live)
+            if self.max_bytes is not None and total > self.max_bytes:
+                target = self.max_bytes * _EVICT_TARGET_RATIO
+                live.sort()
+                for _, size, path in live:
+                    if total <= target:
+                        break
+                    path.unlink(missing_ok=True)
+                    total -= size
+                    stats["removed"] += 1
+                    stats["freed_bytes"] += size
+            stats["total_bytes"] = total
+        return stats
+
+    def start_janitor(self, interval: float = 600):
+        """Arranca (una sola vez) un hilo demonio que ejecuta `evict()` cada `interval` segundos."""
+        if self._janitor is not None:
+            return self._janitor
+
+        def _run():
+            while not self._janitor_stop.wait(interval):
+                try:
+                    stats = self.evict()
+                    if stats["removed"]:
+                        print(f"Janitor de cache {self.root}: {stats['removed']} entradas eliminadas "
+                              f"({stats['freed_bytes']} bytes liberados).")
+                except Exception as exc:
+                    print(f"Error en el janitor de cache {self.root}: {exc}")
+
+        self._janitor = threading.Thread(target=_run, name=f"disk-cache-janitor-{self.root.name}", daemon=True)
+        self._janitor.start()
+        return self._janitor
+
+    def stop_janitor(self):
+        self._janitor_stop.set()
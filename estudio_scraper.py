@@ -4,6 +4,8 @@ from modules.analisis_reciente import analizar_rendimiento_reciente_con_handicap
 from modules.analisis_rivales import analizar_rivales_comunes, analizar_contra_rival_del_rival
 from modules.funciones_resumen import generar_resumen_rendimiento_reciente
 from modules.funciones_auxiliares import _calcular_estadisticas_contra_rival, _analizar_over_under, _analizar_ah_cubierto, _analizar_desempeno_casa_fuera
+import os
+import threading
 import time
 import re
 import math
@@ -20,9 +22,57 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from modules.utils import parse_ah_to_number_of, format_ah_as_decimal_string_of, check_handicap_cover, check_goal_line_cover, get_match_details_from_row_of, extract_final_score_of
+from stats_cache import get_stats_cache
+from page_archive import VARIANT_RAW, VARIANT_RENDERED, archive_page, archived_html
+from deadline import Deadline, DeadlineExceeded, clamp_timeout
+from negative_cache import ERROR_INVALID_ID, ERROR_TIMEOUT, INVALID_ID_MESSAGE
+from stage_graph import STAGE_SKIPPED, Stage, StageGraph
 
 BASE_URL_OF = "https://live18.nowgoal25.com"
 SELENIUM_TIMEOUT_SECONDS_OF = 10
+# Modo offline: el análisis se calcula con las páginas del archivo (page_archive) sin tocar la red
+ANALYSIS_OFFLINE = os.environ.get('ANALYSIS_OFFLINE', '0') == '1'
+# Las páginas h2h de los partidos clave (ya jugados) se reutilizan del archivo durante este tiempo
+H2H_KEY_PAGE_MAX_AGE = int(os.environ.get('H2H_KEY_PAGE_MAX_AGE', 600))
+# Presupuesto total de obtener_datos_completos_partido (0 = sin límite); al agotarse se devuelve lo calculado
+ANALYSIS_DEADLINE_SECONDS = float(os.environ.get('ANALYSIS_DEADLINE_SECONDS', 45))
+DRIVER_PAGE_LOAD_TIMEOUT = 30
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def _get_shared_http_session():
+    """Sesión HTTP compartida (pool de conexiones y reintentos) para las páginas /match/live-{id}."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+            adapter = HTTPAdapter(max_retries=retries, pool_connections=8, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
+            _http_session = session
+        return _http_session
+
+
+def _load_page(driver, url, deadline=None):
+    """driver.get con el timeout de carga recortado al presupuesto restante."""
+    driver.set_page_load_timeout(clamp_timeout(deadline, DRIVER_PAGE_LOAD_TIMEOUT, f"cargar {url}"))
+    driver.get(url)
+
+
+def crear_driver_chrome():
+    """Chrome headless con la configuración del scraper de estudio."""
+    options = ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36")
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    return webdriver.Chrome(options=options)
 PLACEHOLDER_NODATA = "*(No disponible)*"
 
 def parse_ah_to_number_of(ah_line_str: str):
@@ -511,19 +561,36 @@ def _colorear_stats(val1_str, val2_str):
         # Si no se pueden convertir a números (ej. texto), devolver los originales
         return val1_str, val2_str
 
-def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
+def _stats_rows_to_df(table_rows) -> pd.DataFrame:
+    df = pd.DataFrame(table_rows)
+    return df.set_index("Estadistica_EN") if not df.empty else df
+
+def get_match_progression_stats_data(match_id: str, finished: bool = False, offline: bool | None = None,
+                                     deadline: Deadline | None = None) -> pd.DataFrame | None:
+    """
+    Estadísticas de progresión de un partido. Se leen a través de la cache persistente:
+    con `finished=True` la entrada es permanente; si no, caduca a los pocos minutos.
+    En modo offline la página /match/live-{id} se lee del archivo de páginas.
+    Con `deadline` la descarga no espera más que el presupuesto restante.
+    """
     if not match_id or not match_id.isdigit(): return None
+    offline = ANALYSIS_OFFLINE if offline is None else offline
+    stats_cache = get_stats_cache()
+    cached_rows = stats_cache.get(match_id)
+    if cached_rows is not None:
+        return _stats_rows_to_df(cached_rows)
     url = f"{BASE_URL_OF}/match/live-{match_id}"
     try:
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        session.mount("https://", adapter)
-        session.mount("http://", adapter)
-        session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
-        response = session.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+        if offline:
+            html = archived_html(url)
+            if not html:
+                return None
+        else:
+            response = _get_shared_http_session().get(url, timeout=clamp_timeout(deadline, 10, f"descargar {url}"))
+            response.raise_for_status()
+            html = response.text
+            archive_page(url, html, VARIANT_RAW)
+        soup = BeautifulSoup(html, 'lxml')
         
         # Definir el orden específico de las estadísticas (sin Yellow Cards)
         stat_order = ["Corners", "Shots", "Shots on Goal", "Attacks", "Dangerous Attacks", "Red Cards"]
@@ -537,6 +604,8 @@ def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
                     if len(values) == 2:
                         home_val, away_val = _colorear_stats(values[0], values[1])
                         stat_titles[stat_title] = {"Home": home_val, "Away": away_val}
+        # Sin ninguna estadística de la tabla (página bloqueada o aún sin publicar) no se cachea como permanente
+        has_tech_stats = any(isinstance(vals, dict) for vals in stat_titles.values())
         
         # Si no encontramos las tarjetas rojas en la sección principal, las buscamos en la sección de eventos
         if stat_titles["Red Cards"] == "-":
@@ -571,8 +640,9 @@ def get_match_progression_stats_data(match_id: str) -> pd.DataFrame | None:
                     "Fuera": vals.get('Away', '-')
                 })
         
-        df = pd.DataFrame(table_rows)
-        return df.set_index("Estadistica_EN") if not df.empty else df
+        if not offline:
+            stats_cache.put(match_id, table_rows, finished=finished and has_tech_stats)
+        return _stats_rows_to_df(table_rows)
     except requests.RequestException:
         return None
 
@@ -598,21 +668,39 @@ def get_rival_b_for_original_h2h_of(soup, league_id=None):
                 return key_id, rival_id_match.group(1), rival_tag.text.strip()
     return None, None, None
 
-def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B"):
-    if not all([driver, key_match_id, rival_a_id, rival_b_id]):
+def get_h2h_details_for_original_logic_of(driver, key_match_id, rival_a_id, rival_b_id, rival_a_name="Rival A", rival_b_name="Rival B",
+                                          deadline=None):
+    """
+    Con `driver=None` (modo offline) la página h2h del partido clave se lee del archivo de páginas.
+    Con `deadline` las esperas de Selenium se recortan y, si se agota, lanza DeadlineExceeded.
+    """
+    if not all([key_match_id, rival_a_id, rival_b_id]):
         return {"status": "error", "resultado": "N/A (Datos incompletos para H2H)"}
     url = f"{BASE_URL_OF}/match/h2h-{key_match_id}"
-    try:
-        driver.get(url)
-        WebDriverWait(driver, SELENIUM_TIMEOUT_SECONDS_OF).until(EC.presence_of_element_located((By.ID, "table_v2")))
+    # Página reciente del archivo (p.ej. otro partido del mismo lote con el mismo partido clave)
+    html = archived_html(url, VARIANT_RENDERED, max_age=None if driver is None else H2H_KEY_PAGE_MAX_AGE)
+    if html:
+        soup = BeautifulSoup(html, "lxml")
+    elif driver is None:
+        return {"status": "error", "resultado": "N/A (Página H2H Col3 no archivada)"}
+    else:
         try:
-            select = Select(WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "hSelect_2"))))
-            select.select_by_value("8")
-            time.sleep(0.5)
-        except TimeoutException: pass
-        soup = BeautifulSoup(driver.page_source, "lxml")
-    except Exception as e:
-        return {"status": "error", "resultado": f"N/A (Error Selenium en H2H Col3: {type(e).__name__})"}
+            _load_page(driver, url, deadline)
+            WebDriverWait(driver, clamp_timeout(deadline, SELENIUM_TIMEOUT_SECONDS_OF)).until(EC.presence_of_element_located((By.ID, "table_v2")))
+            try:
+                select = Select(WebDriverWait(driver, clamp_timeout(deadline, 5)).until(EC.presence_of_element_located((By.ID, "hSelect_2"))))
+                select.select_by_value("8")
+                time.sleep(0.5)
+            except TimeoutException: pass
+            html = driver.page_source
+            archive_page(url, html, VARIANT_RENDERED)
+            soup = BeautifulSoup(html, "lxml")
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded(f"Tiempo agotado en la página H2H Col3 ({type(e).__name__}).") from e
+            return {"status": "error", "resultado": f"N/A (Error Selenium en H2H Col3: {type(e).__name__})"}
     if not (table := soup.find("table", id="table_v2")):
         return {"status": "error", "resultado": "N/A (Tabla H2H Col3 no encontrada)"}
     for row in table.find_all("tr", id=re.compile(r"tr2_\d+")):
@@ -1017,39 +1105,198 @@ def extract_indirect_comparison_data(soup):
 
 # --- FUNCIÓN PRINCIPAL DE EXTRACCIÓN ---
 
-def obtener_datos_completos_partido(match_id: str):
+def _stats_for(details, offline, deadline, id_key='match_id'):
+    """Etapa de red: estadísticas de progresión del partido histórico (ya jugado: cache permanente)."""
+    stats_match_id = (details or {}).get(id_key)
+    if not stats_match_id:
+        return None
+    return get_match_progression_stats_data(stats_match_id, True, offline, deadline)
+
+
+def _rivals_for_h2h_col3(soup, league_id):
+    key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup, league_id)
+    _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup, league_id)
+    return key_id_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name
+
+
+def _h2h_col3_details(driver, rivals, deadline):
+    # Usa el driver principal (o el archivo de páginas en modo offline)
+    return get_h2h_details_for_original_logic_of(driver, *rivals, deadline=deadline)
+
+
+def _comparacion_lineas(soup, team_name, current_ah_line, is_home):
+    if current_ah_line is None:
+        return STAGE_SKIPPED
+    return comparar_lineas_handicap_recientes(soup, team_name, current_ah_line, is_home)
+
+
+def _contra_rival_del_rival(soup, home_name, away_name, last_home_match, last_away_match):
+    rival_local_rival = (last_away_match or {}).get('home_team', 'N/A')
+    rival_visitante_rival = (last_home_match or {}).get('away_team', 'N/A')
+    if rival_local_rival == 'N/A' or rival_visitante_rival == 'N/A':
+        return STAGE_SKIPPED
+    return analizar_contra_rival_del_rival(soup, home_name, away_name, rival_local_rival, rival_visitante_rival)
+
+
+def _main_match_odds(main_match_odds_data):
+    return {
+        "ah_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')),
+        "goals_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?'))
+    }
+
+
+# Grafo de etapas del análisis completo. Entradas iniciales: soup, driver, offline,
+# deadline, home_name, away_name y league_id (de la página principal). Los nombres sin prefijo '_' son
+# claves finales de `datos`.
+ANALYSIS_GRAPH = StageGraph([
+    # --- Parseo de la página principal ---
+    Stage('home_standings', extract_standings_data_from_h2h_page_of, ('soup', 'home_name')),
+    Stage('away_standings', extract_standings_data_from_h2h_page_of, ('soup', 'away_name')),
+    Stage('home_ou_stats', lambda soup: extract_over_under_stats_from_div_of(soup, 'home'), ('soup',)),
+    Stage('away_ou_stats', lambda soup: extract_over_under_stats_from_div_of(soup, 'away'), ('soup',)),
+    Stage('main_match_odds_data', extract_bet365_initial_odds_of, ('soup',)),
+    Stage('h2h_data', lambda soup, home, away: extract_h2h_data_of(soup, home, away, None), ('soup', 'home_name', 'away_name')),
+    Stage('same_handicap_summary', extract_same_handicap_summary_of, ('soup', 'home_name', 'away_name')),
+    Stage('_last_home', lambda soup, home, league_id: extract_last_match_in_league_of(soup, "table_v1", home, league_id, True),
+          ('soup', 'home_name', 'league_id')),
+    Stage('_last_away', lambda soup, away, league_id: extract_last_match_in_league_of(soup, "table_v2", away, league_id, False),
+          ('soup', 'away_name', 'league_id')),
+    Stage('_h2h_col3_rivals', _rivals_for_h2h_col3, ('soup', 'league_id')),
+    Stage('_indirect_comparison', extract_indirect_comparison_data, ('soup',)),
+    # --- Comparativas (dependen del último partido del rival) ---
+    Stage('_comp_L_vs_UV_A', lambda soup, home, last_away, league_id: extract_comparative_match_of(
+        soup, "table_v1", home, (last_away or {}).get('home_team'), league_id, True), ('soup', 'home_name', '_last_away', 'league_id')),
+    Stage('_comp_V_vs_UL_H', lambda soup, away, last_home, league_id: extract_comparative_match_of(
+        soup, "table_v2", away, (last_home or {}).get('away_team'), league_id, False), ('soup', 'away_name', '_last_home', 'league_id')),
+    # --- Red: página H2H Col3 y estadísticas de progresión, en cuanto se conoce su ID ---
+    Stage('_h2h_col3', _h2h_col3_details, ('driver', '_h2h_col3_rivals', 'deadline')),
+    Stage('_stats_last_home', _stats_for, ('_last_home', 'offline', 'deadline')),
+    Stage('_stats_last_away', _stats_for, ('_last_away', 'offline', 'deadline')),
+    Stage('_stats_h2h_col3', _stats_for, ('_h2h_col3', 'offline', 'deadline')),
+    Stage('_stats_comp_L_vs_UV_A', _stats_for, ('_comp_L_vs_UV_A', 'offline', 'deadline')),
+    Stage('_stats_comp_V_vs_UL_H', _stats_for, ('_comp_V_vs_UL_H', 'offline', 'deadline')),
+    Stage('_stats_h2h_stadium', lambda h2h_data, offline, deadline: _stats_for(h2h_data, offline, deadline, 'match1_id'),
+          ('h2h_data', 'offline', 'deadline')),
+    Stage('_stats_h2h_general', lambda h2h_data, offline, deadline: _stats_for(h2h_data, offline, deadline, 'match6_id'),
+          ('h2h_data', 'offline', 'deadline')),
+    # --- Mercado ---
+    Stage('main_match_odds', _main_match_odds, ('main_match_odds_data',)),
+    Stage('market_analysis_html', generar_analisis_completo_mercado,
+          ('main_match_odds_data', 'h2h_data', 'home_name', 'away_name', 'same_handicap_summary')),
+    Stage('_current_ah_line', lambda odds: parse_ah_to_number_of(odds.get('ah_linea_raw', '0')), ('main_match_odds_data',)),
+    # --- Módulos de análisis ---
+    Stage('advanced_analysis_html', generar_analisis_comparativas_indirectas, ('_indirect_comparison',)),
+    Stage('rendimiento_local_handicap', lambda soup, home: analizar_rendimiento_reciente_con_handicap(soup, home, True),
+          ('soup', 'home_name')),
+    Stage('rendimiento_visitante_handicap', lambda soup, away: analizar_rendimiento_reciente_con_handicap(soup, away, False),
+          ('soup', 'away_name')),
+    Stage('comparacion_lineas_local', lambda soup, home, line: _comparacion_lineas(soup, home, line, True),
+          ('soup', 'home_name', '_current_ah_line')),
+    Stage('comparacion_lineas_visitante', lambda soup, away, line: _comparacion_lineas(soup, away, line, False),
+          ('soup', 'away_name', '_current_ah_line')),
+    Stage('rivales_comunes', analizar_rivales_comunes, ('soup', 'home_name', 'away_name')),
+    Stage('analisis_contra_rival_del_rival', _contra_rival_del_rival,
+          ('soup', 'home_name', 'away_name', '_last_home', '_last_away')),
+    Stage('resumen_rendimiento_reciente', generar_resumen_rendimiento_reciente,
+          ('soup', 'home_name', 'away_name', '_current_ah_line')),
+])
+
+# Secciones de partidos históricos de `datos`: clave -> (etapa de detalles, etapa de estadísticas)
+_HISTORICAL_STAGES = {
+    'last_home_match': ('_last_home', '_stats_last_home'),
+    'last_away_match': ('_last_away', '_stats_last_away'),
+    'h2h_col3': ('_h2h_col3', '_stats_h2h_col3'),
+    'comp_L_vs_UV_A': ('_comp_L_vs_UV_A', '_stats_comp_L_vs_UV_A'),
+    'comp_V_vs_UL_H': ('_comp_V_vs_UL_H', '_stats_comp_V_vs_UL_H'),
+    'h2h_stadium': ('h2h_data', '_stats_h2h_stadium'),
+    'h2h_general': ('h2h_data', '_stats_h2h_general'),
+}
+_HISTORICAL_BY_STATS_STAGE = {stats: key for key, (_, stats) in _HISTORICAL_STAGES.items()}
+ANALYSIS_GRAPH_WORKERS = int(os.environ.get('ANALYSIS_GRAPH_WORKERS', 8))
+
+
+def _mark_partial_result(datos, graph_run):
+    """Marca un resultado cortado por el presupuesto: secciones que faltan y partidos sin estadísticas."""
+    missing = [stage for stage in graph_run.timed_out + graph_run.missing if not stage.startswith('_')]
+    for key, (details_stage, _) in _HISTORICAL_STAGES.items():
+        if key in datos:
+            continue
+        if details_stage in graph_run.values:
+            datos[key] = {'details': graph_run.values[details_stage], 'stats': None, 'stats_timed_out': True}
+        else:
+            missing.append(key)
+    datos['timed_out'] = True
+    datos['missing'] = sorted(missing)
+
+
+def _notify_progress(on_progress, stage, datos):
+    """Avisa al consumidor de `on_progress`; un fallo suyo nunca interrumpe el scraping."""
+    if on_progress is None:
+        return
+    try:
+        on_progress(stage, datos)
+    except Exception as exc:
+        print(f"Error en el aviso de progreso '{stage}': {exc}")
+
+
+def obtener_datos_completos_partido(match_id: str, offline: bool | None = None, driver=None, on_progress=None,
+                                    deadline: Deadline | None = None):
     """
     Función principal que orquesta todo el scraping y análisis para un ID de partido.
     Devuelve un diccionario con todos los datos necesarios para la plantilla HTML.
+    Con `offline=True` (o ANALYSIS_OFFLINE=1) no se abre navegador: todas las páginas
+    se leen del archivo de páginas, lo que permite recalcular tras cambiar la lógica.
+    Si se pasa `driver` (p.ej. de un lote) se reutiliza y no se cierra al terminar.
+    `on_progress(etapa, datos)` se llama según se completan las secciones
+    ('header', 'odds' y cada partido histórico con sus estadísticas) con el
+    diccionario parcial; lo usa el streaming SSE de /api/analisis.
+    Tras la página principal el resto se ejecuta con ANALYSIS_GRAPH y los tiempos
+    de cada etapa quedan en datos['stage_timings'].
+    Todo el trabajo comparte `deadline` (por defecto ANALYSIS_DEADLINE_SECONDS). Si se
+    agota tras cargar la página principal se devuelve lo ya calculado con
+    datos['timed_out'] = True y datos['missing'] = secciones que faltan; un partido
+    histórico sin estadísticas a tiempo se empaqueta con 'stats_timed_out': True.
     """
     if not match_id or not match_id.isdigit():
-        return {"error": "ID de partido inválido."}
+        return {"error": INVALID_ID_MESSAGE, "error_class": ERROR_INVALID_ID}
+    offline = ANALYSIS_OFFLINE if offline is None else offline
+    if deadline is None and ANALYSIS_DEADLINE_SECONDS > 0:
+        deadline = Deadline(ANALYSIS_DEADLINE_SECONDS)
 
-    # --- Inicialización de Selenium ---
-    options = ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36")
-    options.add_argument('--blink-settings=imagesEnabled=false')
-    driver = webdriver.Chrome(options=options)
-    
     main_page_url = f"{BASE_URL_OF}/match/h2h-{match_id}"
     datos = {"match_id": match_id}
+    owns_driver = driver is None and not offline
+    if offline:
+        driver = None
 
     try:
-        # --- Carga y Parseo de la Página Principal ---
-        driver.get(main_page_url)
-        WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, "table_v1")))
-        for select_id in ["hSelect_1", "hSelect_2", "hSelect_3"]:
-            try:
-                Select(WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.ID, select_id)))).select_by_value("8")
-                # Usamos una espera explícita más eficiente en lugar de time.sleep
-                WebDriverWait(driver, 1).until(EC.text_to_be_present_in_element((By.ID, select_id), "8"))
-            except TimeoutException:
-                continue
-        soup_completo = BeautifulSoup(driver.page_source, "lxml")
+        if offline:
+            # --- Página principal desde el archivo ---
+            html_completo = archived_html(main_page_url, VARIANT_RENDERED)
+            if not html_completo:
+                return {"error": f"La página del partido {match_id} no está en el archivo (modo offline)."}
+        else:
+            # --- Inicialización de Selenium ---
+            if driver is None:
+                driver = crear_driver_chrome()
+
+            # --- Carga y Parseo de la Página Principal ---
+            _load_page(driver, main_page_url, deadline)
+            WebDriverWait(driver, clamp_timeout(deadline, 15)).until(EC.presence_of_element_located((By.ID, "table_v1")))
+            for select_id in ["hSelect_1", "hSelect_2", "hSelect_3"]:
+                if deadline is not None and deadline.expired():
+                    # Sin presupuesto para los filtros: se parsea la página tal cual está
+                    break
+                try:
+                    Select(WebDriverWait(driver, clamp_timeout(deadline, 3)).until(EC.presence_of_element_located((By.ID, select_id)))).select_by_value("8")
+                    # Usamos una espera explícita más eficiente en lugar de time.sleep
+                    WebDriverWait(driver, clamp_timeout(deadline, 1)).until(EC.text_to_be_present_in_element((By.ID, select_id), "8"))
+                except (TimeoutException, DeadlineExceeded):
+                    continue
+            html_completo = driver.page_source
+            # Se archiva el DOM tras seleccionar los filtros: es lo que parsean los extractores
+            archive_page(main_page_url, html_completo, VARIANT_RENDERED)
+        soup_completo = BeautifulSoup(html_completo, "lxml")
         datos['final_score'] = extract_final_score_of(soup_completo)
 
         # --- Extracción de Datos Primarios ---
@@ -1064,148 +1311,65 @@ def obtener_datos_completos_partido(match_id: str):
             "match_time": dt_info.get("match_time"),
             "match_datetime": dt_info.get("match_datetime"),
         })
-
-        # --- Recopilación de todos los datos en paralelo (donde sea posible) ---
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            # Tareas síncronas (dependen del soup_completo)
-            future_home_standings = executor.submit(extract_standings_data_from_h2h_page_of, soup_completo, home_name)
-            future_away_standings = executor.submit(extract_standings_data_from_h2h_page_of, soup_completo, away_name)
-            future_home_ou = executor.submit(extract_over_under_stats_from_div_of, soup_completo, 'home')
-            future_away_ou = executor.submit(extract_over_under_stats_from_div_of, soup_completo, 'away')
-            future_main_odds = executor.submit(extract_bet365_initial_odds_of, soup_completo)
-            future_h2h_data = executor.submit(extract_h2h_data_of, soup_completo, home_name, away_name, None)
-            future_last_home = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v1", home_name, league_id, True)
-            future_last_away = executor.submit(extract_last_match_in_league_of, soup_completo, "table_v2", away_name, league_id, False)
-            future_same_handicap = executor.submit(extract_same_handicap_summary_of, soup_completo, home_name, away_name)
-            
-            # Tarea H2H Col3 (requiere una nueva llamada de Selenium)
-            key_id_a, rival_a_id, rival_a_name = get_rival_a_for_original_h2h_of(soup_completo, league_id)
-            _, rival_b_id, rival_b_name = get_rival_b_for_original_h2h_of(soup_completo, league_id)
-            # Usar el driver principal ya creado en lugar de crear uno nuevo
-            future_h2h_col3 = executor.submit(get_h2h_details_for_original_logic_of, driver, key_id_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
-            
-            # Obtener resultados
-            datos["home_standings"] = future_home_standings.result()
-            datos["away_standings"] = future_away_standings.result()
-            datos["home_ou_stats"] = future_home_ou.result()
-            datos["away_ou_stats"] = future_away_ou.result()
-            main_match_odds_data = future_main_odds.result()
-            h2h_data = future_h2h_data.result()
-            datos["main_match_odds_data"] = main_match_odds_data
-            datos["h2h_data"] = h2h_data
-            last_home_match = future_last_home.result()
-            last_away_match = future_last_away.result()
-            details_h2h_col3 = future_h2h_col3.result()
-            datos["same_handicap_summary"] = future_same_handicap.result()
-
-            # --- Comparativas (dependen de los resultados anteriores) ---
-            comp_L_vs_UV_A = extract_comparative_match_of(soup_completo, "table_v1", home_name, (last_away_match or {}).get('home_team'), league_id, True)
-            comp_V_vs_UL_H = extract_comparative_match_of(soup_completo, "table_v2", away_name, (last_home_match or {}).get('away_team'), league_id, False)
-
-            # --- Generar Análisis de Mercado ---
-            datos["market_analysis_html"] = generar_analisis_completo_mercado(main_match_odds_data, h2h_data, home_name, away_name, datos.get("same_handicap_summary"))
-
-            # --- Estructurar datos para la plantilla ---
-            datos["main_match_odds"] = {
-                "ah_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('ah_linea_raw', '?')),
-                "goals_linea": format_ah_as_decimal_string_of(main_match_odds_data.get('goals_linea_raw', '?'))
-            }
-            
-            # Recopilar todos los IDs de partidos históricos para obtener sus estadísticas de progresión
-            match_ids_to_fetch_stats = {
-                'last_home': (last_home_match or {}).get('match_id'),
-                'last_away': (last_away_match or {}).get('match_id'),
-                'h2h_col3': (details_h2h_col3 or {}).get('match_id'),
-                'comp_L_vs_UV_A': (comp_L_vs_UV_A or {}).get('match_id'),
-                'comp_V_vs_UL_H': (comp_V_vs_UL_H or {}).get('match_id'),
-                'h2h_stadium': h2h_data.get('match1_id'),
-                'h2h_general': h2h_data.get('match6_id')
-            }
-            
-            # Obtener estadísticas de progresión en paralelo
-            stats_futures = {key: executor.submit(get_match_progression_stats_data, match_id)
-                             for key, match_id in match_ids_to_fetch_stats.items() if match_id}
-                             
-            stats_results = {key: future.result() for key, future in stats_futures.items()}
-
-            # Empaquetar todo en el diccionario de datos final
-            datos['last_home_match'] = {'details': last_home_match, 'stats': stats_results.get('last_home')}
-            datos['last_away_match'] = {'details': last_away_match, 'stats': stats_results.get('last_away')}
-            datos['h2h_col3'] = {'details': details_h2h_col3, 'stats': stats_results.get('h2h_col3')}
-            datos['comp_L_vs_UV_A'] = {'details': comp_L_vs_UV_A, 'stats': stats_results.get('comp_L_vs_UV_A')}
-            datos['comp_V_vs_UL_H'] = {'details': comp_V_vs_UL_H, 'stats': stats_results.get('comp_V_vs_UL_H')}
-            datos['h2h_stadium'] = {'details': h2h_data, 'stats': stats_results.get('h2h_stadium')}
-            datos['h2h_general'] = {'details': h2h_data, 'stats': stats_results.get('h2h_general')}
-
-            # --- ANÁLISIS AVANZADO DE COMPARATIVAS INDIRECTAS ---
-            # Extraer los datos de las comparativas indirectas
-            indirect_comparison_data = extract_indirect_comparison_data(soup_completo)
-            
-            # Generar la nota de análisis
-            datos["advanced_analysis_html"] = generar_analisis_comparativas_indirectas(indirect_comparison_data)
-            
-            # --- ANÁLISIS RECIENTE CON HANDICAP ---
-            # Obtener la línea de handicap actual
-            current_ah_line = parse_ah_to_number_of(main_match_odds_data.get('ah_linea_raw', '0'))
-            
-            # Analizar rendimiento reciente con handicap para equipo local
-            rendimiento_local = analizar_rendimiento_reciente_con_handicap(soup_completo, home_name, True)
-            datos["rendimiento_local_handicap"] = rendimiento_local
-            
-            # Analizar rendimiento reciente con handicap para equipo visitante
-            rendimiento_visitante = analizar_rendimiento_reciente_con_handicap(soup_completo, away_name, False)
-            datos["rendimiento_visitante_handicap"] = rendimiento_visitante
-            
-            # Comparar líneas de handicap recientes con la línea actual
-            if current_ah_line is not None:
-                comparacion_local = comparar_lineas_handicap_recientes(soup_completo, home_name, current_ah_line, True)
-                datos["comparacion_lineas_local"] = comparacion_local
-                
-                comparacion_visitante = comparar_lineas_handicap_recientes(soup_completo, away_name, current_ah_line, False)
-                datos["comparacion_lineas_visitante"] = comparacion_visitante
-            
-            # --- ANÁLISIS DE RIVALES COMUNES ---
-            rivales_comunes = analizar_rivales_comunes(soup_completo, home_name, away_name)
-            datos["rivales_comunes"] = rivales_comunes
-            
-            # --- ANÁLISIS CONTRA RIVAL DEL RIVAL ---
-            # Obtener información de los rivales de los rivales
-            rival_local_rival = (last_away_match or {}).get('home_team', 'N/A')
-            rival_visitante_rival = (last_home_match or {}).get('away_team', 'N/A')
-            
-            if rival_local_rival != 'N/A' and rival_visitante_rival != 'N/A':
-                analisis_contra_rival = analizar_contra_rival_del_rival(
-                    soup_completo, home_name, away_name, rival_local_rival, rival_visitante_rival
-                )
-                datos["analisis_contra_rival_del_rival"] = analisis_contra_rival
-            
-            # --- ANÁLISIS DE RENDIMIENTO RECIENTE Y COMPARATIVAS INDIRECTAS ---
-            # Generar resumen gráfico de rendimiento reciente y comparativas indirectas
-            resumen_rendimiento = generar_resumen_rendimiento_reciente(soup_completo, home_name, away_name, current_ah_line)
-            datos["resumen_rendimiento_reciente"] = resumen_rendimiento
-            
-            # --- FUNCIONES AUXILIARES PARA LA PLANTILLA ---
-            # Añadir funciones auxiliares para el análisis gráfico
-            from modules.funciones_auxiliares import (
-                _calcular_estadisticas_contra_rival, 
-                _analizar_over_under, 
-                _analizar_ah_cubierto, 
-                _analizar_desempeno_casa_fuera,
-                _contar_victorias_h2h,
-                _analizar_over_under_h2h,
-                _contar_over_h2h,
-                _contar_victorias_h2h_general
-            )
-            
-            datos["_calcular_estadisticas_contra_rival"] = _calcular_estadisticas_contra_rival
-            datos["_analizar_over_under"] = _analizar_over_under
-            datos["_analizar_ah_cubierto"] = _analizar_ah_cubierto
-            datos["_analizar_desempeno_casa_fuera"] = _analizar_desempeno_casa_fuera
-            datos["_contar_victorias_h2h"] = _contar_victorias_h2h
-            datos["_analizar_over_under_h2h"] = _analizar_over_under_h2h
-            datos["_contar_over_h2h"] = _contar_over_h2h
-            datos["_contar_victorias_h2h_general"] = _contar_victorias_h2h_general
+        _notify_progress(on_progress, 'header', datos)
+
+        # --- Resto del análisis: grafo de etapas (cada una arranca en cuanto tiene sus entradas) ---
+        notified_odds = False
+
+        def _on_stage_done(stage, value, values):
+            nonlocal notified_odds
+            if not stage.startswith('_') and value is not STAGE_SKIPPED:
+                datos[stage] = value
+            historical_key = _HISTORICAL_BY_STATS_STAGE.get(stage)
+            if historical_key is not None:
+                # Cada partido histórico se empaqueta (y se avisa) en cuanto llegan sus estadísticas
+                datos[historical_key] = {'details': values[_HISTORICAL_STAGES[historical_key][0]], 'stats': value}
+                _notify_progress(on_progress, historical_key, datos)
+            if not notified_odds and all(key in datos for key in ('main_match_odds', 'h2h_data')):
+                notified_odds = True
+                _notify_progress(on_progress, 'odds', datos)
+
+        initial = {'soup': soup_completo, 'driver': driver, 'offline': offline, 'deadline': deadline,
+                   'home_name': home_name, 'away_name': away_name, 'league_id': league_id}
+        executor = ThreadPoolExecutor(max_workers=ANALYSIS_GRAPH_WORKERS)
+        graph_run = None
+        try:
+            graph_run = ANALYSIS_GRAPH.run(initial, executor, on_stage_done=_on_stage_done, deadline=deadline)
+        finally:
+            # Tras agotar el presupuesto no se esperan las etapas en marcha (sus esperas ya están
+            # recortadas), salvo la que usa el driver: no puede seguir usándolo quien lo reciba después
+            driver_busy = graph_run is not None and driver is not None and '_h2h_col3' in graph_run.timed_out
+            executor.shutdown(wait=graph_run is None or driver_busy, cancel_futures=True)
+        datos['stage_timings'] = graph_run.timings
+        slowest = ', '.join(f"{name} {timing['elapsed_ms']:.0f}ms" for name, timing in graph_run.slowest())
+        print(f"[ETAPAS] Partido {match_id}: grafo en {graph_run.elapsed_ms:.0f}ms; más lentas: {slowest}")
+        if not graph_run.complete:
+            _mark_partial_result(datos, graph_run)
+            print(f"[ETAPAS] Partido {match_id}: presupuesto agotado; faltan {', '.join(datos['missing']) or 'solo estadísticas'}")
+
+        # --- FUNCIONES AUXILIARES PARA LA PLANTILLA ---
+        # Añadir funciones auxiliares para el análisis gráfico
+        from modules.funciones_auxiliares import (
+            _calcular_estadisticas_contra_rival, 
+            _analizar_over_under, 
+            _analizar_ah_cubierto, 
+            _analizar_desempeno_casa_fuera,
+            _contar_victorias_h2h,
+            _analizar_over_under_h2h,
+            _contar_over_h2h,
+            _contar_victorias_h2h_general
+        )
         
+        datos["_calcular_estadisticas_contra_rival"] = _calcular_estadisticas_contra_rival
+        datos["_analizar_over_under"] = _analizar_over_under
+        datos["_analizar_ah_cubierto"] = _analizar_ah_cubierto
+        datos["_analizar_desempeno_casa_fuera"] = _analizar_desempeno_casa_fuera
+        datos["_contar_victorias_h2h"] = _contar_victorias_h2h
+        datos["_analizar_over_under_h2h"] = _analizar_over_under_h2h
+        datos["_contar_over_h2h"] = _contar_over_h2h
+        datos["_contar_victorias_h2h_general"] = _contar_victorias_h2h_general
+        
+
         return datos
 
     except Exception as e:
@@ -1213,7 +1377,7 @@ def obtener_datos_completos_partido(match_id: str):
         return {"error": f"Error durante el scraping: {e}"}
     finally:
         # Asegurar que el driver se cierra correctamente incluso si ocurre un error
-        if 'driver' in locals():
+        if owns_driver and driver is not None:
             try:
                 driver.quit()
             except:
@@ -1230,7 +1394,7 @@ def obtener_datos_preview_rapido(match_id: str):
     Usa 'requests' para ser extremadamente rápido y evitar Selenium.
     """
     if not match_id or not match_id.isdigit():
-        return {"error": "ID de partido inválido."}
+        return {"error": INVALID_ID_MESSAGE, "error_class": ERROR_INVALID_ID}
 
     url = f"{BASE_URL_OF}/match/h2h-{match_id}"
     try:
@@ -1375,7 +1539,7 @@ def obtener_datos_preview_rapido(match_id: str):
         try:
             # Último del local en liga
             last_home = extract_last_match_in_league_of(soup, "table_v1", home_name, league_id, True)
-            last_home_stats = get_match_progression_stats_data(str(last_home.get('match_id'))) if last_home and last_home.get('match_id') else None
+            last_home_stats = get_match_progression_stats_data(str(last_home.get('match_id')), finished=True) if last_home and last_home.get('match_id') else None
             def _df_to_rows(df):
                 rows = []
                 try:
@@ -1398,7 +1562,7 @@ def obtener_datos_preview_rapido(match_id: str):
                 }
             # Último del visitante en liga
             last_away = extract_last_match_in_league_of(soup, "table_v2", away_name, league_id, False)
-            last_away_stats = get_match_progression_stats_data(str(last_away.get('match_id'))) if last_away and last_away.get('match_id') else None
+            last_away_stats = get_match_progression_stats_data(str(last_away.get('match_id')), finished=True) if last_away and last_away.get('match_id') else None
             if last_away:
                 recent_indirect["last_away"] = {
                     "home": last_away.get('home_team'),
@@ -1416,7 +1580,7 @@ def obtener_datos_preview_rapido(match_id: str):
                 col3 = get_h2h_details_for_original_logic_of(driver, key_id_a, rival_a_id, rival_b_id, rival_a_name, rival_b_name)
                 if col3 and col3.get('status') == 'found':
                     score_line = f"{col3.get('h2h_home_team_name')} {col3.get('goles_home')}:{col3.get('goles_away')} {col3.get('h2h_away_team_name')}"
-                    col3_stats = get_match_progression_stats_data(str(col3.get('match_id')))
+                    col3_stats = get_match_progression_stats_data(str(col3.get('match_id')), finished=True)
                     ah_raw = col3.get('handicap_line_raw') or col3.get('handicap') or '-'
                     if ah_raw is None or (isinstance(ah_raw, str) and not ah_raw.strip()):
                         ah_raw = '-'
@@ -1571,7 +1735,7 @@ def obtener_datos_preview_rapido(match_id: str):
         return result
 
     except requests.Timeout:
-        return {"error": "La fuente de datos (Nowgoal) tardó demasiado en responder."}
+        return {"error": "La fuente de datos (Nowgoal) tardó demasiado en responder.", "error_class": ERROR_TIMEOUT}
     except Exception as e:
         print(f"ERROR en scraper preview para {match_id}: {e}")
         return {"error": f"No se pudieron obtener los datos de la vista previa: {type(e).__name__}"}
@@ -1590,7 +1754,7 @@ def obtener_datos_preview_ligero(match_id: str):
     Devuelve el mismo esquema que la versión 'rápida' con Selenium, pero sin abrir navegador.
     """
     if not match_id or not match_id.isdigit():
-        return {"error": "ID de partido inválido."}
+        return {"error": INVALID_ID_MESSAGE, "error_class": ERROR_INVALID_ID}
 
     url = f"{BASE_URL_OF}/match/h2h-{match_id}"
     try:
@@ -1598,6 +1762,7 @@ def obtener_datos_preview_ligero(match_id: str):
         session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/116.0.0.0 Safari/537.36"})
         response = session.get(url, timeout=5)
         response.raise_for_status()
+        archive_page(url, response.text, VARIANT_RAW)
         soup = BeautifulSoup(response.text, 'lxml')
 
         # Equipos
@@ -1731,7 +1896,7 @@ def obtener_datos_preview_ligero(match_id: str):
                     pass
                 return rows
             if last_home:
-                lh_stats = get_match_progression_stats_data(str(last_home.get('match_id')))
+                lh_stats = get_match_progression_stats_data(str(last_home.get('match_id')), finished=True)
                 recent_indirect["last_home"] = {
                     "home": last_home.get('home_team'),
                     "away": last_home.get('away_team'),
@@ -1742,7 +1907,7 @@ def obtener_datos_preview_ligero(match_id: str):
                     "date": last_home.get('date')
                 }
             if last_away:
-                la_stats = get_match_progression_stats_data(str(last_away.get('match_id')))
+                la_stats = get_match_progression_stats_data(str(last_away.get('match_id')), finished=True)
                 recent_indirect["last_away"] = {
                     "home": last_away.get('home_team'),
                     "away": last_away.get('away_team'),
@@ -1788,7 +1953,7 @@ def obtener_datos_preview_ligero(match_id: str):
                                 ah_raw = (cell.get("data-o") or cell.text).strip() or "-"
                             match_id_col3 = row.get('index')
                             score_line = f"{links[0].text.strip()} {g_h}:{g_a} {links[1].text.strip()}"
-                            col3_stats = get_match_progression_stats_data(str(match_id_col3))
+                            col3_stats = get_match_progression_stats_data(str(match_id_col3), finished=True)
                             # Fecha si existe
                             date_txt = None
                             try:
@@ -1944,7 +2109,7 @@ def obtener_datos_preview_ligero(match_id: str):
         })
         return result
     except requests.Timeout:
-        return {"error": "La fuente de datos (Nowgoal) tardó demasiado en responder."}
+        return {"error": "La fuente de datos (Nowgoal) tardó demasiado en responder.", "error_class": ERROR_TIMEOUT}
     except Exception as e:
         print(f"ERROR en scraper preview ligero para {match_id}: {e}")
         return {"error": f"No se pudieron obtener los datos de la vista previa (ligera): {type(e).__name__}"}
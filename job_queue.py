@@ -0,0 +1,149 @@
+# job_queue.py - Cola acotada de trabajos de análisis en segundo plano
+"""
+Sustituye al `threading.Thread` por petición de `/start_analysis_background`:
+
+- Un pool fijo de workers (JOB_WORKERS) consume una cola con profundidad máxima
+  (JOB_QUEUE_MAX_DEPTH). Con la cola llena `submit()` lanza QueueFullError y la
+  ruta responde 429.
+- Un partido que ya está en cola o ejecutándose no se encola dos veces: se
+  devuelve el trabajo existente.
+- Los trabajos terminados se conservan un tiempo (JOB_HISTORY_SECONDS) para que
+  `/jobs/<id>` pueda consultar su estado.
+- Si el handler devuelve algo (un resultado parcial que no se guardó en cache),
+  el trabajo termina en estado `partial` y conserva ese resultado en `job.result`.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get('JOB_QUEUE_MAX_DEPTH', 32))
+JOB_HISTORY_SECONDS = int(os.environ.get('JOB_HISTORY_SECONDS', 3600))
+JOB_HISTORY_MAX = int(os.environ.get('JOB_HISTORY_MAX', 1000))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_PARTIAL = 'partial'
+STATUS_ERROR = 'error'
+_FINISHED_STATUSES = (STATUS_DONE, STATUS_PARTIAL, STATUS_ERROR)
+
+
+class QueueFullError(Exception):
+    """La cola de trabajos ha alcanzado su profundidad máxima."""
+
+
+class Job:
+    __slots__ = ('id', 'match_id', 'status', 'created_at', 'started_at', 'finished_at', 'error', 'result')
+
+    def __init__(self, match_id):
+        self.id = uuid.uuid4().hex
+        self.match_id = str(match_id)
+        self.status = STATUS_QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'match_id': self.match_id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """
+    `handler(match_id)` hace el trabajo; su resultado debe quedar en la cache de análisis.
+    Si no queda (resultado parcial), el handler lo devuelve y se guarda en el trabajo.
+    """
+
+    def __init__(self, handler, workers: int = JOB_WORKERS, max_depth: int = JOB_QUEUE_MAX_DEPTH):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_depth = max(1, int(max_depth))
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()  # job_id -> Job (activos y terminados recientes)
+        self._active_by_match = {}  # match_id -> Job en cola o ejecutándose
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        # Los hilos se arrancan en el primer submit (y no al importar la app)
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"analysis-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, match_id) -> tuple[Job, bool]:
+        """Encola un análisis. Devuelve (trabajo, creado); lanza QueueFullError si no cabe."""
+        match_id = str(match_id)
+        with self._lock:
+            existing = self._active_by_match.get(match_id)
+            if existing is not None:
+                return existing, False
+            if self._queued >= self.max_depth:
+                raise QueueFullError(f"Cola de análisis llena ({self.max_depth} trabajos en espera).")
+            job = Job(match_id)
+            self._jobs[job.id] = job
+            self._active_by_match[match_id] = job
+            self._queued += 1
+            self._ensure_workers()
+            self._prune_locked()
+        self._queue.put(job)
+        return job, True
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(1 for job in self._active_by_match.values() if job.status == STATUS_RUNNING)
+            return {'queued': self._queued, 'running': running, 'workers': self.workers, 'max_depth': self.max_depth}
+
+    def _prune_locked(self):
+        cutoff = time.time() - JOB_HISTORY_SECONDS
+        finished = [job for job in self._jobs.values() if job.status in _FINISHED_STATUSES]
+        excess = len(self._jobs) - JOB_HISTORY_MAX
+        # _jobs está en orden de creación: se descartan primero los terminados más antiguos
+        for job in finished:
+            if job.finished_at < cutoff or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._queued -= 1
+                job.status = STATUS_RUNNING
+                job.started_at = time.time()
+            print(f"Iniciando análisis en segundo plano para el ID: {job.match_id} (trabajo {job.id})")
+            result = None
+            try:
+                result = self.handler(job.match_id)
+                status, error = (STATUS_DONE if result is None else STATUS_PARTIAL), None
+                print(f"Análisis en segundo plano finalizado para el ID: {job.match_id}")
+            except Exception as exc:
+                status, error = STATUS_ERROR, str(exc) or type(exc).__name__
+                print(f"Error en el trabajo de análisis para el ID {job.match_id}: {exc}")
+            with self._lock:
+                job.status = status
+                job.error = error
+                job.result = result
+                job.finished_at = time.time()
+                self._active_by_match.pop(job.match_id, None)
+            self._queue.task_done()
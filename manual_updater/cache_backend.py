@@ -0,0 +1,368 @@
+# cache_backend.py - Backend de cache intercambiable (memoria, disco o servidor Redis)
+"""
+Abstracción común para las caches compartidas entre workers de gunicorn o entre
+máquinas. Cada consumidor (páginas, estadísticas, vistas previas, análisis) usa
+su propio espacio de nombres con TTL por defecto y formato de serialización.
+
+Backends (CACHE_BACKEND):
+    disk    (por defecto) cada espacio de nombres usa su DiskCache local de siempre
+    memory  diccionario LRU en el proceso (útil en desarrollo y pruebas)
+    redis   cualquier servidor que hable el protocolo RESP de Redis (CACHE_BACKEND_URL,
+            p.ej. redis://:clave@host:6379/0). No requiere el paquete `redis`.
+
+Para probar el backend redis en local sin instalar Redis:
+    python cache_backend.py serve --port 6380
+    CACHE_BACKEND=redis CACHE_BACKEND_URL=redis://127.0.0.1:6380/0 python app.py
+"""
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+
+from serializers import DECODE_ERRORS, dumps, loads, resolve_format
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'disk').lower()
+CACHE_BACKEND_URL = os.environ.get('CACHE_BACKEND_URL', 'redis://127.0.0.1:6379/0')
+CACHE_BACKEND_TIMEOUT = float(os.environ.get('CACHE_BACKEND_TIMEOUT', 2))
+CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'nowgoal')
+CACHE_MEMORY_MAX_ENTRIES = int(os.environ.get('CACHE_MEMORY_MAX_ENTRIES', 4096))
+# Formato de los valores en backends compartidos: 'json' o 'msgpack' si está instalado
+CACHE_BACKEND_FORMAT = resolve_format(os.environ.get('CACHE_BACKEND_FORMAT'))
+
+NS_PAGES = 'pages'
+NS_STATS = 'stats'
+NS_PREVIEWS = 'previews'
+NS_ANALYSES = 'analyses'
+
+# TTL por defecto (segundos) de cada espacio de nombres en los backends compartidos.
+# Es un límite superior: cada consumidor sigue aplicando su propia política de frescura.
+NAMESPACE_TTLS = {
+    NS_PAGES: 7 * 24 * 3600,
+    NS_STATS: 30 * 24 * 3600,
+    NS_PREVIEWS: 7 * 24 * 3600,
+    NS_ANALYSES: 30 * 24 * 3600,
+}
+
+
+class CacheBackendError(Exception):
+    """Fallo de comunicación con el backend de cache."""
+
+
+# --- Backends ---
+class MemoryBackend:
+    """Backend en proceso: LRU con TTL opcional por entrada."""
+
+    def __init__(self, max_entries: int = CACHE_MEMORY_MAX_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # clave -> (expires_at | None, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] is not None and item[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value, ttl: float | None = None) -> bool:
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RespConnection:
+    """Conexión mínima al protocolo RESP2 (Redis y compatibles)."""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: str | None = None,
+                 timeout: float = CACHE_BACKEND_TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.command('AUTH', password)
+        if db:
+            self.command('SELECT', str(db))
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            elif not isinstance(arg, (bytes, bytearray)):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise CacheBackendError('Conexión cerrada por el servidor de cache.')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise CacheBackendError(rest.decode('utf-8', errors='replace'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise CacheBackendError(f"Respuesta RESP desconocida: {line[:20]!r}")
+
+    def command(self, *args):
+        self.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """Backend sobre un servidor RESP; una conexión por hilo, reconexión automática."""
+
+    def __init__(self, url: str = CACHE_BACKEND_URL, fmt: str = CACHE_BACKEND_FORMAT,
+                 timeout: float = CACHE_BACKEND_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.fmt = fmt
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> RespConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = RespConnection(self.host, self.port, self.db, self.password, self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _command(self, *args):
+        # Un reintento con conexión nueva cubre los cierres por inactividad del servidor
+        for attempt in (1, 2):
+            try:
+                return self._connection().command(*args)
+            except (OSError, CacheBackendError) as exc:
+                conn = getattr(self._local, 'conn', None)
+                if conn is not None:
+                    conn.close()
+                    self._local.conn = None
+                if attempt == 2 or not isinstance(exc, OSError):
+                    raise CacheBackendError(str(exc)) from exc
+        return None
+
+    def get(self, key: str):
+        raw = self._command('GET', key)
+        if raw is None:
+            return None
+        try:
+            return loads(raw, self.fmt)
+        except DECODE_ERRORS as exc:
+            print(f"Valor corrupto en el backend de cache para {key}: {exc}")
+            return None
+
+    def set(self, key: str, value, ttl: float | None = None) -> bool:
+        payload = dumps(value, self.fmt)
+        if ttl:
+            return self._command('SET', key, payload, 'EX', max(int(ttl), 1)) == 'OK'
+        return self._command('SET', key, payload) == 'OK'
+
+    def delete(self, key: str):
+        self._command('DEL', key)
+
+    def ping(self) -> bool:
+        return self._command('PING') == 'PONG'
+
+
+# --- Espacios de nombres ---
+class NamespacedCache:
+    """
+    Vista de un backend limitada a un espacio de nombres. Tiene la misma interfaz
+    que DiskCache (get/set/delete/__contains__), así los consumidores no cambian.
+    Los errores del backend se registran y se tratan como fallo de cache.
+    """
+
+    def __init__(self, backend, namespace: str, default_ttl: float | None = None, prefix: str = CACHE_KEY_PREFIX):
+        self.backend = backend
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}:{self.namespace}:{key}"
+
+    def get(self, key):
+        try:
+            return self.backend.get(self._key(key))
+        except CacheBackendError as exc:
+            print(f"Error del backend de cache ({self.namespace}) al leer {key}: {exc}")
+            return None
+
+    def set(self, key, value, ttl: float | None = None) -> bool:
+        try:
+            return bool(self.backend.set(self._key(key), value, ttl or self.default_ttl))
+        except (CacheBackendError, TypeError, ValueError) as exc:
+            print(f"Error del backend de cache ({self.namespace}) al escribir {key}: {exc}")
+            return False
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self._key(key))
+        except CacheBackendError as exc:
+            print(f"Error del backend de cache ({self.namespace}) al borrar {key}: {exc}")
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def start_janitor(self, interval: float = 600):
+        # Los backends compartidos caducan por TTL: no hace falta janitor
+        return None
+
+
+_shared_backend = None
+_shared_backend_lock = threading.Lock()
+
+
+def get_shared_backend():
+    """Backend compartido según CACHE_BACKEND, o None si se usan las DiskCache locales."""
+    global _shared_backend
+    if CACHE_BACKEND not in ('memory', 'redis'):
+        return None
+    with _shared_backend_lock:
+        if _shared_backend is None:
+            _shared_backend = RedisBackend() if CACHE_BACKEND == 'redis' else MemoryBackend()
+        return _shared_backend
+
+
+def namespace_cache(namespace: str, local_cache=None):
+    """
+    Cache para un espacio de nombres. Con el backend 'disk' devuelve `local_cache`
+    (la DiskCache de siempre del consumidor); con 'memory' o 'redis', la vista
+    compartida del espacio de nombres.
+    """
+    backend = get_shared_backend()
+    if backend is None:
+        return local_cache
+    return NamespacedCache(backend, namespace, NAMESPACE_TTLS.get(namespace))
+
+
+def is_shared_backend() -> bool:
+    return CACHE_BACKEND in ('memory', 'redis')
+
+
+# --- Servidor RESP de pruebas ---
+class _RespStubHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = self.rfile.readline()
+            length = int(header[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _reply(self, value):
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, str):
+            self.wfile.write(b'+%s\r\n' % value.encode('utf-8'))
+        elif isinstance(value, Exception):
+            self.wfile.write(b'-ERR %s\r\n' % str(value).encode('utf-8'))
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            try:
+                args = self._read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            name = args[0].decode('utf-8', errors='replace').upper()
+            if name == 'PING':
+                self._reply('PONG')
+            elif name in ('SELECT', 'AUTH'):
+                self._reply('OK')
+            elif name == 'GET':
+                self._reply(store.get(args[1].decode('utf-8')))
+            elif name == 'SET':
+                ttl = None
+                if len(args) >= 5 and args[3].upper() == b'EX':
+                    ttl = int(args[4])
+                store.set(args[1].decode('utf-8'), bytes(args[2]), ttl)
+                self._reply('OK')
+            elif name == 'DEL':
+                for key in args[1:]:
+                    store.delete(key.decode('utf-8'))
+                self._reply(len(args) - 1)
+            elif name == 'FLUSHDB':
+                store.clear()
+                self._reply('OK')
+            else:
+                self._reply(CacheBackendError(f"comando no soportado '{name}'"))
+            self.wfile.flush()
+
+
+class RespStubServer(socketserver.ThreadingTCPServer):
+    """Servidor en memoria que habla RESP (GET/SET EX/DEL/PING): sustituto de Redis para pruebas."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6380):
+        super().__init__((host, port), _RespStubHandler)
+        self.store = MemoryBackend(max_entries=1_000_000)
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name='resp-stub-server', daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        port = int(sys.argv[sys.argv.index('--port') + 1]) if '--port' in sys.argv else 6380
+        server = RespStubServer(port=port)
+        print(f"Servidor RESP de pruebas escuchando en 127.0.0.1:{port}")
+        server.serve_forever()
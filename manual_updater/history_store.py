@@ -0,0 +1,187 @@
+# history_store.py - Histórico append-only de partidos finalizados
+"""
+Almacén histórico de partidos finalizados que sobrevive entre ejecuciones del scraper.
+
+Estructura en disco (por defecto `history/finished/`):
+    2025-10-23.jsonl      segmento diario, una línea JSON por partido (append-only)
+    2025-09.jsonl.gz      segmento mensual compactado (días antiguos fusionados)
+
+- `merge()` añade solo los partidos cuyo ID no está ya en el segmento de su día
+  (o en el mensual compactado), sin reescribir nada de lo existente.
+- `compact()` fusiona los segmentos diarios con más de `compact_after_days` días
+  en su segmento mensual y aplica la retención (`retention_days`).
+- `read_range()` solo abre los segmentos que se solapan con el rango pedido.
+"""
+import datetime
+import gzip
+import os
+import re
+from pathlib import Path
+
+from serializers import DECODE_ERRORS, dumps_json, loads_json
+
+_DAILY_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})\.jsonl$')
+_MONTHLY_RE = re.compile(r'^(\d{4}-\d{2})\.jsonl\.gz$')
+
+
+def _match_day(entry) -> str | None:
+    """Día (YYYY-MM-DD, UTC) del partido a partir de su time_obj."""
+    value = entry.get('time_obj')
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, str) and re.match(r'^\d{4}-\d{2}-\d{2}', value):
+        return value[:10]
+    return None
+
+
+def _month_bounds(month: str):
+    start = datetime.date.fromisoformat(f"{month}-01")
+    next_month = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start, next_month - datetime.timedelta(days=1)
+
+
+class FinishedHistoryStore:
+    def __init__(self, root='history/finished', retention_days: int | None = None, compact_after_days: int = 7):
+        self.root = Path(root)
+        self.retention_days = retention_days if retention_days and retention_days > 0 else None
+        self.compact_after_days = max(int(compact_after_days), 1)
+
+    # --- Rutas de segmentos ---
+    def _daily_path(self, day: str) -> Path:
+        return self.root / f"{day}.jsonl"
+
+    def _monthly_path(self, month: str) -> Path:
+        return self.root / f"{month}.jsonl.gz"
+
+    def _iter_segment_lines(self, path: Path):
+        if not path.exists():
+            return
+        opener = gzip.open if path.suffix == '.gz' else open
+        try:
+            with opener(path, 'rb') as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = loads_json(line)
+                    except DECODE_ERRORS:
+                        # Una línea truncada (p.ej. por un corte) no invalida el resto del segmento
+                        continue
+                    if isinstance(entry, dict):
+                        yield entry
+        except OSError as exc:
+            print(f"Error al leer el segmento {path}: {exc}")
+
+    def _ids_for_day(self, day: str) -> set:
+        ids = {e.get('id') for e in self._iter_segment_lines(self._daily_path(day))}
+        monthly = self._monthly_path(day[:7])
+        if monthly.exists():
+            ids.update(e.get('id') for e in self._iter_segment_lines(monthly) if _match_day(e) == day)
+        return ids
+
+    # --- Escritura ---
+    def merge(self, matches) -> int:
+        """Añade los partidos nuevos (deduplicados por ID). Devuelve cuántos se han añadido."""
+        by_day = {}
+        for entry in matches or []:
+            if not isinstance(entry, dict) or not entry.get('id'):
+                continue
+            day = _match_day(entry)
+            if day:
+                by_day.setdefault(day, []).append(entry)
+        if not by_day:
+            return 0
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        added = 0
+        for day, entries in sorted(by_day.items()):
+            known = self._ids_for_day(day)
+            lines = []
+            for entry in entries:
+                if entry['id'] in known:
+                    continue
+                known.add(entry['id'])
+                lines.append(dumps_json(entry) + b'\n')
+            if not lines:
+                continue
+            path = self._daily_path(day)
+            if path.exists() and path.stat().st_size:
+                with path.open('rb') as fh:
+                    fh.seek(-1, os.SEEK_END)
+                    if fh.read(1) != b'\n':
+                        # Una escritura anterior quedó a medias: se cierra la línea antes de añadir
+                        lines.insert(0, b'\n')
+            with path.open('ab') as fh:
+                fh.write(b''.join(lines))
+                fh.flush()
+                os.fsync(fh.fileno())
+            added += len(lines)
+        return added
+
+    # --- Mantenimiento ---
+    def segments(self):
+        """Lista de (inicio, fin, ruta) de todos los segmentos existentes."""
+        result = []
+        if not self.root.exists():
+            return result
+        for path in self.root.iterdir():
+            if m := _DAILY_RE.match(path.name):
+                day = datetime.date.fromisoformat(m.group(1))
+                result.append((day, day, path))
+            elif m := _MONTHLY_RE.match(path.name):
+                start, end = _month_bounds(m.group(1))
+                result.append((start, end, path))
+        result.sort(key=lambda item: (item[0], item[1]))
+        return result
+
+    def compact(self, today: datetime.date | None = None) -> dict:
+        """Fusiona los segmentos diarios antiguos en mensuales y aplica la retención."""
+        today = today or datetime.datetime.now(datetime.timezone.utc).date()
+        compact_before = today - datetime.timedelta(days=self.compact_after_days)
+        stats = {"compacted_days": 0, "removed_segments": 0}
+
+        by_month = {}
+        for start, end, path in self.segments():
+            if path.name.endswith('.jsonl') and end < compact_before:
+                by_month.setdefault(start.strftime('%Y-%m'), []).append(path)
+
+        for month, daily_paths in sorted(by_month.items()):
+            monthly = self._monthly_path(month)
+            merged = {}
+            for entry in self._iter_segment_lines(monthly):
+                merged.setdefault(entry.get('id'), entry)
+            for path in daily_paths:
+                for entry in self._iter_segment_lines(path):
+                    merged.setdefault(entry.get('id'), entry)
+            ordered = sorted(merged.values(), key=lambda e: (str(e.get('time_obj') or ''), str(e.get('id') or '')))
+            tmp_path = monthly.with_name(f".{monthly.name}.{os.getpid()}.tmp")
+            with gzip.open(tmp_path, 'wb') as fh:
+                for entry in ordered:
+                    fh.write(dumps_json(entry) + b'\n')
+            os.replace(tmp_path, monthly)
+            for path in daily_paths:
+                path.unlink(missing_ok=True)
+            stats["compacted_days"] += len(daily_paths)
+
+        if self.retention_days:
+            cutoff = today - datetime.timedelta(days=self.retention_days)
+            for start, end, path in self.segments():
+                if end < cutoff:
+                    path.unlink(missing_ok=True)
+                    stats["removed_segments"] += 1
+        return stats
+
+    # --- Lectura ---
+    def read_range(self, start_date: datetime.date, end_date: datetime.date):
+        """Partidos entre `start_date` y `end_date` (inclusive), leyendo solo los segmentos necesarios."""
+        results = []
+        for seg_start, seg_end, path in self.segments():
+            if seg_end < start_date or seg_start > end_date:
+                continue
+            for entry in self._iter_segment_lines(path):
+                day = _match_day(entry)
+                if day and start_date.isoformat() <= day <= end_date.isoformat():
+                    results.append(entry)
+        results.sort(key=lambda e: (str(e.get('time_obj') or ''), str(e.get('id') or '')))
+        return results
@@ -1,8 +1,42 @@
 import asyncio
-import json
+import datetime
+import os
+
+from history_store import FinishedHistoryStore
+from page_archive import prune_page_archive
+from serializers import FORMAT_MSGPACK, HAS_MSGPACK, write_file
 
 # Importamos las funciones de scraping desde el nuevo módulo
-from scraping_logic import get_main_page_matches_async, get_main_page_finished_matches_async
+from scraping_logic import ScrapeResources, get_main_page_matches_async, get_main_page_finished_matches_async
+
+# Histórico de finalizados (0 = sin límite de retención)
+HISTORY_DIR = os.environ.get('HISTORY_DIR', 'history/finished')
+HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', 0))
+HISTORY_COMPACT_AFTER_DAYS = int(os.environ.get('HISTORY_COMPACT_AFTER_DAYS', 7))
+# Días anteriores cuyos resultados se rastrean para rellenar huecos del histórico (0 = desactivado)
+CRAWL_CATCHUP_DAYS = int(os.environ.get('CRAWL_CATCHUP_DAYS', 0))
+
+
+def update_finished_history(finalizados):
+    """Añade los finalizados de esta ejecución al histórico y compacta los segmentos antiguos."""
+    store = FinishedHistoryStore(HISTORY_DIR, HISTORY_RETENTION_DAYS, HISTORY_COMPACT_AFTER_DAYS)
+    try:
+        added = store.merge(finalizados)
+        stats = store.compact()
+        print(f"Histórico actualizado: {added} partidos nuevos, {stats['compacted_days']} días compactados, "
+              f"{stats['removed_segments']} segmentos eliminados por retención.")
+    except OSError as exc:
+        print(f"Error al actualizar el histórico de finalizados: {exc}")
+
+
+async def catch_up_finished_history(days: int):
+    """Rastrea los resultados de los últimos `days` días (ver results_crawler.py); los ya hechos se saltan."""
+    from results_crawler import crawl_results
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    summary = await crawl_results(today - datetime.timedelta(days=days), today - datetime.timedelta(days=1), HISTORY_DIR)
+    print(f"Puesta al día del histórico: {summary['days']} días rastreados, {summary['added']} partidos nuevos, "
+          f"{len(summary['failed'])} días fallidos.")
+
 
 async def main():
     """
@@ -10,11 +44,14 @@ async def main():
     """
     print("Iniciando el proceso de scraping principal...")
     
-    # Obtenemos los partidos próximos y los finalizados en paralelo
-    proximos, finalizados = await asyncio.gather(
-        get_main_page_matches_async(limit=1200), # Aumentamos el límite para tener más datos
-        get_main_page_finished_matches_async(limit=1500)
-    )
+    # Obtenemos los partidos próximos y los finalizados en paralelo, con un único
+    # cliente HTTP y (si hace falta) un único navegador para toda la ejecución
+    async with ScrapeResources() as resources:
+        proximos, finalizados = await asyncio.gather(
+            get_main_page_matches_async(limit=1200, resources=resources), # Aumentamos el límite para tener más datos
+            get_main_page_finished_matches_async(limit=1500, resources=resources)
+        )
+        print(f"Navegadores arrancados en esta ejecución: {resources.browser_starts}")
     
     print(f"Scraping de listas finalizado. {len(proximos)} partidos próximos y {len(finalizados)} finalizados.")
 
@@ -24,11 +61,21 @@ async def main():
         "finished_matches": finalizados
     }
     
-    # Guardamos los datos en el archivo data.json
-    with open('data.json', 'w', encoding='utf-8') as f:
-        json.dump(scraped_data, f, indent=2, ensure_ascii=False)
+    # Guardamos los datos en el archivo data.json (compacto, sin indentación)
+    write_file('data.json', scraped_data)
+    # Si msgpack está disponible, guardamos también la versión binaria del snapshot
+    if HAS_MSGPACK:
+        write_file('data.msgpack', scraped_data, FORMAT_MSGPACK)
     
     print("Archivo data.json guardado correctamente.")
 
+    update_finished_history(finalizados)
+
+    if CRAWL_CATCHUP_DAYS > 0:
+        await catch_up_finished_history(CRAWL_CATCHUP_DAYS)
+
+    # Retención del archivo de páginas (este proceso no vive lo bastante para el janitor)
+    await asyncio.to_thread(prune_page_archive)
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,107 @@
+# preview_cache.py - Cache con TTL para /api/preview/<match_id>
+"""
+Cache de vistas previas por (match_id, modo) con LRU en memoria y, opcionalmente,
+una copia en disco (DiskCache) para sobrevivir a reinicios.
+
+El TTL depende de lo que falte para el inicio del partido: las vistas previas de
+partidos a punto de empezar caducan enseguida (las cuotas se mueven), y las de
+partidos finalizados se pueden guardar días.
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+PREVIEW_MODES = ('light', 'full')
+
+# TTLs en segundos
+TTL_FINISHED = 7 * 24 * 3600
+TTL_IN_PLAY = 60
+TTL_UNKNOWN_KICKOFF = 10 * 60
+# (segundos hasta el inicio, ttl): se usa el primer tramo que cubra el tiempo restante
+TTL_BY_KICKOFF = (
+    (3600, 2 * 60),
+    (6 * 3600, 10 * 60),
+    (24 * 3600, 30 * 60),
+)
+TTL_FAR_FUTURE = 2 * 3600
+
+
+def preview_ttl_seconds(kickoff: datetime.datetime | None, finished: bool = False, now: datetime.datetime | None = None) -> int:
+    """TTL de una vista previa según el estado del partido y la distancia al inicio (UTC)."""
+    if finished:
+        return TTL_FINISHED
+    if kickoff is None:
+        return TTL_UNKNOWN_KICKOFF
+    now = now or datetime.datetime.utcnow()
+    remaining = (kickoff - now).total_seconds()
+    if remaining <= 0:
+        return TTL_IN_PLAY
+    for limit, ttl in TTL_BY_KICKOFF:
+        if remaining <= limit:
+            return ttl
+    return TTL_FAR_FUTURE
+
+
+class PreviewCache:
+    def __init__(self, max_entries: int = 512, disk_cache=None):
+        self.max_entries = max(1, int(max_entries))
+        self.disk_cache = disk_cache
+        self._entries = OrderedDict()  # (match_id, mode) -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _disk_key(match_id: str, mode: str) -> str:
+        return f"preview:{match_id}:{mode}"
+
+    def get(self, match_id: str, mode: str):
+        key = (str(match_id), mode)
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._entries.move_to_end(key)
+                    return item[1]
+                del self._entries[key]
+        if self.disk_cache is None:
+            return None
+        stored = self.disk_cache.get(self._disk_key(*key))
+        if not isinstance(stored, dict) or stored.get('expires_at', 0) <= now:
+            if stored is not None:
+                self.disk_cache.delete(self._disk_key(*key))
+            return None
+        payload = stored.get('payload')
+        self._remember(key, stored['expires_at'], payload)
+        return payload
+
+    def put(self, match_id: str, mode: str, payload: dict, ttl: int):
+        key = (str(match_id), mode)
+        expires_at = time.time() + max(int(ttl), 1)
+        self._remember(key, expires_at, payload)
+        if self.disk_cache is not None:
+            self.disk_cache.set(self._disk_key(*key), {'expires_at': expires_at, 'payload': payload})
+
+    def _remember(self, key, expires_at, payload):
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, match_id: str, mode: str | None = None):
+        """Elimina la vista previa de un partido (todos los modos si `mode` es None)."""
+        match_id = str(match_id)
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == match_id and (mode is None or k[1] == mode)]
+            for key in keys:
+                del self._entries[key]
+        if self.disk_cache is None:
+            return
+        for m in ([mode] if mode else PREVIEW_MODES):
+            self.disk_cache.delete(self._disk_key(match_id, m))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
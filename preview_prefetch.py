@@ -0,0 +1,139 @@
+# preview_prefetch.py - Precarga especulativa de vistas previas para las filas visibles
+"""
+La página de listas envía a `POST /api/preview/prefetch` los IDs de las filas
+visibles y el servidor calienta la cache de vistas previas antes del clic en el
+icono del ojo.
+
+- Las precargas se encolan en el planificador (scheduler.py) con prioridad
+  prefetch: su cupo de concurrencia es pequeño y cualquier petición interactiva
+  o de fondo pasa por delante.
+- Es barato: los IDs que ya están en cache (o bloqueados en la cache negativa)
+  no se encolan, un ID ya encolado no se duplica y hay un máximo de precargas
+  pendientes en todo el proceso (PREVIEW_PREFETCH_MAX_PENDING).
+- Es cancelable: cada cliente tiene su lista de IDs; una nueva llamada cancela
+  las precargas aún no iniciadas de IDs que ya no están visibles (una lista
+  vacía las cancela todas). Si el usuario pide la vista previa de un ID
+  pendiente, `claim()` cancela la precarga o, si ya está en marcha, devuelve su
+  future para esperar el resultado en lugar de repetir el scraping.
+"""
+import os
+import threading
+
+from scheduler import PRIORITY_PREFETCH, get_scheduler
+
+PREVIEW_PREFETCH_MAX_ITEMS = int(os.environ.get('PREVIEW_PREFETCH_MAX_ITEMS', 20))
+PREVIEW_PREFETCH_MAX_PENDING = int(os.environ.get('PREVIEW_PREFETCH_MAX_PENDING', 60))
+
+
+def normalize_prefetch_ids(raw_ids) -> list:
+    """IDs numéricos únicos en el orden recibido, como mucho PREVIEW_PREFETCH_MAX_ITEMS."""
+    if not isinstance(raw_ids, list):
+        raise ValueError("Se esperaba una lista 'match_ids'.")
+    seen = []
+    for value in raw_ids:
+        match_id = str(value).strip()
+        if match_id.isdigit() and match_id not in seen:
+            seen.append(match_id)
+    return seen[:PREVIEW_PREFETCH_MAX_ITEMS]
+
+
+class PreviewPrefetcher:
+    """
+    `fetch(match_id)` hace el scraping y guarda el resultado en cache;
+    `should_skip(match_id)` indica si no merece la pena precargarlo.
+    """
+
+    def __init__(self, fetch, should_skip, scheduler=None, max_pending: int = PREVIEW_PREFETCH_MAX_PENDING):
+        self.fetch = fetch
+        self.should_skip = should_skip
+        self.scheduler = scheduler or get_scheduler()
+        self.max_pending = max(1, int(max_pending))
+        self._tickets = {}  # match_id -> Ticket del planificador (pendiente o en marcha)
+        self._owners = {}  # match_id -> clientes que lo tienen visible
+        self._by_client = {}  # cliente -> match_ids encolados para él
+        self._lock = threading.Lock()
+
+    def _forget_locked(self, match_id):
+        self._tickets.pop(match_id, None)
+        for client in self._owners.pop(match_id, ()):
+            client_ids = self._by_client.get(client)
+            if client_ids is not None:
+                client_ids.discard(match_id)
+                if not client_ids:
+                    del self._by_client[client]
+
+    def _join_locked(self, match_id, client) -> bool:
+        """Añade `client` a una precarga ya encolada de `match_id`; False si no hay ninguna."""
+        if match_id not in self._tickets:
+            return False
+        self._owners[match_id].add(client)
+        self._by_client.setdefault(client, set()).add(match_id)
+        return True
+
+    def _run(self, match_id):
+        try:
+            self.fetch(match_id)
+        except Exception as exc:
+            print(f"Error en la precarga de la vista previa {match_id}: {exc}")
+        finally:
+            with self._lock:
+                self._forget_locked(match_id)
+
+    def prefetch(self, match_ids, client=None) -> dict:
+        """Sustituye la lista de precargas de `client` por `match_ids`. Devuelve el reparto de IDs."""
+        summary = {'queued': [], 'pending': [], 'skipped': [], 'dropped': [], 'cancelled': []}
+        wanted = set(match_ids)
+        with self._lock:
+            previous = set(self._by_client.get(client, ()))
+            for match_id in previous - wanted:
+                owners = self._owners.get(match_id, set())
+                owners.discard(client)
+                self._by_client.get(client, set()).discard(match_id)
+                # Solo se cancela si ningún otro cliente lo sigue teniendo visible
+                ticket = self._tickets.get(match_id)
+                if not owners and ticket is not None and self.scheduler.cancel(ticket):
+                    self._forget_locked(match_id)
+                    summary['cancelled'].append(match_id)
+        for match_id in match_ids:
+            with self._lock:
+                if self._join_locked(match_id, client):
+                    summary['pending'].append(match_id)
+                    continue
+            # Consultar la cache puede ir a red (backend compartido): fuera del lock
+            if self.should_skip(match_id):
+                summary['skipped'].append(match_id)
+                continue
+            with self._lock:
+                if self._join_locked(match_id, client):
+                    summary['pending'].append(match_id)
+                    continue
+                if len(self._tickets) >= self.max_pending:
+                    summary['dropped'].append(match_id)
+                    continue
+                # Se registra bajo el lock: _run no puede limpiar antes de que exista la entrada
+                self._tickets[match_id] = self.scheduler.submit(PRIORITY_PREFETCH, self._run, match_id, key=match_id)
+                self._owners[match_id] = {client}
+                self._by_client.setdefault(client, set()).add(match_id)
+                summary['queued'].append(match_id)
+        with self._lock:
+            if not self._by_client.get(client):
+                self._by_client.pop(client, None)
+        return summary
+
+    def claim(self, match_id):
+        """
+        Lo llama la petición interactiva de un ID. Cancela su precarga si no ha empezado
+        (devuelve None) o devuelve el future de la que está en marcha.
+        """
+        with self._lock:
+            ticket = self._tickets.get(match_id)
+            if ticket is None:
+                return None
+            if self.scheduler.cancel(ticket):
+                self._forget_locked(match_id)
+                return None
+            return ticket.future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'pending': len(self._tickets), 'clients': len(self._by_client), 'max_pending': self.max_pending}
@@ -0,0 +1,60 @@
+# render_cache.py - Cache de HTML renderizado para las páginas de listas
+"""
+Guarda el HTML ya renderizado de '/', '/resultados' y '/proximos' por
+(ruta, filtro de hándicap, versión de datos), junto con su variante gzip
+precomprimida. Tiene un número máximo de entradas (LRU) y se vacía de
+versiones antiguas cuando se carga un snapshot nuevo.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+
+class RenderedPage:
+    __slots__ = ('version', 'body', 'gzip_body')
+
+    def __init__(self, version: str, body: bytes, gzip_body: bytes):
+        self.version = version
+        self.body = body
+        self.gzip_body = gzip_body
+
+
+class RenderedPageCache:
+    def __init__(self, max_entries: int = 64, compress_level: int = 6):
+        self.max_entries = max(1, int(max_entries))
+        self.compress_level = compress_level
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, page_key: str, handicap_filter: str | None, version: str):
+        key = (page_key, handicap_filter or '', version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, page_key: str, handicap_filter: str | None, version: str, html: str) -> RenderedPage:
+        body = html.encode('utf-8')
+        entry = RenderedPage(version, body, gzip.compress(body, compresslevel=self.compress_level))
+        key = (page_key, handicap_filter or '', version)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate_except(self, version: str):
+        """Elimina todas las entradas que no pertenecen a `version`."""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry.version != version]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
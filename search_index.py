@@ -0,0 +1,160 @@
+# search_index.py - Índice en memoria de nombres de equipos para /api/search
+"""
+Índice de búsqueda por equipo construido a partir de un snapshot de data.json.
+
+- Normaliza los nombres (sin acentos, minúsculas, solo alfanuméricos).
+- Indexa todos los prefijos de cada palabra (hasta MAX_PREFIX_LEN caracteres)
+  y los trigramas: se busca por inicio de palabra y, si no hay coincidencias,
+  por fragmento.
+- Los IDs internos de documento siguen el orden de ranking (próximos por hora
+  de inicio ascendente y después finalizados del más reciente al más antiguo),
+  así que las listas de resultados ya salen ordenadas y paginar es un slice.
+"""
+import datetime
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+MAX_PREFIX_LEN = 12
+QUERY_MEMO_SIZE = 1024
+_NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+SECTIONS = ('upcoming_matches', 'finished_matches')
+_SECTION_ALIASES = {
+    'upcoming': 'upcoming_matches',
+    'finished': 'finished_matches',
+}
+
+
+def fold_text(text) -> str:
+    """Quita acentos, pasa a minúsculas y deja solo letras/números separados por espacios."""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM_RE.sub(' ', stripped.casefold()).strip()
+
+
+def _trigrams(token: str):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _kickoff(entry):
+    value = entry.get('time_obj')
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.datetime.min
+
+
+class TeamSearchIndex:
+    def __init__(self, data: dict, version: str | None = None):
+        self.version = version
+        self._docs = []          # (section, entry) en orden de ranking
+        self._doc_text = []      # texto normalizado "local visitante" por documento
+        self._section_of = []
+        self._prefixes = {}      # prefijo -> tupla ordenada de doc ids
+        self._trigram_map = {}   # trigrama -> tupla ordenada de doc ids
+        self._set_memo = {}
+        self._query_memo = OrderedDict()  # consulta normalizada -> doc ids
+        self._lock = threading.Lock()
+        self._build(data or {})
+
+    def _build(self, data):
+        upcoming = sorted(
+            (m for m in data.get('upcoming_matches', []) if isinstance(m, dict)),
+            key=lambda m: (_kickoff(m), m.get('id', '')),
+        )
+        finished = sorted(
+            (m for m in data.get('finished_matches', []) if isinstance(m, dict)),
+            key=lambda m: (_kickoff(m), m.get('id', '')),
+            reverse=True,
+        )
+        prefixes = {}
+        trigram_map = {}
+        for section, matches in (('upcoming_matches', upcoming), ('finished_matches', finished)):
+            for entry in matches:
+                doc_id = len(self._docs)
+                text = f"{fold_text(entry.get('home_team'))} {fold_text(entry.get('away_team'))}".strip()
+                self._docs.append((section, entry))
+                self._doc_text.append(text)
+                self._section_of.append(section)
+                for token in set(text.split()):
+                    for i in range(1, min(len(token), MAX_PREFIX_LEN) + 1):
+                        prefixes.setdefault(token[:i], set()).add(doc_id)
+                    for tri in _trigrams(token):
+                        trigram_map.setdefault(tri, set()).add(doc_id)
+        self._prefixes = {key: tuple(sorted(ids)) for key, ids in prefixes.items()}
+        self._trigram_map = {key: tuple(sorted(ids)) for key, ids in trigram_map.items()}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _as_set(self, key, postings):
+        memo = self._set_memo.get(key)
+        if memo is None:
+            if len(self._set_memo) >= QUERY_MEMO_SIZE:
+                self._set_memo.clear()
+            memo = frozenset(postings)
+            self._set_memo[key] = memo
+        return memo
+
+    def _postings_for_token(self, token: str):
+        """
+        Doc ids (ordenados) para una palabra de la consulta: primero por prefijo de
+        palabra; si no hay ninguno, por fragmento usando los trigramas.
+        """
+        prefix_hits = self._prefixes.get(token) if len(token) <= MAX_PREFIX_LEN else None
+        if prefix_hits or len(token) < 3:
+            return prefix_hits or ()
+        grams = sorted(_trigrams(token), key=lambda t: len(self._trigram_map.get(t, ())))
+        if not grams or grams[0] not in self._trigram_map:
+            return ()
+        candidates = self._trigram_map[grams[0]]
+        others = [self._as_set(('t', t), self._trigram_map.get(t, ())) for t in grams[1:]]
+        texts = self._doc_text
+        return [d for d in candidates if all(d in s for s in others) and token in texts[d]]
+
+    def _query_hits(self, tokens: tuple):
+        with self._lock:
+            cached = self._query_memo.get(tokens)
+            if cached is not None:
+                self._query_memo.move_to_end(tokens)
+                return cached
+        postings = sorted(((token, self._postings_for_token(token)) for token in tokens), key=lambda tp: len(tp[1]))
+        hits = postings[0][1]
+        if len(postings) > 1:
+            others = [self._as_set(('q', token), p) for token, p in postings[1:]]
+            hits = [d for d in hits if all(d in s for s in others)]
+        with self._lock:
+            self._query_memo[tokens] = hits
+            while len(self._query_memo) > QUERY_MEMO_SIZE:
+                self._query_memo.popitem(last=False)
+        return hits
+
+    def search(self, query: str, offset: int = 0, limit: int = 20, section: str | None = None):
+        """Devuelve (total, resultados) para la consulta, ya ordenados por hora de inicio."""
+        tokens = tuple(sorted(set(fold_text(query).split())))
+        if not tokens:
+            return 0, []
+        hits = self._query_hits(tokens)
+
+        section_key = _SECTION_ALIASES.get(section or '', section)
+        if section_key in SECTIONS:
+            hits = [d for d in hits if self._section_of[d] == section_key]
+
+        offset = max(int(offset or 0), 0)
+        limit = max(int(limit or 0), 0)
+        page = hits[offset:offset + limit]
+        results = []
+        for doc_id in page:
+            section_name, entry = self._docs[doc_id]
+            item = dict(entry)
+            item['section'] = 'upcoming' if section_name == 'upcoming_matches' else 'finished'
+            results.append(item)
+        return len(hits), results
@@ -0,0 +1,98 @@
+# stats_cache.py - Cache persistente de estadísticas de progresión (/match/live-{id})
+"""
+Las estadísticas de un partido finalizado (córners, tiros, ataques...) no cambian,
+y los mismos IDs históricos aparecen en muchos análisis de la misma semana.
+
+- Partidos finalizados: entrada de escritura única que no caduca nunca.
+- Partidos en juego o de estado desconocido: TTL corto (STATS_IN_PLAY_TTL).
+
+Las filas se guardan tal cual las construye `get_match_progression_stats_data`
+(lista de dicts), así la cache no depende de pandas.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from cache_backend import NS_STATS, namespace_cache
+from disk_cache import DiskCache
+
+STATS_IN_PLAY_TTL = int(os.environ.get('STATS_IN_PLAY_TTL', 120))
+STATS_CACHE_DIR = os.environ.get('STATS_CACHE_DIR') or str(Path(__file__).resolve().parent / 'cache' / 'progression_stats')
+STATS_CACHE_MAX_MB = int(os.environ.get('STATS_CACHE_MAX_MB', 256))
+_MEMORY_ENTRIES = 2048
+
+
+class ProgressionStatsCache:
+    def __init__(self, disk_cache, in_play_ttl: int = STATS_IN_PLAY_TTL):
+        self.disk_cache = disk_cache
+        self.in_play_ttl = in_play_ttl
+        # Copia en memoria solo de las entradas inmutables (partidos finalizados)
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(match_id) -> str:
+        return f"stats:{match_id}"
+
+    def get(self, match_id):
+        """Filas cacheadas para el partido, o None si no hay entrada válida."""
+        match_id = str(match_id)
+        with self._lock:
+            rows = self._finished.get(match_id)
+            if rows is not None:
+                self._finished.move_to_end(match_id)
+                return rows
+        entry = self.disk_cache.get(self._key(match_id))
+        if not isinstance(entry, dict):
+            return None
+        if entry.get('finished'):
+            self._remember_finished(match_id, entry.get('rows') or [])
+            return entry.get('rows') or []
+        if time.time() - float(entry.get('fetched_at') or 0) > self.in_play_ttl:
+            return None
+        return entry.get('rows') or []
+
+    def put(self, match_id, rows, finished: bool):
+        match_id = str(match_id)
+        if finished:
+            # Escritura única: una entrada de partido finalizado no se reescribe
+            with self._lock:
+                if match_id in self._finished:
+                    return
+            existing = self.disk_cache.get(self._key(match_id))
+            if isinstance(existing, dict) and existing.get('finished'):
+                self._remember_finished(match_id, existing.get('rows') or [])
+                return
+            self._remember_finished(match_id, rows)
+        self.disk_cache.set(self._key(match_id), {
+            'rows': rows,
+            'finished': bool(finished),
+            'fetched_at': time.time(),
+        })
+
+    def _remember_finished(self, match_id, rows):
+        with self._lock:
+            self._finished[match_id] = rows
+            self._finished.move_to_end(match_id)
+            while len(self._finished) > _MEMORY_ENTRIES:
+                self._finished.popitem(last=False)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_stats_cache() -> ProgressionStatsCache:
+    """Instancia compartida (perezosa) de la cache de estadísticas."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            # Sin max_age: las entradas de partidos finalizados no deben caducar por antigüedad
+            disk = DiskCache(STATS_CACHE_DIR, max_bytes=STATS_CACHE_MAX_MB * 1024 * 1024)
+            cache = namespace_cache(NS_STATS, disk)
+            if cache is disk:
+                disk.start_janitor()
+            _default_cache = ProgressionStatsCache(cache)
+        return _default_cache